@@ -0,0 +1,178 @@
+"""Process-wide micro-batching for blocking AI calls.
+
+Every session's request goes through one scheduler instead of straight to the
+backend. Requests are held for a few milliseconds (``window``) so bursts can
+be merged:
+
+- identical requests (same messages and parameters) become one call; if more
+  than one session is waiting, the call asks for ``n`` choices (up to
+  ``max_n``) and each session gets a different one. Backends that ignore ``n``
+  just return one choice, which everyone then shares.
+- callers get a Future and block on it (or not) as they like.
+- dispatch is round-robin across tenants (a session, a room, ...), with a cap
+  on calls in flight per tenant, so one busy tenant cannot starve the others.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Deque, Dict, List, Optional
+
+from response_cache import cache_key
+
+log = logging.getLogger(__name__)
+
+
+class _Group:
+    """One pending call and everyone waiting on it."""
+    __slots__ = ("key", "tenant", "messages", "max_tokens", "temperature", "extra", "waiters", "created")
+
+    def __init__(self, key: str, tenant: str, messages, max_tokens: int, temperature: float, extra: dict):
+        self.key = key
+        self.tenant = tenant
+        self.messages = messages
+        self.max_tokens = max_tokens
+        self.temperature = temperature
+        self.extra = extra
+        self.waiters: List[tuple] = []   # (future, tags, submitted_at)
+        self.created = time.monotonic()
+
+
+class AIScheduler:
+    def __init__(self, backend, window: float = 0.005, max_inflight: int = 16, per_tenant: int = 4,
+                 max_n: int = 4, metrics=None, on_complete=None):
+        self.backend = backend           # LLMGateway / LocalBackend
+        self.window = window
+        self.max_inflight = max(1, max_inflight)
+        self.per_tenant = max(1, per_tenant)
+        self.max_n = max(1, max_n)
+        self.metrics = metrics           # optional metrics.MetricsRecorder, for merged requests
+        self.on_complete = on_complete   # optional on_complete(tags, completion), once per backend call
+        self._pending: Dict[str, _Group] = {}                       # key -> group not yet dispatched
+        self._queues: "OrderedDict[str, Deque[_Group]]" = OrderedDict()  # tenant -> groups, oldest first
+        self._inflight: Dict[str, int] = {}
+        self._running = 0
+        self._cond = threading.Condition()
+        self._pool = ThreadPoolExecutor(max_workers=self.max_inflight, thread_name_prefix="ai-batch")
+        self._thread = threading.Thread(target=self._run, name="ai-scheduler", daemon=True)
+        self._thread.start()
+        self.stats = {"requests": 0, "calls": 0, "merged": 0, "multi_choice_calls": 0, "cancelled": 0,
+                      "errors": 0}
+
+    def submit(self, messages, max_tokens: int, temperature: float, tenant: str = "",
+               tags: Optional[dict] = None, **extra) -> Future:
+        """Queue a completion; the Future resolves to its text."""
+        key = cache_key(messages, max_tokens, "", temperature) + repr(sorted(extra.items()))
+        fut: Future = Future()
+        with self._cond:
+            self.stats["requests"] += 1
+            group = self._pending.get(key)
+            if group is None:
+                group = self._pending[key] = _Group(key, tenant, messages, max_tokens, temperature, extra)
+                self._queues.setdefault(tenant, deque()).append(group)
+            else:
+                self.stats["merged"] += 1
+            group.waiters.append((fut, tags, time.monotonic()))
+            self._cond.notify()
+        return fut
+
+    # --------------------------
+    # Dispatch
+    # --------------------------
+    def _has_room(self, tenant: str) -> bool:
+        return self._running < self.max_inflight and self._inflight.get(tenant, 0) < self.per_tenant
+
+    def _take(self, now: float) -> List[_Group]:
+        # Caller holds self._cond. One group per tenant per pass, tenants in rotation.
+        taken: List[_Group] = []
+        progress = True
+        while progress:
+            progress = False
+            for tenant in list(self._queues):
+                q = self._queues[tenant]
+                if not self._has_room(tenant) or q[0].created + self.window > now:
+                    continue
+                group = q.popleft()
+                if not q:
+                    del self._queues[tenant]
+                else:
+                    self._queues.move_to_end(tenant)
+                del self._pending[group.key]  # later identical requests start a new group
+                group.waiters = [w for w in group.waiters if not w[0].cancelled()]
+                if not group.waiters:
+                    self.stats["cancelled"] += 1
+                    continue
+                self._running += 1
+                self._inflight[tenant] = self._inflight.get(tenant, 0) + 1
+                taken.append(group)
+                progress = True
+        return taken
+
+    def _next_due(self, now: float) -> Optional[float]:
+        due = [q[0].created + self.window - now for t, q in self._queues.items() if self._has_room(t)]
+        return max(0.0, min(due)) if due else None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.monotonic()
+                    groups = self._take(now)
+                    if groups:
+                        break
+                    self._cond.wait(self._next_due(now))
+            for group in groups:
+                self._pool.submit(self._call, group)
+
+    def _call(self, group: _Group):
+        waiters = [w for w in group.waiters if w[0].set_running_or_notify_cancel()]
+        try:
+            if not waiters:
+                return
+            n = min(len(waiters), self.max_n)
+            extra = dict(group.extra, n=n) if n > 1 else group.extra
+            with self._cond:
+                self.stats["calls"] += 1
+                self.stats["multi_choice_calls"] += n > 1
+            try:
+                result = self.backend.complete(group.messages, group.max_tokens, group.temperature,
+                                               tags=waiters[0][1], **extra)
+            except Exception as e:
+                with self._cond:
+                    self.stats["errors"] += 1
+                for fut, _, _ in waiters:
+                    fut.set_exception(e)
+                return
+            if self.on_complete is not None:
+                try:
+                    self.on_complete(waiters[0][1], result)
+                except Exception:
+                    log.exception("on_complete failed")  # the answer is still good; callers get it below
+            choices = getattr(result, "choices", None) or (result.text,)
+            for i, (fut, _, _) in enumerate(waiters):
+                fut.set_result(choices[i % len(choices)])
+            for fut, tags, submitted in waiters[1:]:
+                self._record(tags, submitted)
+        finally:
+            with self._cond:
+                self._running -= 1
+                self._inflight[group.tenant] -= 1
+                if not self._inflight[group.tenant]:
+                    del self._inflight[group.tenant]
+                self._cond.notify()
+
+    def _record(self, tags: Optional[dict], submitted: float):
+        # The backend records the call itself; the other sessions it served are "batched".
+        if self.metrics is None:
+            return
+        tags = dict(tags or {})
+        started = tags.pop("queued_at", None) or submitted
+        total = round(time.monotonic() - started, 4)
+        self.metrics.record(source="batched", model=getattr(self.backend, "model", None), ttft_s=total,
+                            total_s=total, **tags)
+
+    def queued(self) -> Dict[str, int]:
+        with self._cond:
+            return {"pending_calls": sum(len(q) for q in self._queues.values()), "running_calls": self._running,
+                    "tenants_waiting": len(self._queues)}
@@ -0,0 +1,64 @@
+"""On-disk store of pre-generated AI answers.
+
+Filled offline by ``pregen.py`` and read by the game before it calls the API.
+Answers are keyed with ``response_cache.cache_key`` so a stored answer matches
+exactly the request the game would have sent.
+"""
+import time
+import random
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+
+class AnswerStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS answers ("
+            " id INTEGER PRIMARY KEY,"
+            " key TEXT NOT NULL, pack TEXT, mode TEXT, difficulty TEXT, prompt TEXT,"
+            " text TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS answers_key ON answers(key)")
+        self._conn.commit()
+        self._stats = {"hits": 0, "misses": 0, "added": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            texts = [r[0] for r in self._conn.execute("SELECT text FROM answers WHERE key = ?", (key,))]
+            self._stats["hits" if texts else "misses"] += 1
+        return random.choice(texts) if texts else None
+
+    def count(self, key: str) -> int:
+        with self._lock:
+            (n,) = self._conn.execute("SELECT COUNT(*) FROM answers WHERE key = ?", (key,)).fetchone()
+        return n
+
+    def add(self, key: str, text: str, pack: str = "", mode: str = "", difficulty: str = "", prompt: str = ""):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO answers (key, pack, mode, difficulty, prompt, text, created)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (key, pack, mode, difficulty, prompt, text, time.time()),
+            )
+            self._conn.commit()
+            self._stats["added"] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (answers,) = self._conn.execute("SELECT COUNT(*) FROM answers").fetchone()
+            (keys,) = self._conn.execute("SELECT COUNT(DISTINCT key) FROM answers").fetchone()
+            s = dict(self._stats)
+        s["answers"] = answers
+        s["keys"] = keys
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = s["hits"] / lookups if lookups else 0.0
+        return s
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -1,9 +1,34 @@
 import streamlit as st
 import random
 import time
-import os, json, re
-from typing import Dict, List
-from openai import OpenAI
+import os, json, uuid, hashlib, hmac
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from ai_scheduler import AIScheduler
+from answer_store import AnswerStore
+from constraint_check import CheckStats, check_round, repair_instruction
+from game_content import (
+    AI_MODEL, CORE_PACK, ai_messages_for_prompt, ai_request, ai_tokens_for_mode,
+)
+from game_store import GameStore
+from judge import JudgeEngine
+from llm_gateway import Backend, LLMGateway
+from local_backend import LOCAL_MODEL, LocalBackend
+from metrics import MetricsRecorder
+from novelty_index import NoveltyIndex
+from pack_editor import (
+    check_section, memo_stats, merge_sections, pack_errors, pack_json, preview, read_lines_file,
+    safe_pack_name, save_pack,
+)
+from pack_dedupe import Settings as DedupeSettings
+from pack_registry import PACK_KEYS, Pack, PackRegistry
+from prompt_engine import compile_pack, deck_for
+from story_context import StoryContext
+from token_budget import Budget, TokenBudget, rule_end
+from response_cache import ResponseCache, SqliteResponseCache, cache_key
+from rooms import AI_ENTRY, RoomStore
+from session_manager import SessionManager
 
 # --------------------------
 # App Config
@@ -13,219 +38,225 @@ st.set_page_config(page_title="🎲 AI Creativity Challenge", layout="centered")
 # --------------------------
 # Lightweight styling
 # --------------------------
-st.markdown("""
-<style>
-:root {
-  --bg-card: #ffffff;
-  --text-muted: #5f6c7b;
-  --ring: rgba(0,0,0,0.06);
-  --grad-1: linear-gradient(135deg, #7C3AED 0%, #06B6D4 100%);
-  --grad-2: linear-gradient(135deg, #F59E0B 0%, #EF4444 100%);
-  --grad-3: linear-gradient(135deg, #10B981 0%, #3B82F6 100%);
-  --grad-4: linear-gradient(135deg, #E56B6F 0%, #6D9DC5 100%);
-}
-.hero { padding: 1.25rem; border-radius: 1rem; background: var(--grad-4); color: #fff;
-  box-shadow: 0 6px 24px rgba(0,0,0,0.16); margin-bottom: 1rem; }
-.card { border-radius: 1rem; background: var(--bg-card); border: 1px solid var(--ring);
-  padding: 1rem; margin: .5rem 0 1rem; box-shadow: 0 6px 16px rgba(0,0,0,0.06); }
-.card h3 { margin: 0 0 .25rem 0; }
-.card p { color: var(--text-muted); margin: .25rem 0 .75rem; }
-.stButton>button { border:0; color:#fff; border-radius: 999px; padding:.6rem 1rem; font-weight:600;
-  box-shadow: 0 6px 16px rgba(0,0,0,0.12); transition: transform 80ms, box-shadow 80ms, filter 80ms;
-  background-image: var(--grad-1); }
-.stButton>button:hover { transform: translateY(-1px); filter: brightness(1.05); }
-.btn-alt .stButton>button { background-image: var(--grad-2); }
-.btn-alt-2 .stButton>button { background-image: var(--grad-3); }
-.tip { color: var(--text-muted); font-size: .95rem; }
-.small { color: var(--text-muted); font-size: .9rem; }
-</style>
-""", unsafe_allow_html=True)
+# static/style.css is served as a static file (server.enableStaticServing), so each
+# rerun only re-sends a one-line <link> and the browser fetches the sheet once. The
+# ?v= hash busts the browser cache when the file changes. With static serving off
+# the sheet is inlined, read from disk once per process.
+STYLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static", "style.css")
+
+@st.cache_resource
+def style_tag() -> str:
+    with open(STYLE_PATH, "r", encoding="utf-8") as f:
+        css = f.read()
+    if st.get_option("server.enableStaticServing"):
+        version = hashlib.sha1(css.encode("utf-8")).hexdigest()[:10]
+        return f'<link rel="stylesheet" href="app/static/style.css?v={version}">'
+    return f"<style>\n{css}</style>"
+
+st.markdown(style_tag(), unsafe_allow_html=True)
 
 # --------------------------
-# OpenAI client (expects OPENAI_API_KEY in Streamlit Secrets)
+# LLM gateway (expects OPENAI_API_KEY in Streamlit Secrets)
 # --------------------------
-client = OpenAI(api_key=st.secrets["OPENAI_API_KEY"])
+# One pooled client per process with deadlines, retries, rate limiting and
+# request coalescing. Tune AI_RPM / AI_TPM to the org's limits. The gateway and
+# judge are only built the first time a page calls the AI, so Intro, Home and the
+# Pack Creator never read the API key or import the OpenAI SDK.
+# AI_BACKEND = "local" swaps in the in-process generator (no network, no key).
+AI_BACKEND = str(st.secrets.get("AI_BACKEND", "openai")).lower()
+ANSWER_MODEL = LOCAL_MODEL if AI_BACKEND == "local" else AI_MODEL  # keys cached answers by backend
+
+@st.cache_resource
+def get_metrics() -> MetricsRecorder:
+    # Ring buffer of per-call latency/tokens; also appended to METRICS_DB if set.
+    return MetricsRecorder(
+        capacity=int(st.secrets.get("METRICS_CAPACITY", 10000)),
+        db_path=st.secrets.get("METRICS_DB") or None,
+    )
+
+METRICS = get_metrics()
+
+@st.cache_resource
+def get_gateway() -> Backend:
+    if AI_BACKEND == "local":
+        # Kept warm for the life of the process; learns concepts from every pack on disk.
+        return LocalBackend(
+            packs=[PACK_REGISTRY.get(name) for name in PACK_REGISTRY.names()],
+            max_batch=int(st.secrets.get("AI_LOCAL_MAX_BATCH", 16)),
+            metrics=METRICS,
+        )
+    return LLMGateway(
+        api_key=st.secrets["OPENAI_API_KEY"],
+        base_url=st.secrets.get("OPENAI_BASE_URL") or None,
+        model=AI_MODEL,
+        rpm=float(st.secrets.get("AI_RPM", 500)),
+        tpm=float(st.secrets.get("AI_TPM", 200000)),
+        timeout=float(st.secrets.get("AI_TIMEOUT", 30)),
+        max_retries=int(st.secrets.get("AI_MAX_RETRIES", 3)),
+        metrics=METRICS,
+    )
+
+# Cross-session micro-batching: identical requests arriving within AI_BATCH_WINDOW_MS
+# share one call (with n choices when several sessions wait), and calls are
+# dispatched round-robin across tenants (sessions, rooms). 0 calls the backend directly.
+AI_BATCH_WINDOW = float(st.secrets.get("AI_BATCH_WINDOW_MS", 5)) / 1000
+AI_CALL_WAIT = float(st.secrets.get("AI_CALL_WAIT", 120))
+
+@st.cache_resource
+def get_scheduler() -> AIScheduler:
+    return AIScheduler(
+        get_gateway(),
+        window=AI_BATCH_WINDOW,
+        max_inflight=int(st.secrets.get("AI_BATCH_INFLIGHT", 16)),
+        per_tenant=int(st.secrets.get("AI_TENANT_INFLIGHT", 4)),
+        max_n=int(st.secrets.get("AI_BATCH_MAX_N", 4)),
+        metrics=METRICS,
+        on_complete=observe_usage,
+    )
+
+@st.cache_resource
+def get_game_store(path: str):
+    # Round history + leaderboards; set GAME_DB = "" in secrets to disable.
+    return GameStore(path) if path else None
+
+GAME_STORE = get_game_store(st.secrets.get("GAME_DB", "game.sqlite3"))
+
+@st.cache_resource
+def get_judge() -> JudgeEngine:
+    return JudgeEngine(get_gateway(), model=ANSWER_MODEL)
+
+# Originality scores without a judge call: every voted answer is added to a local
+# similarity index, and the showdown compares both ideas against earlier answers to
+# the same prompt. Past rounds are loaded from GAME_STORE in the background, so the
+# first page view doesn't wait on history.
+@st.cache_resource
+def get_novelty_index() -> Optional[NoveltyIndex]:
+    if not st.secrets.get("NOVELTY", True):
+        return None
+    index = NoveltyIndex(
+        dims=int(st.secrets.get("NOVELTY_DIMS", 256)),
+        max_rows=int(st.secrets.get("NOVELTY_MAX_ROWS", 1_000_000)),
+        dup_threshold=float(st.secrets.get("NOVELTY_DUP_THRESHOLD", 0.9)),
+    )
+    if GAME_STORE:
+        def load_history(after_id: int = 0):
+            while True:
+                rows = GAME_STORE.answers(after_id, limit=5000)
+                if not rows:
+                    return
+                index.add_many([(p, h) for _, p, h, _ in rows])
+                index.add_many([(p, a) for _, p, _, a in rows], copy_source=False)
+                after_id = rows[-1][0]
+        threading.Thread(target=load_history, name="novelty-bootstrap", daemon=True).start()
+    return index
+
+NOVELTY = get_novelty_index()
 
 # --------------------------
 # Session State
 # --------------------------
+# Small scalars live in st.session_state. The prompt, both answers and the
+# Yes, And… story live in this session's SessionRecord: SESSIONS keeps each one
+# under SESSION_MAX_KB (older story lines go to SESSION_DB, "" to just drop
+# them) and drops records idle for SESSION_TTL seconds.
+@st.cache_resource
+def get_session_manager() -> SessionManager:
+    return SessionManager(
+        db_path=st.secrets.get("SESSION_DB", "sessions.sqlite3") or None,
+        ttl=float(st.secrets.get("SESSION_TTL", 1800)),
+        max_bytes=int(st.secrets.get("SESSION_MAX_KB", 64)) * 1024,
+        story_tail=int(st.secrets.get("SESSION_STORY_TAIL", 40)),
+    )
+
+SESSIONS = get_session_manager()
+
+# Answers are capped where they are typed, so a record over budget never has to
+# cut a player's text.
+ANSWER_MAX_CHARS = int(st.secrets.get("ANSWER_MAX_CHARS", 4000))
+LINE_MAX_CHARS = int(st.secrets.get("LINE_MAX_CHARS", 500))
+
 defaults = {
-    "page": "intro",       # "intro" -> "home" -> "play" -> "creator"
+    "page": "intro",       # "intro" -> "home" -> "play" -> "creator" / "room"
     "mode": None,          # "Classic", "Yes, And…", "Constraint", "Mash-up"
-    "prompt": None,
-    "user_response": "",
-    "ai_response": None,
     "score": {"Human": 0, "AI": 0},
     "round": 0,
     "difficulty": "Medium",
     "timer_total": 120,
     "timer_end": None,
-    "yes_and_story": "",
     "skip_intro_next_time": False,
     "theme": "Core Pack",
     "use_ai_judge": False,
+    "session_id": None,    # set once per browser session (uuid4)
+    "player": "",          # optional name used for the global leaderboard
+    "round_started": None, # time.time() when the current prompt was generated
+    "ai_seconds": None,    # how long the reveal took
+    "judge_verdict": None,
+    "novelty": None,       # originality scores of this round's (human, ai) ideas
+    "round_recorded": False,
+    "ai_prefetch": None,   # {"key": ..., "future": Future} started when a prompt is generated
+    "room_code": None,     # multi-player room this session has joined
+    "room_snapshot": None, # last room snapshot, re-read when the room's version changes
+    "prompt_seed": None,   # seeds this session's prompt decks (?seed=N replays a session)
+    "prompt_decks": {},    # (pack, mode, double) -> PromptDeck
+    "yes_and_spark": None,
 }
 for k, v in defaults.items():
     if k not in st.session_state:
         st.session_state[k] = v
+if st.session_state.session_id is None:
+    st.session_state.session_id = uuid.uuid4().hex
+if st.session_state.prompt_seed is None:
+    seed = st.query_params.get("seed", "")
+    st.session_state.prompt_seed = int(seed) if seed.isdigit() else random.getrandbits(32)
+SESSION = SESSIONS.get(st.session_state.session_id)
 
 # --------------------------
 # Title & Hero  (show ONLY on intro/home)
 # --------------------------
+HERO_HTML = """
+<div class="hero">
+  <h2 style="margin:.25rem 0;">Unleash your imagination ✨</h2>
+  <p style="margin:.25rem 0;">
+    Pick a mode, write your idea, and compare or collaborate with AI.
+    Start on the Introduction page to see how everything works.
+  </p>
+</div>
+"""
+
 if st.session_state.get("page", "intro") in ["intro", "home"]:
     st.title("🎲 AI Creativity Challenge")
-    st.markdown("""
-    <div class="hero">
-      <h2 style="margin:.25rem 0;">Unleash your imagination ✨</h2>
-      <p style="margin:.25rem 0;">
-        Pick a mode, write your idea, and compare or collaborate with AI.
-        Start on the Introduction page to see how everything works.
-      </p>
-    </div>
-    """, unsafe_allow_html=True)
-
-# --------------------------
-# Live timer auto-refresh
-# --------------------------
-try:
-    from streamlit_autorefresh import st_autorefresh
-    if (
-        st.session_state.get("page") == "play"
-        and st.session_state.get("timer_end")
-        and time.time() < st.session_state["timer_end"]
-    ):
-        st_autorefresh(interval=1000, limit=None, key="live-timer")
-except Exception:
-    pass
-
-# --------------------------
-# Core Pack (built-in fallback content)
-# --------------------------
-CORE_PROMPTS = [
-    # Inventions & Products
-    "Invent a new holiday that combines {A} and {B}.",
-    "Design a product for {A} that also solves a problem with {B}.",
-    "Create a gadget that makes life easier for people who love {A} but struggle with {B}.",
-    "Imagine a toy that fuses {A} with {B}.",
-    "Design a futuristic vehicle powered by {A} and inspired by {B}.",
-    "Create a food or drink that combines {A} and {B}.",
-    # Ads & Marketing
-    "Write a slogan for {A}.",
-    "Create a social media campaign for {A} using {B}.",
-    "Come up with a catchy jingle that includes both {A} and {B}.",
-    "Write a movie trailer voiceover that sells a story about {A} and {B}.",
-    # Stories & Characters
-    "Describe what happens if {A} meets {B} in the future.",
-    "Write a short story beginning with: '{A}'.",
-    "Tell a fairy tale that includes both {A} and {B}.",
-    "Imagine {A} as a superhero and {B} as their sidekick.",
-    "What happens in a world where {A} secretly controls {B}?",
-    # Worlds & What-ifs
-    "Imagine a world where {A} and {B} are everyday realities. What changes?",
-    "Describe a school subject that combines {A} and {B}.",
-    "What would a city look like if it were built around {A} and {B}?",
-    "Imagine a festival where {A} and {B} are celebrated together.",
-    "Describe how the world would change if everyone suddenly valued {A} more than {B}.",
-    # Weird Twists
-    "Pitch a reality TV show starring {A} and {B}.",
-    "Imagine a magical spell powered by {A} but cursed by {B}.",
-    "If {A} could talk, what would it say to {B}?",
-    "Write a newspaper headline about {A} colliding with {B}.",
-    "Create a conspiracy theory linking {A} and {B}.",
-    # Role-play
-    "Pretend you are {A}, trying to convince people to love {B}.",
-    "Write a diary entry from {A} about their adventure with {B}.",
-    "Imagine a debate between {A} and {B} on live TV.",
-]
-CORE_CONCEPTS = [
-    # Everyday
-    "bananas","umbrellas","coffee","backpacks","mirrors","shoes","toothbrushes",
-    "keys","lamps","sunglasses","stairs","beds","refrigerators","bicycles",
-    # Food & Drink
-    "pizza","ice cream","sushi","tacos","chocolate","spaghetti","smoothies",
-    "tea","burgers","cheese","doughnuts","sandwiches","oranges",
-    # Animals & Myth
-    "cats","dogs","parrots","octopuses","penguins","whales","bees","cows",
-    "dragons","unicorns","dinosaurs","werewolves","phoenixes","mermaids",
-    # People / Characters
-    "pirates","astronauts","wizards","robots","ninjas","vampires","superheroes",
-    "clowns","detectives","chefs","pop stars","zombies",
-    # Places
-    "space stations","volcanoes","haunted houses","castles","deserts","jungles",
-    "theme parks","beaches","libraries","underwater cities","floating islands",
-    # Tech & Science
-    "time travel","AI","holograms","quantum computers","self-driving cars",
-    "virtual reality","jetpacks","lasers","drones","3D printers","black holes",
-    # Arts & Media
-    "TikTok","YouTube","comic books","video games","paintings","poetry",
-    "musicals","movies","podcasts","memes","dance","fashion shows",
-]
-CORE_CONSTRAINTS = [
-    # Word / length limits
-    "must use only 10 words",
-    "must be exactly 3 sentences long",
-    "must include at least one question",
-    "must rhyme",
-    "must be written backwards",
-    "must only use words of 5 letters or less",
-    # Style / genre
-    "must be written as a haiku",
-    "must be written as a rap verse",
-    "must be in Shakespearean style",
-    "must sound like a news headline",
-    "must be written like a fairy tale",
-    "must be an instruction manual",
-    "must be in the style of a recipe",
-    "must be a tweet (under 280 characters)",
-    "must be written like a motivational poster",
-    "must be a breaking news alert",
-    "must sound like a love letter",
-    # Characters / tone
-    "must mention cats",
-    "must include a banana",
-    "must feature pirates",
-    "must have a plot twist at the end",
-    "must include dialogue between two characters",
-    "must be funny",
-    "must be scary",
-    "must be inspirational",
-    # Surreal twists
-    "must be set in space",
-    "must include a time machine",
-    "must describe a dream",
-    "must use only emojis",
-    "must swap the roles of {A} and {B}",
-]
+    st.markdown(HERO_HTML, unsafe_allow_html=True)
+
+# --------------------------
+# Live timer
+# --------------------------
+# "client" (default): the countdown ticks in the browser and the server is only
+# woken when time runs out. "server": the bar is a fragment redrawn once a second,
+# so each tick re-sends the bar alone rather than the whole page.
+TIMER_MODE = str(st.secrets.get("TIMER_MODE", "client")).lower()
 
 # --------------------------
 # Theme Pack Loader
 # --------------------------
+@st.cache_resource
+def get_pack_registry() -> PackRegistry:
+    # One registry per process: packs are parsed once and shared by all sessions.
+    # Near-duplicate items are dropped once per pack version (PACK_DEDUPE = false keeps them).
+    dedupe = DedupeSettings(
+        dup_threshold=float(st.secrets.get("PACK_DUP_THRESHOLD", 0.8)),
+        group_threshold=float(st.secrets.get("PACK_GROUP_THRESHOLD", 0.4)),
+    ) if st.secrets.get("PACK_DEDUPE", True) else None
+    return PackRegistry("packs", CORE_PACK, dedupe=dedupe)
+
+PACK_REGISTRY = get_pack_registry()
+
 def list_packs() -> List[str]:
-    packs_dir = "packs"
-    names = ["Core Pack"]
-    if os.path.isdir(packs_dir):
-        for f in os.listdir(packs_dir):
-            if f.endswith(".json"):
-                names.append(os.path.splitext(f)[0])
-    return sorted(set(names))
-
-def load_pack(name: str) -> Dict[str, List[str]]:
-    if name == "Core Pack":
-        return {"prompts": CORE_PROMPTS, "concepts": CORE_CONCEPTS, "constraints": CORE_CONSTRAINTS}
-    path = os.path.join("packs", f"{name}.json")
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return {
-            "prompts": data.get("prompts", []) or CORE_PROMPTS,
-            "concepts": data.get("concepts", []) or CORE_CONCEPTS,
-            "constraints": data.get("constraints", []) or CORE_CONSTRAINTS,
-        }
-    except Exception:
-        return {"prompts": CORE_PROMPTS, "concepts": CORE_CONCEPTS, "constraints": CORE_CONSTRAINTS}
+    return PACK_REGISTRY.names()
+
+def load_pack(name: str) -> Pack:
+    return PACK_REGISTRY.get(name)
 
 AVAILABLE_PACKS = list_packs()
-PACK = load_pack(st.session_state.theme)
 
 # --------------------------
 # Sidebar Settings
@@ -248,6 +279,12 @@ st.session_state.theme = st.sidebar.selectbox(
 )
 PACK = load_pack(st.session_state.theme)
 
+# Player name for the persistent leaderboard
+st.session_state.player = st.sidebar.text_input(
+    "🏷️ Player name (optional)", value=st.session_state.player, max_chars=40,
+    help="Rounds you vote on are saved under this name for the global leaderboard."
+).strip()
+
 # AI Judge toggle
 st.session_state.use_ai_judge = st.sidebar.checkbox(
     "🤖 Use AI Judge (beta)",
@@ -255,6 +292,12 @@ st.session_state.use_ai_judge = st.sidebar.checkbox(
     help="Have an impartial rubric pick a winner with a one-sentence reason."
 )
 
+# Pack cache stats (append ?debug=1 to the URL)
+if st.query_params.get("debug"):
+    with st.sidebar.expander("📦 Pack cache"):
+        st.json(PACK_REGISTRY.stats())
+        st.caption(f"Prompt seed: {st.session_state.prompt_seed} (add ?seed=N to replay)")
+
 # Sidebar nav shortcut to Pack Creator
 st.sidebar.markdown("---")
 if st.sidebar.button("🧰 Open Pack Creator"):
@@ -264,52 +307,396 @@ if st.sidebar.button("🧰 Open Pack Creator"):
 difficulty_guidance = {"Easy": "Write 1–2 sentences.", "Medium": "Write 3–4 sentences.", "Hard": "Write 5–6 sentences."}
 
 # --------------------------
-# AI helpers: build messages + token caps
+# AI calls: streaming with a blocking fallback
+# --------------------------
+AI_STREAMING = bool(st.secrets.get("AI_STREAMING", True))
+
+# Optional shared response cache: "memory" (default), "sqlite" or "off".
+@st.cache_resource
+def get_response_cache(kind: str):
+    max_entries = int(st.secrets.get("AI_CACHE_MAX_ENTRIES", 5000))
+    ttl = float(st.secrets.get("AI_CACHE_TTL", 86400))
+    variants = int(st.secrets.get("AI_CACHE_VARIANTS", 3))
+    if kind == "sqlite":
+        return SqliteResponseCache(st.secrets.get("AI_CACHE_PATH", "ai_cache.sqlite3"),
+                                   max_entries=max_entries, ttl=ttl, variants=variants)
+    if kind == "memory":
+        return ResponseCache(max_entries=max_entries, ttl=ttl, variants=variants)
+    return None
+
+RESPONSE_CACHE = get_response_cache(str(st.secrets.get("AI_CACHE", "memory")).lower())
+
+# Pre-generated answers from pregen.py are served before the cache and the API.
+@st.cache_resource
+def get_answer_store(path: str):
+    return AnswerStore(path) if path and os.path.exists(path) else None
+
+ANSWER_STORE = get_answer_store(st.secrets.get("AI_ANSWER_STORE", "answers.sqlite3"))
+
+def ai_tags(mode: str, difficulty: str) -> dict:
+    # Labels attached to every recorded AI call; "tenant" is what the scheduler keeps fair
+    return {"mode": mode, "difficulty": difficulty, "pack": st.session_state.theme,
+            "tenant": st.session_state.session_id}
+
+# Adaptive max_tokens + early stop: the tokens-per-word ratio of each mode and
+# difficulty is learned from reported usage (AI_TOKEN_BUDGET = false keeps the fixed caps).
+AI_TOKEN_BUDGET = bool(st.secrets.get("AI_TOKEN_BUDGET", True))
+
+@st.cache_resource
+def get_token_budget() -> TokenBudget:
+    return TokenBudget()
+
+TOKEN_BUDGET = get_token_budget()
+
+def observe_usage(tags, completion):
+    tags = tags or {}
+    if tags.get("mode") and tags.get("difficulty"):
+        TOKEN_BUDGET.observe(tags["mode"], tags["difficulty"], completion.choices or (completion.text,),
+                             completion.completion_tokens)
+
+def plan_tokens(mode: str, difficulty: str, prompt: str, max_tokens: int) -> Optional[Budget]:
+    # `mode` should match the "mode" tag of the call, so usage is learned under the same key.
+    return TOKEN_BUDGET.plan(mode, difficulty, prompt, max_tokens) if AI_TOKEN_BUDGET else None
+
+def _ai_lookup(key: str, tags=None):
+    started = time.monotonic()
+    text, source = (ANSWER_STORE.get(key) if ANSWER_STORE else None), "store"
+    if not text and RESPONSE_CACHE:
+        text, source = RESPONSE_CACHE.get(key), "cache"
+    if text:
+        labels = {k: v for k, v in (tags or {}).items() if k != "queued_at"}
+        METRICS.record(source=source, model=ANSWER_MODEL, ttft_s=0.0,
+                       total_s=round(time.monotonic() - started, 4), **labels)
+    return text
+
+def _ai_call(messages, max_tokens: int, temperature: float, tags=None) -> str:
+    if AI_BATCH_WINDOW <= 0:
+        completion = get_gateway().complete(messages, max_tokens, temperature, tags=tags)
+        observe_usage(tags, completion)
+        return completion.text
+    tenant = (tags or {}).get("tenant", "")
+    return get_scheduler().submit(messages, max_tokens, temperature, tenant=tenant, tags=tags).result(
+        timeout=AI_CALL_WAIT)
+
+def ai_complete(messages, max_tokens: int, temperature: float, tags=None, budget: Optional[Budget] = None) -> str:
+    # Cached answers stay keyed on the fixed cap; `budget` only changes what is sent.
+    key = cache_key(messages, max_tokens, ANSWER_MODEL, temperature)
+    cached = _ai_lookup(key, tags)
+    if cached:
+        return cached
+    text = _ai_call(messages, budget.max_tokens if budget else max_tokens, temperature, tags)
+    if budget:
+        text = TOKEN_BUDGET.finish(budget, text, streamed=False)
+    if RESPONSE_CACHE:
+        RESPONSE_CACHE.put(key, text)
+    return text
+
+def ai_stream(messages, max_tokens: int, temperature: float, tags=None, budget: Optional[Budget] = None):
+    """Yield text deltas as they arrive. Falls back to one blocking call if streaming fails.
+    With a ``budget`` the stream is cut and closed where its sentence/word rule is met."""
+    key = cache_key(messages, max_tokens, ANSWER_MODEL, temperature)
+    cached = _ai_lookup(key, tags)
+    if cached:
+        yield cached
+        return
+    limit = budget.max_tokens if budget else max_tokens
+    chunks, stopped, text, broken = [], False, "", False
+    if AI_STREAMING:
+        stream = get_gateway().stream(messages, limit, temperature, tags=tags)
+        try:
+            for delta in stream:
+                end = rule_end(budget, text + delta) if budget else None
+                if end is not None:
+                    delta, stopped = delta[:end - len(text)], True
+                if delta:
+                    text += delta
+                    chunks.append(delta)
+                    yield delta
+                if stopped:
+                    break
+        except Exception:
+            # Keep a partial answer if we got one (shown, never cached); otherwise retry without streaming.
+            broken = True
+        finally:
+            stream.close()
+    if not chunks:
+        text = _ai_call(messages, limit, temperature, tags)
+        chunks.append(TOKEN_BUDGET.finish(budget, text, streamed=False) if budget else text)
+        yield chunks[0]
+    elif broken:
+        return
+    elif budget:
+        TOKEN_BUDGET.finish(budget, "".join(chunks), streamed=True, stopped_early=stopped)
+    if RESPONSE_CACHE:
+        RESPONSE_CACHE.put(key, "".join(chunks))
+
+def stream_ai_idea(messages, max_tokens: int, temperature: float = 0.9, tags=None,
+                   budget: Optional[Budget] = None) -> str:
+    # Draw a live showdown card and fill the AI column token by token.
+    # The card is cleared afterwards; show_showdown_and_vote() renders the final one.
+    holder = st.empty()
+    with holder.container():
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        cols = st.columns(2)
+        with cols[0]:
+            st.markdown("### 👤 Your Idea")
+            st.write(SESSION.user_response or "*You didn’t write anything yet!*")
+        with cols[1]:
+            st.markdown("### 🤖 AI’s Idea")
+            slot = st.empty()
+            slot.caption("AI is thinking...")
+        st.markdown('</div>', unsafe_allow_html=True)
+    text = ""
+    for delta in ai_stream(messages, max_tokens, temperature, tags, budget):
+        text += delta
+        slot.markdown(text + "▌")
+    holder.empty()
+    return text
+
+# --------------------------
+# Speculative AI pre-generation
 # --------------------------
-def ai_length_rule(difficulty: str):
-    if difficulty == "Easy":
-        return "Write 1–2 sentences. Keep it under ~60 words."
-    if difficulty == "Hard":
-        return "Write 5–6 sentences. Keep it under ~180 words."
-    return "Write 3–4 sentences. Keep it under ~120 words."
+# The prompt is fixed as soon as it is generated, so the AI's idea is started in a
+# background worker while the player writes. Reveal then only has to collect it.
+AI_PREFETCH_WAIT = float(st.secrets.get("AI_PREFETCH_WAIT", 30))
 
-def ai_common_rules():
-    return (
-        "Do not include titles, headings, disclaimers, or bullet points. "
-        "Do not explain your reasoning. Output only the final idea as plain text."
+@st.cache_resource
+def get_ai_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(
+        max_workers=int(st.secrets.get("AI_PREFETCH_WORKERS", 8)),
+        thread_name_prefix="ai-prefetch",
     )
 
-def ai_tokens_for_mode(mode: str, difficulty: str):
-    base = {"Easy": 90, "Medium": 160, "Hard": 240}[difficulty]
-    if mode == "Yes, And…":
-        return 70  # keep improv snappy
-    return base
+def ai_request_for_mode(mode: str):
+    return ai_request(mode, SESSION.prompt, st.session_state.difficulty)
+
+def _prefetch_key(request) -> str:
+    return json.dumps(request, ensure_ascii=False, sort_keys=True)
+
+def cancel_ai_prefetch():
+    # Queued work is cancelled; work already running just has its result dropped.
+    pf = st.session_state.get("ai_prefetch")
+    if pf:
+        pf["future"].cancel()
+    st.session_state.ai_prefetch = None
+
+# Constraint rounds: the AI's answer is checked locally (constraint_check) and, only
+# if it broke a checkable rule, re-asked once with a targeted fix instruction.
+@st.cache_resource
+def get_check_stats() -> CheckStats:
+    return CheckStats()
+
+CHECK_STATS = get_check_stats()
+
+def check_ai_idea(mode: str, prompt: str, difficulty: str, text: str, tags=None) -> str:
+    # Runs on the prefetch/room executor too, so it must not read session state.
+    reports = check_round(prompt, "", text) if mode == "Constraint" and text else None
+    if reports is None:
+        return text
+    CHECK_STATS.count("checked")
+    report = reports[1]
+    if report.strict_ok:  # heuristic misses alone aren't worth another call
+        return text
+    CHECK_STATS.count("failed")
+    messages, max_tokens, _ = ai_request(mode, prompt, difficulty)
+    messages = messages + [{"role": "assistant", "content": text},
+                           {"role": "user", "content": repair_instruction(report)}]
+    fix_tags = dict(tags or {}, mode=f"{(tags or {}).get('mode', mode)} · fix")
+    try:
+        fixed = ai_complete(messages, max_tokens, 0.5, fix_tags)
+    except Exception:
+        return text
+    fixed_report = check_round(prompt, "", fixed)[1]
+    if len(fixed_report.failed(strict=True)) < len(report.failed(strict=True)):
+        CHECK_STATS.count("repaired")
+        return fixed
+    CHECK_STATS.count("repair_failed")
+    return text
+
+def complete_checked(mode: str, prompt: str, difficulty: str, request, tags=None,
+                     budget: Optional[Budget] = None) -> str:
+    return check_ai_idea(mode, prompt, difficulty, ai_complete(*request, tags=tags, budget=budget), tags)
 
-def ai_messages_for_prompt(user_prompt: str, difficulty: str, extra_rule: str = ""):
-    system = f"You are a concise, imaginative writer. {ai_common_rules()} {ai_length_rule(difficulty)} {extra_rule}".strip()
-    return [{"role": "system", "content": system}, {"role": "user", "content": user_prompt}]
+def prefetch_ai_idea(mode: str):
+    cancel_ai_prefetch()
+    request = ai_request_for_mode(mode)
+    st.session_state.ai_prefetch = {
+        "key": _prefetch_key(request),
+        "future": get_ai_executor().submit(
+            complete_checked, mode, SESSION.prompt, st.session_state.difficulty, request,
+            tags={**ai_tags(mode, st.session_state.difficulty), "queued_at": time.monotonic()},
+            budget=plan_tokens(mode, st.session_state.difficulty, SESSION.prompt, request[1]),
+        ),
+    }
+
+def reveal_ai_idea(mode: str) -> str:
+    started = time.monotonic()
+    try:
+        return _reveal_ai_idea(mode)
+    finally:
+        st.session_state.ai_seconds = round(time.monotonic() - started, 3)
+
+def _reveal_ai_idea(mode: str) -> str:
+    request = ai_request_for_mode(mode)
+    pf = st.session_state.get("ai_prefetch")
+    st.session_state.ai_prefetch = None
+    # Only use the prefetched answer if nothing that shapes the request changed
+    # (e.g. the difficulty slider moved while the player was writing).
+    if pf and pf["key"] == _prefetch_key(request):
+        try:
+            with st.spinner("AI is thinking..."):
+                text = pf["future"].result(timeout=AI_PREFETCH_WAIT)
+            if text:
+                return text
+        except Exception:
+            pf["future"].cancel()
+    elif pf:
+        pf["future"].cancel()
+    tags = ai_tags(mode, st.session_state.difficulty)
+    text = stream_ai_idea(*request, tags=tags,
+                          budget=plan_tokens(mode, st.session_state.difficulty, SESSION.prompt, request[1]))
+    return check_ai_idea(mode, SESSION.prompt, st.session_state.difficulty, text, tags)
+
+# --------------------------
+# Multi-player rooms
+# --------------------------
+# Room state lives in one process-wide store. Each client redraws only the live
+# room fragment, every ROOM_POLL seconds, and copies the room out of the store
+# only when its version has changed.
+ROOM_POLL = float(st.secrets.get("ROOM_POLL", 1.0))
+
+def room_ai_idea(code: str, mode: str, prompt: str, difficulty: str) -> str:
+    # Runs on the executor, once per room round, so it can't read session state.
+    # Each room is its own scheduler tenant, so one busy room can't hold every slot.
+    tags = {"mode": f"Room · {mode}", "difficulty": difficulty, "tenant": f"room:{code}"}
+    request = ai_request(mode, prompt, difficulty)
+    return complete_checked(mode, prompt, difficulty, request, tags=tags,
+                            budget=plan_tokens(tags["mode"], difficulty, prompt, request[1]))
+
+@st.cache_resource
+def get_room_store() -> RoomStore:
+    return RoomStore(get_ai_executor(), room_ai_idea)
+
+ROOM_STORE = get_room_store()
 
 # --------------------------
 # Helpers
 # --------------------------
+def draw_prompt(mode: str, double_constraint: bool = False) -> str:
+    # No repeats within the session until the pack's prompt space is used up.
+    double = double_constraint and mode == "Constraint" and len(compile_pack(PACK).constraints) > 1
+    deck = deck_for(st.session_state.prompt_decks, PACK, st.session_state.theme, mode,
+                    st.session_state.prompt_seed, double)
+    return deck.draw()
+
+TIMER_HTML = """
+<div style="font-family: 'Source Sans Pro', sans-serif;">
+  <div style="height:.5rem;border-radius:.25rem;background:rgba(151,166,195,.25);overflow:hidden;">
+    <div id="bar" style="height:100%;width:0;background:#FF4B4B;transition:width 1s linear;"></div>
+  </div>
+  <div id="msg" style="margin-top:.75rem;padding:1rem;border-radius:.5rem;
+       background:rgba(255,227,18,.1);color:#926c05;font-size:1rem;"></div>
+</div>
+<script>
+  const total = __TOTAL__, end = Date.now() + __REMAINING_MS__;
+  const bar = document.getElementById("bar"), msg = document.getElementById("msg");
+  function tick() {
+    const left = Math.max(0, Math.ceil((end - Date.now()) / 1000));
+    bar.style.width = (100 * Math.min(total, total - left) / total) + "%";
+    msg.textContent = left > 0 ? "⏱️ Time left: " + left + " seconds" : "⏰ Time’s up!";
+    if (left > 0) setTimeout(tick, 250);
+  }
+  tick();
+</script>
+"""
+
+def _timer_expiry_watch():
+    # Runs as a fragment scheduled for the deadline; only then rerun the whole page.
+    if st.session_state.timer_end and time.time() >= st.session_state.timer_end:
+        st.rerun()
+
+def render_client_timer(remaining: float, total: int):
+    # The countdown and progress bar run in the browser; no server reruns per tick.
+    html = (TIMER_HTML.replace("__TOTAL__", str(int(total)))
+            .replace("__REMAINING_MS__", str(int(remaining * 1000))))
+    if hasattr(st, "iframe"):
+        st.iframe(html, height=90)
+    else:  # streamlit < 1.56 has no st.iframe; fall back to the (deprecated there) components API
+        import streamlit.components.v1 as components
+        components.html(html, height=90)
+    st.fragment(_timer_expiry_watch, run_every=max(1.0, remaining + 0.25))()
+
+def _server_timer_tick():
+    # Runs as a fragment every second; the whole page is only rerun once time is up.
+    end = st.session_state.timer_end
+    remaining = max(0, int(end - time.time())) if end else 0
+    if remaining == 0:
+        st.rerun()
+    total = st.session_state.timer_total
+    st.progress(min(total, total - remaining) / total)
+    st.warning(f"⏱️ Time left: {remaining} seconds")
+
+def render_timer():
+    remaining = max(0, int(st.session_state.timer_end - time.time()))
+    total = st.session_state.timer_total
+    if remaining == 0:
+        st.progress(1.0)
+        st.warning("⏰ Time’s up!")
+    elif TIMER_MODE == "server":
+        st.fragment(_server_timer_tick, run_every=1.0)()
+    else:
+        render_client_timer(st.session_state.timer_end - time.time(), total)
+
+def new_round():
+    SESSION.ai_response = None
+    SESSION.user_response = ""
+    st.session_state.round += 1
+    st.session_state.round_started = time.time()
+    st.session_state.ai_seconds = None
+    st.session_state.judge_verdict = None
+    st.session_state.novelty = None
+    st.session_state.round_recorded = False
+
+def record_vote(winner: str):
+    # Persist the first vote of each round; the store writes in the background.
+    if st.session_state.round_recorded or not GAME_STORE:
+        return
+    started = st.session_state.round_started
+    verdict = st.session_state.judge_verdict
+    GAME_STORE.record_round(
+        session_id=st.session_state.session_id, player=st.session_state.player or None,
+        mode=st.session_state.mode, difficulty=st.session_state.difficulty, pack=st.session_state.theme,
+        prompt=SESSION.prompt, human=SESSION.user_response, ai=SESSION.ai_response,
+        vote=winner, judge_winner=verdict.winner if verdict else None,
+        judge_reason=verdict.reason if verdict else None,
+        write_s=round(time.time() - started, 2) if started else None, ai_s=st.session_state.ai_seconds,
+    )
+    st.session_state.round_recorded = True
+    if NOVELTY:
+        # The AI's answers repeat through the caches, so only the player's can be copied.
+        NOVELTY.add(SESSION.prompt, [SESSION.user_response])
+        NOVELTY.add(SESSION.prompt, [SESSION.ai_response], copy_source=False)
+
 def back_to_nav():
     st.divider()
     cols = st.columns(4)
     with cols[0]:
         if st.button("🏠 Home"):
+            cancel_ai_prefetch()
             st.session_state.page = "home"
             st.session_state.mode = None
-            st.session_state.prompt = None
-            st.session_state.user_response = ""
-            st.session_state.ai_response = None
+            SESSION.prompt = None
+            SESSION.user_response = ""
+            SESSION.ai_response = None
             st.session_state.timer_end = None
     with cols[1]:
         if st.button("📖 Introduction"):
+            cancel_ai_prefetch()
             st.session_state.page = "intro"
             st.session_state.mode = None
-            st.session_state.prompt = None
-            st.session_state.user_response = ""
-            st.session_state.ai_response = None
+            SESSION.prompt = None
+            SESSION.user_response = ""
+            SESSION.ai_response = None
             st.session_state.timer_end = None
     with cols[2]:
         if st.button("🧰 Pack Creator"):
@@ -319,56 +706,67 @@ def back_to_nav():
         if st.button("🔄 Reset Scoreboard"):
             st.session_state.score = {"Human": 0, "AI": 0}
 
-def fmt_dynamic(text: str, A: str, B: str) -> str:
-    return text.replace("{A}", A).replace("{B}", B)
+def check_caption(report) -> str:
+    if report.ok:
+        return f"✅ Meets the {len(report.results)} checkable constraint(s)"
+    return "⚠️ Breaks " + "; ".join(f"“{r.constraint}” ({r.detail})" for r in report.failed())
+
+def novelty_caption(score) -> str:
+    if score.duplicate:
+        return f"⚠️ Near-duplicate of an earlier answer (similarity {score.similarity:.2f})"
+    if score.originality is None:
+        return "🌟 First answer to this prompt"
+    return f"🌟 Originality {score.originality}/100 vs {score.compared} earlier answer(s)"
 
 def show_showdown_and_vote():
+    # Constraint rounds: both answers are checked locally (microseconds, no AI call).
+    reports = check_round(SESSION.prompt, SESSION.user_response, SESSION.ai_response) \
+        if st.session_state.mode == "Constraint" else None
+    # Scored once per round, before this round's vote adds the answers to the index.
+    if NOVELTY and st.session_state.novelty is None:
+        st.session_state.novelty = NOVELTY.score(SESSION.prompt, [SESSION.user_response, SESSION.ai_response or ""],
+                                                 flag=[True, False])
+    novelty = st.session_state.novelty
     st.markdown('<div class="card">', unsafe_allow_html=True)
     cols = st.columns(2)
     with cols[0]:
         st.markdown("### 👤 Your Idea")
-        st.write(st.session_state.user_response or "*You didn’t write anything yet!*")
+        st.write(SESSION.user_response or "*You didn’t write anything yet!*")
+        if reports:
+            st.caption(check_caption(reports[0]))
+        if novelty and SESSION.user_response:
+            st.caption(novelty_caption(novelty[0]))
     with cols[1]:
         st.markdown("### 🤖 AI’s Idea")
-        st.write(st.session_state.ai_response)
+        st.write(SESSION.ai_response)
+        if reports:
+            st.caption(check_caption(reports[1]))
+        if novelty:
+            st.caption(novelty_caption(novelty[1]))
     st.markdown('</div>', unsafe_allow_html=True)
 
     # Optional AI Judge
     if st.session_state.use_ai_judge and st.button("⚖️ Ask AI Judge"):
-        rubric = (
-            "Judge for creativity, clarity, and adherence to constraints/guidance. "
-            "Output strictly: Winner: <Human|AI>. Reason: <one short sentence>."
-        )
-        judge_prompt = f"""
-PROMPT: {st.session_state.prompt}
-
-HUMAN: {st.session_state.user_response}
-
-AI: {st.session_state.ai_response}
-
-{rubric}
-"""
-        resp = client.chat.completions.create(
-            model="gpt-4o-mini",
-            messages=[
-                {"role": "system", "content": "Be concise and decisive. No preambles."},
-                {"role": "user", "content": judge_prompt}
-            ],
-            max_tokens=80, temperature=0.3,
+        # Verdicts are memoized per (prompt, human, ai), so asking twice is free.
+        verdict = get_judge().judge(
+            SESSION.prompt, SESSION.user_response, SESSION.ai_response,
+            tags=ai_tags("AI Judge", st.session_state.difficulty),
         )
-        verdict = resp.choices[0].message.content.strip()
-        st.info(verdict)
+        st.session_state.judge_verdict = verdict
+        st.info(verdict.text())
 
     st.subheader("🗳️ Vote")
     c1, c2 = st.columns(2)
     with c1:
         if st.button("👍 Human Wins"):
             st.session_state.score["Human"] += 1
+            record_vote("Human")
             st.balloons()
             st.success("Point for Human!")
     with c2:
         if st.button("🤖 AI Wins"):
             st.session_state.score["AI"] += 1
+            record_vote("AI")
             st.snow()
             st.info("Point for AI!")
     st.write(f"**Human:** {st.session_state.score['Human']} | **AI:** {st.session_state.score['AI']}")
@@ -376,8 +774,7 @@ AI: {st.session_state.ai_response}
 # --------------------------
 # INTRODUCTION PAGE
 # --------------------------
-def render_intro():
-    st.markdown("""
+INTRO_MD = """
 ### 👋 Welcome
 This is a playful space to practice **originality**, **imagination**, and **storycraft** with a little help from AI.
 
@@ -404,7 +801,10 @@ Add your own packs in `packs/*.json` or use the **Pack Creator**.
 #### Scoring
 - **Classic, Constraint, Mash-up**: vote Human or AI each round → scoreboard updates.  
 - **Yes, And…**: collaborative; **no scoring**.
-""")
+"""
+
+def render_intro():
+    st.markdown(INTRO_MD)
     st.checkbox("Skip this introduction next time", value=st.session_state.skip_intro_next_time,
                 key="skip_intro_next_time", help="We'll take you straight to the Home screen on reload.")
     st.divider()
@@ -414,38 +814,26 @@ Add your own packs in `packs/*.json` or use the **Pack Creator**.
 # --------------------------
 # HOME (mode chooser with descriptions)
 # --------------------------
-def render_home():
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown("## 🎮 Classic Mode")
-    st.write("Head-to-head prompts with timer & voting.")
-    if st.button("Start Classic ▶️"):
-        st.session_state.mode = "Classic"
-        st.session_state.page = "play"
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown("## 🎭 Yes, And… Mode (Improv)")
-    st.write("Collaborative storytelling: you add a line, AI continues (no scoring).")
-    if st.button("Start Yes, And… ▶️"):
-        st.session_state.mode = "Yes, And…"
-        st.session_state.page = "play"
-    st.markdown('</div>', unsafe_allow_html=True)
-
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown("## 🔒 Constraint Mode")
-    st.write("Classic but with silly restrictions (haiku, rhyme, emojis…).")
-    if st.button("Start Constraint ▶️"):
-        st.session_state.mode = "Constraint"
-        st.session_state.page = "play"
-    st.markdown('</div>', unsafe_allow_html=True)
+# (page, mode, title, blurb, button). Each card is one pre-built HTML element.
+HOME_CARDS = [
+    ("play", "Classic", "🎮 Classic Mode", "Head-to-head prompts with timer & voting.", "Start Classic ▶️"),
+    ("play", "Yes, And…", "🎭 Yes, And… Mode (Improv)",
+     "Collaborative storytelling: you add a line, AI continues (no scoring).", "Start Yes, And… ▶️"),
+    ("play", "Constraint", "🔒 Constraint Mode", "Classic but with silly restrictions (haiku, rhyme, emojis…).",
+     "Start Constraint ▶️"),
+    ("play", "Mash-up", "🌀 Mash-up Mode", "Blend two random concepts into one idea, then vote.", "Start Mash-up ▶️"),
+    ("room", None, "👥 Room Mode (Multiplayer)",
+     "One host deals the prompt, everyone writes, the AI answers once for the room, then all vote.", "Open Rooms ▶️"),
+]
+HOME_CARD_HTML = [f'<div class="card"><h3>{title}</h3><p>{blurb}</p></div>' for _, _, title, blurb, _ in HOME_CARDS]
 
-    st.markdown('<div class="card">', unsafe_allow_html=True)
-    st.markdown("## 🌀 Mash-up Mode")
-    st.write("Blend two random concepts into one idea, then vote.")
-    if st.button("Start Mash-up ▶️"):
-        st.session_state.mode = "Mash-up"
-        st.session_state.page = "play"
-    st.markdown('</div>', unsafe_allow_html=True)
+def render_home():
+    for (page, mode, _, _, label), html in zip(HOME_CARDS, HOME_CARD_HTML):
+        st.markdown(html, unsafe_allow_html=True)
+        if st.button(label):
+            st.session_state.page = page
+            if mode:
+                st.session_state.mode = mode
 
     st.divider()
     st.markdown("### 🏆 Scoreboard (this session)")
@@ -453,6 +841,17 @@ def render_home():
     if st.button("🔄 Reset Scoreboard"):
         st.session_state.score = {"Human": 0, "AI": 0}
 
+    if GAME_STORE:
+        st.markdown("### 🌍 Global Leaderboard")
+        overall = GAME_STORE.totals().get("*", {"Human": 0, "AI": 0, "rounds": 0})
+        st.write(f"**Humans:** {overall['Human']} | **AI:** {overall['AI']} · {overall['rounds']} rounds played")
+        if st.session_state.player:
+            mine = GAME_STORE.player_totals(st.session_state.player)
+            st.caption(f"{st.session_state.player} (all-time): Human {mine['Human']} | AI {mine['AI']}")
+        top = GAME_STORE.leaderboard(10)
+        if top:
+            st.dataframe(top, hide_index=True)
+
 # --------------------------
 # PACK CREATOR PAGE
 # --------------------------
@@ -480,120 +879,149 @@ def render_pack_creator():
         )
         st.info("Tip: Use {A} and {B} in prompts/constraints for auto mash-ups.")
 
-    def _split_lines(s): return [ln.strip() for ln in (s or "").splitlines() if ln.strip()]
-    prompts = _split_lines(prompts_text)
-    concepts = _split_lines(concepts_text)
-    constraints = _split_lines(constraints_text)
+    # Bulk import: line-delimited files are merged after the typed lines
+    imports = {}
+    with st.expander("📥 Bulk import from files (.txt, .csv, .tsv — one item per line)"):
+        for kind in PACK_KEYS:
+            files = st.file_uploader(kind.capitalize(), type=["txt", "csv", "tsv"],
+                                     accept_multiple_files=True, key=f"pack_import_{kind}")
+            imports[kind] = [check_section(kind, read_lines_file(f.getvalue(), f.name)) for f in files or []]
 
-    # Validation
-    errors = []
-    if not pack_name.strip(): errors.append("Please enter a pack name.")
-    if not prompts: errors.append("Add at least one prompt.")
-    if not concepts: errors.append("Add at least a few concepts (e.g., 5+).")
-    if not constraints: errors.append("Add at least one constraint.")
+    # Each section is parsed/validated once per distinct text (hash-memoized)
+    typed = {"prompts": prompts_text, "concepts": concepts_text, "constraints": constraints_text}
+    sections = {k: merge_sections(k, [check_section(k, typed[k])] + imports[k]) for k in PACK_KEYS}
+    errors = pack_errors(pack_name, sections)
+    safe_name = safe_pack_name(pack_name)
 
-    # Filename-safe
-    safe_name = re.sub(r"[^A-Za-z0-9 _-]+", "", pack_name).strip().replace(" ", "_")
-    json_obj = {"prompts": prompts, "concepts": concepts, "constraints": constraints}
-    json_str = json.dumps(json_obj, ensure_ascii=False, indent=2)
+    st.caption(" · ".join(f"{len(sections[k].items)} {k}" for k in PACK_KEYS))
+    notes = [w for k in PACK_KEYS for w in sections[k].warnings]
+    if notes:
+        with st.expander(f"⚠️ {len(notes)} note(s)"):
+            st.write("\n".join(f"- {w}" for w in notes))
 
     st.markdown("### Preview JSON")
-    st.code(json_str, language="json")
+    st.code(preview(sections), language="json")
 
     st.download_button(
         "⬇️ Download Pack JSON",
-        data=json_str.encode("utf-8"),
+        data=pack_json(sections).encode("utf-8"),
         file_name=f"{safe_name}.json",
         mime="application/json"
     )
 
-    if st.button("💾 Save to `packs/` and Load"):
-        if errors:
-            st.warning(" • " + "\n • ".join(errors))
-        else:
-            try:
-                os.makedirs("packs", exist_ok=True)
-                with open(os.path.join("packs", f"{safe_name}.json"), "w", encoding="utf-8") as f:
-                    f.write(json_str)
-                st.success(f"Saved to packs/{safe_name}.json")
-                # refresh pack list & select the new one
-                global AVAILABLE_PACKS, PACK
-                AVAILABLE_PACKS = list_packs()
-                st.session_state.theme = safe_name
-                PACK = load_pack(st.session_state.theme)
-                st.experimental_rerun()
-            except Exception as e:
-                st.error(f"Could not save to packs/: {e}")
-
-    if not errors:
+    st.button("💾 Save to `packs/` and Load", on_click=save_and_select_pack, args=(safe_name, sections, errors))
+    result = st.session_state.pop("pack_save_result", None)
+    if result:
+        getattr(st, result[0])(result[1])
+    elif not errors:
         st.caption("Looks good! You can save and/or download the pack now.")
 
+def save_and_select_pack(name: str, sections, errors: List[str]):
+    # Button callback: runs before the rerun, so the sidebar picks up the new pack.
+    if errors:
+        st.session_state.pack_save_result = ("warning", " • " + "\n • ".join(errors))
+        return
+    try:
+        path = save_pack("packs", name, sections)
+    except Exception as e:
+        st.session_state.pack_save_result = ("error", f"Could not save to packs/: {e}")
+        return
+    PACK_REGISTRY.invalidate(name)
+    st.session_state.theme = name
+    st.session_state.pack_save_result = ("success", f"Saved to {path}")
+
 # --------------------------
 # Modes
 # --------------------------
+# Each page is split: the header, nav and round controls are drawn on full reruns,
+# while the round itself (prompt, timer, answer, showdown, vote) is a fragment.
+# Typing, revealing, judging and voting rerun only the fragment.
+@st.fragment
+def round_area(mode: str, answer_label: str, placeholder: str, reveal_label: str):
+    st.markdown(f"**Round:** {st.session_state.round}")
+    st.info(SESSION.prompt)
+    st.markdown(f"**Guidance:** {difficulty_guidance[st.session_state.difficulty]}")
+    st.caption("✍️ Tip: AI is limited to the same depth. Aim for the guidance above.")
+    if mode == "Classic" and st.session_state.timer_end:
+        render_timer()
+    SESSION.user_response = st.text_area(
+        answer_label, height=150, value=SESSION.user_response, placeholder=placeholder, max_chars=ANSWER_MAX_CHARS
+    )
+    if st.button(reveal_label):
+        SESSION.ai_response = reveal_ai_idea(mode)
+    SESSIONS.fit(SESSION)
+    if SESSION.ai_response:
+        show_showdown_and_vote()
+
 def render_classic():
     back_to_nav()
     st.markdown("## 📝 Classic Challenge")
     if st.button("✨ Generate Creative Prompt"):
-        template = random.choice(PACK["prompts"])
-        A, B = random.sample(PACK["concepts"], 2)
-        st.session_state.prompt = template.format(A=A, B=B)
-        st.session_state.ai_response = None
-        st.session_state.user_response = ""
-        st.session_state.round += 1
+        SESSION.prompt = draw_prompt("Classic")
+        new_round()
         st.session_state.timer_end = time.time() + st.session_state.timer_total
+        prefetch_ai_idea("Classic")
 
-    if st.session_state.prompt:
-        st.markdown(f"**Round:** {st.session_state.round}")
-        st.info(st.session_state.prompt)
-        st.markdown(f"**Guidance:** {difficulty_guidance[st.session_state.difficulty]}")
-        st.caption("✍️ Tip: AI is limited to the same depth. Aim for the guidance above.")
-        if st.session_state.timer_end:
-            remaining = max(0, int(st.session_state.timer_end - time.time()))
-            total = st.session_state.timer_total
-            elapsed = min(total, total - remaining)
-            st.progress(elapsed / total)
-            st.warning(f"⏱️ Time left: {remaining} seconds" if remaining > 0 else "⏰ Time’s up!")
-        st.session_state.user_response = st.text_area(
-            "✍️ Your Idea:", height=150, value=st.session_state.user_response,
-            placeholder="Aim for creativity and clarity. Surprise us!"
-        )
-        if st.button("🤖 See AI’s Idea"):
-            with st.spinner("AI is thinking..."):
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=ai_messages_for_prompt(st.session_state.prompt, st.session_state.difficulty),
-                    max_tokens=ai_tokens_for_mode("Classic", st.session_state.difficulty),
-                    temperature=0.9,
-                )
-                st.session_state.ai_response = resp.choices[0].message.content
-        if st.session_state.ai_response:
-            show_showdown_and_vote()
+    if SESSION.prompt:
+        round_area("Classic", "✍️ Your Idea:", "Aim for creativity and clarity. Surprise us!", "🤖 See AI’s Idea")
 
 def render_yes_and():
     back_to_nav()
     st.markdown("## 🎭 Yes, And… (Collaborative Improv)")
     st.markdown('<p class="tip">Start with a line; the AI continues; then you add another. Build a story together!</p>', unsafe_allow_html=True)
+    yes_and_story()
+
+@st.fragment
+def yes_and_story():
+    # Adding a line or starting over reruns only the story, not the page around it.
+    if SESSION.story_ctx is None:
+        # New story, or the record was evicted: rebuild the context from the lines kept.
+        SESSION.story_ctx = StoryContext()
+        for line in SESSION.story:
+            SESSION.story_ctx.add(line)
+    ctx = SESSION.story_ctx
     if st.button("Start New Story"):
-        st.session_state.yes_and_story = ""
+        SESSIONS.new_story(SESSION)
+        SESSION.story_ctx = ctx = StoryContext()
+        st.session_state.yes_and_spark = None
         st.session_state.round += 1
-    human_input = st.text_input("✍️ Your line:", placeholder="Once upon a time in a floating library...")
+    if not SESSION.story_lines:
+        if st.session_state.yes_and_spark is None:
+            st.session_state.yes_and_spark = draw_prompt("Yes, And…")
+        st.caption(f"💡 Need a spark? {st.session_state.yes_and_spark}")
+    human_input = st.text_input("✍️ Your line:", placeholder="Once upon a time in a floating library...",
+                                max_chars=LINE_MAX_CHARS)
     if st.button("Add My Line"):
         if human_input.strip():
-            st.session_state.yes_and_story += f"👤 {human_input}\n"
-            with st.spinner("AI continues..."):
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=ai_messages_for_prompt(
-                        f"Continue this story in 1–2 sentences: {st.session_state.yes_and_story}",
-                        "Easy"
-                    ),
-                    max_tokens=ai_tokens_for_mode("Yes, And…", "Easy"),
-                    temperature=0.95,
-                )
-                ai_line = resp.choices[0].message.content.strip()
-                st.session_state.yes_and_story += f"🤖 {ai_line}\n"
-    st.text_area("Story so far:", st.session_state.yes_and_story, height=320)
+            line = f"👤 {human_input}"
+            SESSIONS.add_line(SESSION, line)
+            ctx.add(line)
+            slot = st.empty()
+            ai_line = ""
+            max_tokens = ai_tokens_for_mode("Yes, And…", "Easy")
+            for delta in ai_stream(
+                ai_messages_for_prompt(ctx.prompt(), "Easy"),
+                max_tokens,
+                0.95,
+                ai_tags("Yes, And…", "Easy"),
+                plan_tokens("Yes, And…", "Easy", "", max_tokens),
+            ):
+                ai_line += delta
+                slot.markdown(f"🤖 {ai_line}▌")
+            slot.empty()
+            line = f"🤖 {ai_line.strip()}"
+            SESSIONS.add_line(SESSION, line)
+            ctx.add(line)
+            summary_tags = ai_tags("Yes, And… summary", "Easy")
+            ctx.update_summary(get_ai_executor(), lambda messages: ai_complete(messages, 120, 0.3, summary_tags))
+    st.text_area("Story so far:", "".join(f"{ln}\n" for ln in SESSION.story), height=320)
+    if SESSION.spilled:
+        with st.expander(f"📜 Full story ({SESSION.story_lines} lines; the box shows the last {len(SESSION.story)})"):
+            st.text("\n".join(SESSIONS.full_story(SESSION)))
+    if ctx.turns:
+        with st.expander("🔍 Context size per turn"):
+            st.caption("Estimated prompt tokens sent each turn vs. sending the whole story.")
+            st.dataframe(list(ctx.turns), hide_index=True)
 
 def render_constraint():
     back_to_nav()
@@ -601,80 +1029,176 @@ def render_constraint():
     st.markdown('<p class="tip">A playful restriction makes creativity pop: rhyme, haiku, emojis, bananas, and more.</p>', unsafe_allow_html=True)
     double_constraint = st.checkbox("🎯 Double challenge (use two constraints)")
     if st.button("✨ Generate Constraint Challenge"):
-        A, B = random.sample(PACK["concepts"], 2)
-        chosen = random.sample(PACK["constraints"], 2) if double_constraint else [random.choice(PACK["constraints"])]
-        filled_constraints = [fmt_dynamic(c, A, B) for c in chosen]
-        constraint_text = " AND ".join(filled_constraints)
-        st.session_state.prompt = f"Create something involving **{A}** and **{B}** — but it {constraint_text}."
-        st.session_state.ai_response = None
-        st.session_state.user_response = ""
-        st.session_state.round += 1
-    if st.session_state.prompt:
-        st.markdown(f"**Round:** {st.session_state.round}")
-        st.info(st.session_state.prompt)
-        st.markdown(f"**Guidance:** {difficulty_guidance[st.session_state.difficulty]}")
-        st.caption("✍️ Tip: AI is limited to the same depth. Aim for the guidance above.")
-        st.session_state.user_response = st.text_area(
-            "✍️ Your constrained idea:", height=150, value=st.session_state.user_response,
-            placeholder="Try meeting the constraint in a playful way…"
-        )
-        if st.button("🤖 See AI’s Constrained Idea"):
-            with st.spinner("AI is thinking..."):
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=ai_messages_for_prompt(
-                        f"Please satisfy the constraint exactly. {st.session_state.prompt}",
-                        st.session_state.difficulty,
-                        extra_rule="Strictly follow all constraints; if a word/length limit is included, obey it."
-                    ),
-                    max_tokens=ai_tokens_for_mode("Constraint", st.session_state.difficulty),
-                    temperature=0.9,
-                )
-                st.session_state.ai_response = resp.choices[0].message.content
-        if st.session_state.ai_response:
-            show_showdown_and_vote()
+        SESSION.prompt = draw_prompt("Constraint", double_constraint)
+        new_round()
+        prefetch_ai_idea("Constraint")
+    if SESSION.prompt:
+        round_area("Constraint", "✍️ Your constrained idea:", "Try meeting the constraint in a playful way…",
+                   "🤖 See AI’s Constrained Idea")
 
 def render_mashup():
     back_to_nav()
     st.markdown("## 🌀 Mash-up Mode")
     st.markdown('<p class="tip">Two random concepts walk into a bar… now blend them into something brilliant.</p>', unsafe_allow_html=True)
     if st.button("✨ Generate Mash-up Challenge"):
-        A, B = random.sample(PACK["concepts"], 2)
-        st.session_state.prompt = f"Blend **{A}** and **{B}** into a new invention, story, or ad."
-        st.session_state.ai_response = None
-        st.session_state.user_response = ""
-        st.session_state.round += 1
-    if st.session_state.prompt:
-        st.markdown(f"**Round:** {st.session_state.round}")
-        st.info(st.session_state.prompt)
-        st.markdown(f"**Guidance:** {difficulty_guidance[st.session_state.difficulty]}")
-        st.caption("✍️ Tip: AI is limited to the same depth. Aim for the guidance above.")
-        st.session_state.user_response = st.text_area(
-            "✍️ Your mash-up idea:", height=150, value=st.session_state.user_response,
-            placeholder="What’s the hook? What makes this mash-up work?"
-        )
-        if st.button("🤖 See AI’s Mash-up Idea"):
-            with st.spinner("AI is thinking..."):
-                resp = client.chat.completions.create(
-                    model="gpt-4o-mini",
-                    messages=ai_messages_for_prompt(st.session_state.prompt, st.session_state.difficulty),
-                    max_tokens=ai_tokens_for_mode("Mash-up", st.session_state.difficulty),
-                    temperature=0.9,
-                )
-                st.session_state.ai_response = resp.choices[0].message.content
-        if st.session_state.ai_response:
-            show_showdown_and_vote()
+        SESSION.prompt = draw_prompt("Mash-up")
+        new_round()
+        prefetch_ai_idea("Mash-up")
+    if SESSION.prompt:
+        round_area("Mash-up", "✍️ Your mash-up idea:", "What’s the hook? What makes this mash-up work?",
+                   "🤖 See AI’s Mash-up Idea")
+
+# --------------------------
+# ROOM PAGE
+# --------------------------
+def render_room():
+    back_to_nav()
+    st.markdown("## 👥 Room Mode")
+    code = st.session_state.room_code
+    if code and ROOM_STORE.version(code) < 0:
+        st.warning("That room has closed.")
+        st.session_state.room_code = code = None
+    if not code:
+        name = st.session_state.player or "Player"
+        c1, c2 = st.columns(2)
+        with c1:
+            st.markdown("### 🎬 Host a room")
+            room_mode = st.selectbox("Mode", ["Classic", "Constraint", "Mash-up"], key="room_mode")
+            if st.button("Create Room"):
+                room = ROOM_STORE.create(st.session_state.session_id, name, room_mode)
+                st.session_state.room_code = room.code
+                st.rerun()
+        with c2:
+            st.markdown("### 🚪 Join a room")
+            join_code = st.text_input("Room code", max_chars=5, key="room_join_code")
+            if st.button("Join Room"):
+                if ROOM_STORE.join(join_code, st.session_state.session_id, name):
+                    st.session_state.room_code = join_code.strip().upper()
+                    st.rerun()
+                else:
+                    st.error("No room with that code.")
+        st.caption("Set your name under **Player name** in the sidebar.")
+        return
+    if st.button("🚪 Leave Room"):
+        ROOM_STORE.leave(code, st.session_state.session_id)
+        st.session_state.room_code = None
+        st.rerun()
+    room_live(code)
+
+@st.fragment(run_every=ROOM_POLL)
+def room_live(code: str):
+    # Reruns on its own every ROOM_POLL seconds; the rest of the page stays put.
+    # Actions are widget callbacks, so they land in the store before the snapshot.
+    me = st.session_state.session_id
+    room = st.session_state.get("room_snapshot")
+    if room is None or room["code"] != code or room["version"] != ROOM_STORE.version(code):
+        room = st.session_state.room_snapshot = ROOM_STORE.snapshot(code)
+    if room is None:
+        st.session_state.room_code = None
+        st.warning("The host closed this room.")
+        return
+    is_host = room["host"] == me
+    st.markdown(f"**Room:** `{room['code']}` · **Mode:** {room['mode']} · **Round:** {room['round']}")
+    st.caption("Players: " + ", ".join(room["players"].values()))
+
+    if is_host:
+        h1, h2 = st.columns(2)
+        with h1:
+            st.button("✨ Deal New Prompt", on_click=lambda: ROOM_STORE.start_round(
+                code, me, draw_prompt(room["mode"]), st.session_state.difficulty))
+        with h2:
+            if room["prompt"] and not room["revealed"]:
+                st.button("🎬 Reveal Ideas", on_click=ROOM_STORE.reveal, args=(code, me))
+
+    if not room["prompt"]:
+        st.info("Waiting for the host to deal a prompt…")
+        return
+    st.info(room["prompt"])
+    st.markdown(f"**Guidance:** {difficulty_guidance[room['difficulty']]}")
+    waiting = len(room["players"]) - len(room["submissions"])
+    st.caption(f"{len(room['submissions'])} submitted · {waiting} still writing · "
+               + ("🤖 AI is ready" if room["ai_response"] else "🤖 AI is thinking…"))
+
+    if not room["revealed"]:
+        idea_key = f"room_idea_{room['round']}"
+        st.text_area("✍️ Your Idea:", height=150, key=idea_key, max_chars=ANSWER_MAX_CHARS)
+        st.button("📨 Submit Idea", disabled=me in room["submissions"],
+                  on_click=lambda: st.session_state[idea_key].strip()
+                  and ROOM_STORE.submit(code, me, st.session_state[idea_key]))
+        return
+
+    st.subheader("🗳️ Vote")
+    my_vote = room["votes"].get(me)
+    for row in room["tally"]:
+        st.markdown('<div class="card">', unsafe_allow_html=True)
+        st.markdown(f"**{row['name']}** · {row['votes']} vote(s)")
+        st.write(row["idea"] or ("*AI is still thinking…*" if row["entry"] == AI_ENTRY else ""))
+        if row["entry"] != me:
+            st.button("👍 Vote" if my_vote != row["entry"] else "✅ Your vote",
+                      key=f"room_vote_{room['round']}_{row['entry']}",
+                      on_click=ROOM_STORE.vote, args=(code, me, row["entry"]))
+        st.markdown('</div>', unsafe_allow_html=True)
+
+# --------------------------
+# ADMIN (hidden: append ?admin=<ADMIN_TOKEN>; disabled unless that secret is set)
+# --------------------------
+def admin_requested() -> bool:
+    token = st.query_params.get("admin")
+    expected = st.secrets.get("ADMIN_TOKEN")
+    return bool(token and expected) and hmac.compare_digest(str(token).encode(), str(expected).encode())
+
+def render_admin():
+    st.markdown("## 🛠️ Admin · AI metrics")
+    records = METRICS.records()
+    st.caption(f"Last {len(records)} AI requests in this process.")
+    summary = METRICS.summary()
+    if summary:
+        st.dataframe(summary, hide_index=True)
+    else:
+        st.info("No AI requests recorded yet.")
+    sessions = SESSIONS.stats()
+    st.caption(f"{sessions['sessions']} live sessions holding {sessions['total_bytes'] / 1024:.1f} KB of game state "
+               f"(largest {sessions['largest_bytes'] / 1024:.1f} KB).")
+    with st.expander("Gateway, cache and pack stats"):
+        st.json({
+            "backend": AI_BACKEND,
+            "sessions": sessions,
+            "gateway": get_gateway().stats,
+            "scheduler": dict(get_scheduler().stats, **get_scheduler().queued()),
+            "token_budget": TOKEN_BUDGET.stats(),
+            "judge": get_judge().stats,
+            "constraint_checks": CHECK_STATS.stats(),
+            "novelty": dict(NOVELTY.stats, **NOVELTY.size()) if NOVELTY else None,
+            "game_store": GAME_STORE.stats if GAME_STORE else None,
+            "response_cache": RESPONSE_CACHE.stats() if RESPONSE_CACHE else None,
+            "answer_store": ANSWER_STORE.stats() if ANSWER_STORE else None,
+            "rooms": ROOM_STORE.stats(),
+            "packs": PACK_REGISTRY.stats(),
+            "pack_editor_memo": memo_stats(),
+        })
+    prom = METRICS.prometheus()
+    st.markdown("### Prometheus export")
+    st.code(prom, language="text")
+    st.download_button("⬇️ Download metrics.prom", data=prom.encode("utf-8"),
+                       file_name="metrics.prom", mime="text/plain")
+    if records:
+        with st.expander("Recent requests"):
+            st.dataframe(records[-200:][::-1], hide_index=True)
 
 # --------------------------
 # Router
 # --------------------------
-if st.session_state.page == "intro" and not st.session_state.skip_intro_next_time:
+if admin_requested():
+    render_admin()
+elif st.session_state.page == "intro" and not st.session_state.skip_intro_next_time:
     render_intro()
 elif st.session_state.page == "home" or (st.session_state.page == "intro" and st.session_state.skip_intro_next_time):
     st.session_state.page = "home"
     render_home()
 elif st.session_state.page == "creator":
     render_pack_creator()
+elif st.session_state.page == "room":
+    render_room()
 else:
     if not st.session_state.mode:
         st.session_state.page = "home"
@@ -0,0 +1,204 @@
+"""Headless benchmarks for app.py.
+
+Drives the real Streamlit script with ``streamlit.testing.v1.AppTest`` against a
+local fake OpenAI server (fake_openai.py), and reports:
+
+- full-script rerun time / reruns per second for every page and mode in the router
+- memory per session (tracemalloc growth per live AppTest session)
+- end-to-end round latency for N simulated players clicking through
+  Classic / Constraint / Mash-up rounds (stepped in lock-step from one thread,
+  because AppTest sessions cannot run in parallel threads)
+
+Results are written as JSON so runs can be compared:
+
+    python benchmarks/bench_app.py --players 20 --latency 0.5 --out bench.json
+    python benchmarks/bench_app.py --compare bench.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import tracemalloc
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import fake_openai  # noqa: E402
+
+APP = os.path.join(ROOT, "app.py")
+PAGES = [
+    ("intro", None),
+    ("home", None),
+    ("creator", None),
+    ("play", "Classic"),
+    ("play", "Yes, And…"),
+    ("play", "Constraint"),
+    ("play", "Mash-up"),
+]
+ROUND_BUTTONS = {
+    "Classic": ("✨ Generate Creative Prompt", "🤖 See AI’s Idea"),
+    "Constraint": ("✨ Generate Constraint Challenge", "🤖 See AI’s Constrained Idea"),
+    "Mash-up": ("✨ Generate Mash-up Challenge", "🤖 See AI’s Mash-up Idea"),
+}
+
+
+# --------------------------
+# Helpers
+# --------------------------
+def new_session(base_url: str, page: Optional[str] = None, mode: Optional[str] = None, secrets=None):
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_file(APP, default_timeout=120)
+    at.secrets["OPENAI_API_KEY"] = "sk-bench"
+    at.secrets["OPENAI_BASE_URL"] = base_url
+    for k, v in (secrets or {}).items():
+        at.secrets[k] = v
+    at.run()
+    if page:
+        at.session_state["page"] = page
+        at.session_state["mode"] = mode
+        at.run()
+    if at.exception:
+        raise RuntimeError(f"{page}/{mode}: {at.exception}")
+    return at
+
+def click(at, label: str):
+    for b in at.button:
+        if b.label == label:
+            b.click().run()
+            if at.exception:
+                raise RuntimeError(f"{label}: {at.exception}")
+            return at
+    raise KeyError(label)
+
+def stats_ms(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]  # noqa: E731
+    return {
+        "mean_ms": round(1000 * statistics.mean(ordered), 2),
+        "p50_ms": round(1000 * pick(0.5), 2),
+        "p95_ms": round(1000 * pick(0.95), 2),
+        "max_ms": round(1000 * ordered[-1], 2),
+    }
+
+
+# --------------------------
+# Benchmarks
+# --------------------------
+def bench_reruns(base_url: str, reruns: int, secrets=None) -> Dict[str, dict]:
+    results = {}
+    for page, mode in PAGES:
+        at = new_session(base_url, page, mode, secrets)
+        samples = []
+        for _ in range(reruns):
+            t = time.perf_counter()
+            at.run()
+            samples.append(time.perf_counter() - t)
+        name = mode or page
+        results[name] = {**stats_ms(samples), "reruns_per_s": round(len(samples) / sum(samples), 1)}
+    return results
+
+def bench_memory(base_url: str, sessions: int, secrets=None) -> dict:
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    live = [new_session(base_url, "play", "Classic", secrets) for _ in range(sessions)]
+    for at in live:
+        click(at, ROUND_BUTTONS["Classic"][0])
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    grown = sum(s.size_diff for s in after.compare_to(before, "filename"))
+    return {"sessions": len(live), "bytes_per_session": int(grown / max(1, len(live)))}
+
+def bench_players(base_url: str, players: int, rounds: int, think_s: float, secrets=None) -> dict:
+    # AppTest is not thread-safe, so players are stepped in lock-step from one thread:
+    # everyone generates a prompt, writes for think_s, reveals, then votes. Shared
+    # process-wide resources (gateway, prefetch pool, caches) still see N sessions at once.
+    modes = list(ROUND_BUTTONS)
+    sessions = [(modes[i % len(modes)], new_session(base_url, "play", modes[i % len(modes)], secrets))
+                for i in range(players)]
+    round_s, reveal_s = [], []
+    t = time.perf_counter()
+    for _ in range(rounds):
+        started = {}
+        for i, (mode, at) in enumerate(sessions):
+            started[i] = time.perf_counter()
+            click(at, ROUND_BUTTONS[mode][0])
+        if think_s:
+            time.sleep(think_s)
+        for i, (mode, at) in enumerate(sessions):
+            r = time.perf_counter()
+            click(at, ROUND_BUTTONS[mode][1])
+            reveal_s.append(time.perf_counter() - r)
+            if not any(b.label == "👍 Human Wins" for b in at.button):  # the showdown only shows with an answer
+                raise RuntimeError(f"{mode}: no AI response")
+        for i, (mode, at) in enumerate(sessions):
+            click(at, "👍 Human Wins")
+            round_s.append(time.perf_counter() - started[i] - think_s)
+    wall = time.perf_counter() - t
+    return {
+        "players": players, "rounds": len(round_s), "think_s": think_s, "wall_s": round(wall, 2),
+        "rounds_per_s": round(len(round_s) / max(1e-9, wall - think_s * rounds), 2),
+        "round": stats_ms(round_s),
+        "reveal": stats_ms(reveal_s),
+    }
+
+
+# --------------------------
+# Reporting
+# --------------------------
+def compare(old: dict, new: dict, path: str = "") -> List[str]:
+    lines = []
+    for k, v in new.items():
+        o = old.get(k) if isinstance(old, dict) else None
+        here = f"{path}.{k}" if path else k
+        if isinstance(v, dict):
+            lines += compare(o or {}, v, here)
+        elif isinstance(v, (int, float)) and isinstance(o, (int, float)) and o:
+            lines.append(f"{here:50s} {o:>12} -> {v:>12}  ({100 * (v - o) / o:+.1f}%)")
+    return lines
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Benchmark app.py reruns and AI round latency.")
+    ap.add_argument("--reruns", type=int, default=20, help="reruns timed per page/mode")
+    ap.add_argument("--players", type=int, default=8, help="concurrent simulated players")
+    ap.add_argument("--rounds", type=int, default=2, help="rounds per player")
+    ap.add_argument("--think", type=float, default=0.0, help="seconds a player spends writing")
+    ap.add_argument("--sessions", type=int, default=20, help="sessions for the memory probe")
+    ap.add_argument("--latency", type=float, default=0.3, help="fake OpenAI response latency (s)")
+    ap.add_argument("--token-delay", type=float, default=0.01, help="fake OpenAI delay per streamed token (s)")
+    ap.add_argument("--secret", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra app secret, e.g. --secret TIMER_MODE=server")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--compare", default=None, help="previous results JSON to diff against")
+    args = ap.parse_args(argv)
+
+    secrets = dict(s.split("=", 1) for s in args.secret)
+    server = fake_openai.start_server(latency=args.latency, token_delay=args.token_delay)
+    base_url = fake_openai.base_url(server)
+    os.chdir(ROOT)  # app.py resolves packs/ relative to the working directory
+
+    results = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "latency_s": args.latency, "token_delay_s": args.token_delay, "secrets": secrets},
+        "reruns": bench_reruns(base_url, args.reruns, secrets),
+        "memory": bench_memory(base_url, args.sessions, secrets),
+        "players": bench_players(base_url, args.players, args.rounds, args.think, secrets),
+    }
+    results["meta"]["fake_openai_requests"] = server.RequestHandlerClass.requests
+    server.shutdown()
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), results)))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
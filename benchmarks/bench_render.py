@@ -0,0 +1,115 @@
+"""Bytes sent to the browser per rerun of app.py.
+
+Counts the serialized size of every ForwardMsg app.py emits (what goes over the
+websocket) for one steady-state rerun of each page, and for the play modes
+after a round has been dealt and revealed. ``fragment_bytes`` is the part
+emitted from inside ``st.fragment``s: an interaction inside a fragment (or a
+fragment's own timer) re-sends only that, instead of the whole page.
+
+Uses the local AI backend, so no network or API key is needed:
+
+    python benchmarks/bench_render.py --out render.json
+    python benchmarks/bench_render.py --compare render.json
+"""
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_app import PAGES, ROUND_BUTTONS, click, compare, new_session  # noqa: E402
+
+SECRETS = {"AI_BACKEND": "local", "TIMER_MODE": "client"}
+
+
+class ByteCounter:
+    """Tallies ForwardMsg sizes as Streamlit enqueues them for the browser."""
+
+    def __init__(self):
+        self.total = self.fragment = self.messages = 0
+
+    def __call__(self, msg):
+        size = msg.ByteSize()
+        self.total += size
+        self.messages += 1
+        if msg.HasField("delta") and msg.delta.fragment_id:
+            self.fragment += size
+
+    def reset(self):
+        self.total = self.fragment = self.messages = 0
+
+
+def measure(at, counter: ByteCounter, reruns: int) -> Dict[str, int]:
+    totals, fragments, messages = [], [], []
+    for _ in range(reruns):
+        counter.reset()
+        at.run()
+        totals.append(counter.total)
+        fragments.append(counter.fragment)
+        messages.append(counter.messages)
+    return {"rerun_bytes": max(totals), "fragment_bytes": max(fragments), "messages": max(messages)}
+
+
+# --------------------------
+# Benchmarks
+# --------------------------
+def bench_pages(counter: ByteCounter, reruns: int, secrets: dict) -> Dict[str, dict]:
+    results = {}
+    for page, mode in PAGES:
+        at = new_session("", page, mode, secrets)
+        results[mode or page] = measure(at, counter, reruns)
+    return results
+
+def bench_rounds(counter: ByteCounter, reruns: int, secrets: dict) -> Dict[str, dict]:
+    # The same modes after a round is on screen (prompt, timer, showdown, vote).
+    results = {}
+    for mode, (deal, reveal) in ROUND_BUTTONS.items():
+        at = new_session("", "play", mode, secrets)
+        click(at, deal)
+        click(at, reveal)
+        results[mode] = measure(at, counter, reruns)
+    at = new_session("", "play", "Yes, And…", secrets)
+    at.text_input[0].input("Once upon a time a dragon opened a bakery.").run()
+    click(at, "Add My Line")
+    results["Yes, And…"] = measure(at, counter, reruns)
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Measure bytes sent to the browser per rerun of app.py.")
+    ap.add_argument("--reruns", type=int, default=3, help="reruns measured per page (the largest is kept)")
+    ap.add_argument("--secret", action="append", default=[], metavar="KEY=VALUE",
+                    help="extra app secret, e.g. --secret TIMER_MODE=server")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--compare", default=None, help="previous results JSON to diff against")
+    args = ap.parse_args(argv)
+
+    from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+    counter = ByteCounter()
+    ForwardMsgQueue.on_before_enqueue_msg(counter)
+    secrets = dict(SECRETS, **dict(s.split("=", 1) for s in args.secret))
+    os.chdir(ROOT)  # app.py resolves packs/ relative to the working directory
+
+    results = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "reruns": args.reruns, "secrets": secrets},
+        "pages": bench_pages(counter, args.reruns, secrets),
+        "rounds": bench_rounds(counter, args.reruns, secrets),
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), results)))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
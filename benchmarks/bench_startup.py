@@ -0,0 +1,140 @@
+"""Cold-start report for app.py.
+
+Each measurement runs in a fresh Python process so nothing is already imported
+or cached:
+
+- imports: wall time of importing everything app.py imports at the top, and
+  which heavy modules (openai, httpx, tiktoken, asyncio, ...) that pulls in
+- first paint: time spent executing app.py for the first render of the
+  Introduction and Home pages (Home takes two runs: intro, then home), with and
+  without an OPENAI_API_KEY, and whether the OpenAI SDK got imported
+
+    python benchmarks/bench_startup.py --out startup.json
+    python benchmarks/bench_startup.py --compare startup.json
+"""
+import os
+import ast
+import sys
+import json
+import time
+import platform
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from bench_app import compare  # noqa: E402
+
+APP = os.path.join(ROOT, "app.py")
+HEAVY = ("openai", "httpx", "tiktoken", "asyncio", "numpy", "pandas", "pyarrow")
+
+IMPORTS_SNIPPET = """
+import sys, time, json
+t = time.perf_counter()
+{imports}
+print(json.dumps({{"ms": 1000 * (time.perf_counter() - t),
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+PAINT_SNIPPET = """
+import sys, time, json
+t = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+from streamlit.runtime.scriptrunner.script_runner import ScriptRunner
+AppTest.from_string("import streamlit as st").run()  # Streamlit's own one-time setup
+script_s = []
+_run_script = ScriptRunner._run_script
+def timed(self, *args, **kwargs):
+    # Time just the execution of app.py, not AppTest's polling around it.
+    started = time.perf_counter()
+    try:
+        return _run_script(self, *args, **kwargs)
+    finally:
+        script_s.append(time.perf_counter() - started)
+ScriptRunner._run_script = timed
+at = AppTest.from_file({app!r}, default_timeout=120)
+for k, v in {secrets!r}.items():
+    at.secrets[k] = v
+at.run()
+if {page!r} != "intro":
+    at.session_state["page"] = {page!r}
+    at.run()
+print(json.dumps({{"ms": 1000 * sum(script_s), "with_streamlit_ms": 1000 * (time.perf_counter() - t),
+                  "error": str(at.exception[0].message) if at.exception else None,
+                  "loaded": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def app_imports() -> List[str]:
+    # The module-level import statements of app.py, minus Streamlit itself.
+    with open(APP, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    lines = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            names = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module]
+            if not any(n.split(".")[0] == "streamlit" for n in names):
+                lines.append(ast.unparse(node))
+    return lines
+
+def run_fresh(code: str) -> dict:
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=300)
+    for line in reversed(out.stdout.splitlines()):
+        if line.startswith("{"):
+            return json.loads(line)
+    raise RuntimeError(out.stderr[-2000:])
+
+def summarize(samples: List[dict]) -> dict:
+    ms = sorted(s["ms"] for s in samples)
+    row = {"median_ms": round(statistics.median(ms), 1), "min_ms": round(ms[0], 1),
+           "loaded": samples[-1]["loaded"]}
+    if "with_streamlit_ms" in samples[-1]:
+        row["with_streamlit_median_ms"] = round(statistics.median(s["with_streamlit_ms"] for s in samples), 1)
+        row["error"] = samples[-1]["error"]
+    return row
+
+
+# --------------------------
+# Benchmarks
+# --------------------------
+def bench_imports(repeat: int) -> dict:
+    code = IMPORTS_SNIPPET.format(imports="\n".join(app_imports()), heavy=HEAVY)
+    return summarize([run_fresh(code) for _ in range(repeat)])
+
+def bench_first_paint(repeat: int) -> Dict[str, dict]:
+    results = {}
+    for page in ("intro", "home"):
+        for label, secrets in (("with_key", {"OPENAI_API_KEY": "sk-bench"}), ("no_key", {"TIMER_MODE": "client"})):
+            code = PAINT_SNIPPET.format(app=APP, secrets=secrets, page=page, heavy=HEAVY)
+            results[f"{page}_{label}"] = summarize([run_fresh(code) for _ in range(repeat)])
+    return results
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Measure app.py import time and first paint in fresh processes.")
+    ap.add_argument("--repeat", type=int, default=5, help="fresh processes per measurement")
+    ap.add_argument("--out", default=None, help="write results JSON here")
+    ap.add_argument("--compare", default=None, help="previous results JSON to diff against")
+    args = ap.parse_args(argv)
+
+    results = {
+        "meta": {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "repeat": args.repeat},
+        "imports": bench_imports(args.repeat),
+        "first_paint": bench_first_paint(args.repeat),
+    }
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            print("\n".join(compare(json.load(f), results)))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,257 @@
+"""Local checks for the constraints a machine can verify.
+
+Each constraint text is matched once against a declarative rule table (the
+first pattern that matches wins) and compiled into a check; the compiled form
+is memoized per text, so Core Pack and pack constraints cost nothing after
+their first round. A pack constraint is checked whenever it is phrased like a
+rule in the table ("must use at most 40 words", "must mention robots", ...).
+
+Answers are measured once (words, sentences, letters, lines, ...) and every
+check of the round reads those measurements, so scoring both answers takes
+microseconds. Rules marked ``strict`` are exact counts; the others (rhyme,
+haiku, mentions, dialogue) are heuristics, reported but never decisive on
+their own.
+"""
+import re
+import threading
+import unicodedata
+from functools import lru_cache
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from game_content import prompt_constraints
+
+NUMBER_WORDS = {w: i for i, w in enumerate(
+    "zero one two three four five six seven eight nine ten eleven twelve thirteen fourteen fifteen "
+    "sixteen seventeen eighteen nineteen twenty".split())}
+_NUM = r"(\d+|" + "|".join(NUMBER_WORDS) + r")"
+_WORD = re.compile(r"\w[\w'’-]*")
+_LETTERS = re.compile(r"[^\W\d_]+")
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s|$)")
+_CLAUSE = re.compile(r"\n|\s/\s|[,;:.!?…]+(?=\s|$)")
+_QUOTED = re.compile(r"[\"“”«»]([^\"“”«»]{2,})[\"“”«»]|(?:^|\s)[-—–]\s*\w")
+_VOWELS = re.compile(r"[aeiouy]+")
+_RHYME = re.compile(r"[aeiouy]+[^aeiouy]*$")
+STOPWORDS = frozenset("a an the of at least one some any and or with in on to two three for your their its".split())
+
+
+class Text:
+    """Measurements of one answer, shared by every check of the round."""
+    __slots__ = ("raw", "words", "sentences", "lines", "clause_ends", "stems", "lower")
+
+    def __init__(self, raw: str):
+        self.raw = raw = (raw or "").strip()
+        self.lower = raw.lower()
+        self.words = _WORD.findall(raw)
+        ends = list(_SENTENCE_END.finditer(raw))
+        # a trailing fragment without a full stop still counts as a sentence
+        self.sentences = len(ends) + (bool(raw) and (not ends or bool(raw[ends[-1].end():].strip())))
+        self.lines = [ln.strip() for ln in re.split(r"\n|\s/\s", raw) if ln.strip()]
+        self.clause_ends = [_WORD.findall(part)[-1].lower() for part in _CLAUSE.split(raw) if _WORD.search(part)]
+        self.stems = {stem(w) for w in self.words}
+
+
+class Result(NamedTuple):
+    constraint: str
+    ok: bool
+    detail: str    # why it failed ("" when it passed)
+    strict: bool
+
+
+class Report(NamedTuple):
+    results: Tuple[Result, ...]
+    unchecked: Tuple[str, ...]   # constraints no rule could verify
+
+    @property
+    def ok(self) -> bool:
+        return all(r.ok for r in self.results)
+
+    @property
+    def strict_ok(self) -> bool:
+        return all(r.ok for r in self.results if r.strict)
+
+    def failed(self, strict: bool = False) -> List[Result]:
+        return [r for r in self.results if not r.ok and (r.strict or not strict)]
+
+    def summary(self) -> str:
+        if not self.results:
+            return "no checkable constraints"
+        met = sum(r.ok for r in self.results)
+        broke = "; ".join(f"{r.constraint} ({r.detail})" for r in self.failed())
+        return f"{met}/{len(self.results)} checkable constraints met" + (f", broke: {broke}" if broke else "")
+
+
+def number(token: str) -> int:
+    return int(token) if token.isdigit() else NUMBER_WORDS[token.lower()]
+
+def stem(word: str) -> str:
+    w = word.lower().strip("'’")
+    for suffix in ("ies", "es", "s"):
+        if w.endswith(suffix) and len(w) - len(suffix) >= 3:
+            return w[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return w
+
+def syllables(word: str) -> int:
+    w = word.lower()
+    n = len(_VOWELS.findall(w))
+    if w.endswith("e") and not w.endswith(("le", "ee")) and n > 1:
+        n -= 1
+    return max(1, n)
+
+def is_emoji(ch: str) -> bool:
+    return unicodedata.category(ch) in ("So", "Sk") or 0x1F000 <= ord(ch) <= 0x1FAFF or ch in "‍️"
+
+
+# --------------------------
+# Checks: fn(Text) -> failure detail, or "" when the answer passes
+# --------------------------
+def max_words(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if 0 < len(t.words) <= n else f"{len(t.words)} words"
+
+def min_words(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if len(t.words) >= n else f"{len(t.words)} words"
+
+def exact_words(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if len(t.words) == n else f"{len(t.words)} words"
+
+def exact_sentences(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if t.sentences == n else f"{t.sentences} sentences"
+
+def max_sentences(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if 0 < t.sentences <= n else f"{t.sentences} sentences"
+
+def min_sentences(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if t.sentences >= n else f"{t.sentences} sentences"
+
+def max_chars(n: int) -> Callable[[Text], str]:
+    return lambda t: "" if 0 < len(t.raw) < n else f"{len(t.raw)} characters"
+
+def max_word_length(n: int) -> Callable[[Text], str]:
+    def check(t: Text) -> str:
+        long = [w for w in _LETTERS.findall(t.raw) if len(w) > n]
+        return f"uses {long[0]!r}" + (f" and {len(long) - 1} more" if len(long) > 1 else "") if long else ""
+    return check
+
+def has_question(t: Text) -> str:
+    return "" if "?" in t.raw else "no question"
+
+def only_emojis(t: Text) -> str:
+    rest = [ch for ch in t.raw if not ch.isspace() and not is_emoji(ch)]
+    return "" if t.raw and not rest else "has text besides emojis"
+
+def without_letter(letter: str) -> Callable[[Text], str]:
+    return lambda t: "" if letter not in t.lower else f"uses {letter!r}"
+
+def starts_with(word: str) -> Callable[[Text], str]:
+    return lambda t: "" if t.words and t.words[0].lower() == word else "starts differently"
+
+def all_caps(t: Text) -> str:
+    return "" if t.raw == t.raw.upper() and _LETTERS.search(t.raw) else "not all capitals"
+
+def mentions(thing: str) -> Optional[Callable[[Text], str]]:
+    keys = [stem(w) for w in _WORD.findall(thing) if w.lower() not in STOPWORDS]
+    if not keys or len(keys) > 3:
+        return None  # too vague to check by words
+    return lambda t: "" if all(k in t.stems for k in keys) else f"no mention of {thing}"
+
+def rhymes(t: Text) -> str:
+    keys = [m.group(0)[-3:] for m in (_RHYME.search(w) for w in t.clause_ends) if m]
+    return "" if len(keys) != len(set(keys)) else "no rhyming line endings"
+
+def haiku(t: Text) -> str:
+    counts = [sum(syllables(w) for w in _LETTERS.findall(ln)) for ln in t.lines]
+    if len(counts) == 3:
+        ok = all(abs(c - want) <= 1 for c, want in zip(counts, (5, 7, 5)))
+        return "" if ok else "lines of " + "-".join(map(str, counts)) + " syllables"
+    total = sum(counts)
+    return "" if 15 <= total <= 19 else f"{total} syllables"
+
+def has_dialogue(t: Text) -> str:
+    return "" if len(_QUOTED.findall(t.raw)) >= 2 else "no exchange of quoted lines"
+
+
+# (pattern, build(match) -> check or None, strict). First match wins.
+RULES: List[Tuple[re.Pattern, Callable[[re.Match], Optional[Callable[[Text], str]]], bool]] = [
+    (re.compile(rf"\bonly\s+{_NUM}\s+words\b"), lambda m: max_words(number(m.group(1))), True),
+    (re.compile(rf"\b(?:at most|no more than|fewer than|under|maximum of)\s+{_NUM}\s+words\b"),
+     lambda m: max_words(number(m.group(1))), True),
+    (re.compile(rf"\bat least\s+{_NUM}\s+words\b"), lambda m: min_words(number(m.group(1))), True),
+    (re.compile(rf"\bexactly\s+{_NUM}\s+words\b"), lambda m: exact_words(number(m.group(1))), True),
+    (re.compile(rf"\bexactly\s+{_NUM}\s+sentences?\b"), lambda m: exact_sentences(number(m.group(1))), True),
+    (re.compile(rf"\b(?:at most|no more than|under)\s+{_NUM}\s+sentences\b"),
+     lambda m: max_sentences(number(m.group(1))), True),
+    (re.compile(rf"\bat least\s+{_NUM}\s+sentences\b"), lambda m: min_sentences(number(m.group(1))), True),
+    (re.compile(rf"\b(?:under|fewer than|less than)\s+{_NUM}\s+characters\b"),
+     lambda m: max_chars(number(m.group(1))), True),
+    (re.compile(rf"\bwords of\s+{_NUM}\s+letters or (?:less|fewer)\b"),
+     lambda m: max_word_length(number(m.group(1))), True),
+    (re.compile(r"\b(?:at least one|a) question\b|\bend with a question\b"), lambda m: has_question, True),
+    (re.compile(r"\bonly (?:use )?emojis?\b"), lambda m: only_emojis, True),
+    (re.compile(r"\b(?:without|not use|never use)\s+the letter\s+['\"]?([a-z])\b"),
+     lambda m: without_letter(m.group(1)), True),
+    (re.compile(r"\bstart with the word\s+['\"]?(\w+)"), lambda m: starts_with(m.group(1).lower()), True),
+    (re.compile(r"\b(?:in )?all (?:caps|capital letters)\b"), lambda m: all_caps, True),
+    (re.compile(r"\bhaiku\b"), lambda m: haiku, False),
+    (re.compile(r"\brhyme\b"), lambda m: rhymes, False),
+    (re.compile(r"\bdialogue\b"), lambda m: has_dialogue, False),
+    (re.compile(r"\b(?:mention|include|feature)s?\s+(.+)$"), lambda m: mentions(m.group(1)), False),
+]
+
+
+@lru_cache(maxsize=4096)
+def compile_constraint(constraint: str) -> Optional[Tuple[Callable[[Text], str], bool]]:
+    """(check, strict) for a constraint, or None when no rule can verify it."""
+    text = constraint.lower().strip().rstrip(".")
+    for pattern, build, strict in RULES:
+        m = pattern.search(text)
+        if m:
+            check = build(m)
+            return (check, strict) if check is not None else None
+    return None
+
+
+def check(constraints: Sequence[str], answers: Sequence[str]) -> List[Report]:
+    """One report per answer; each answer is measured once for all constraints."""
+    compiled = [(c, compile_constraint(c)) for c in constraints]
+    unchecked = tuple(c for c, rule in compiled if rule is None)
+    reports = []
+    for answer in answers:
+        t = Text(answer)
+        results = []
+        for c, rule in compiled:
+            if rule is not None:
+                detail = rule[0](t)
+                results.append(Result(c, not detail, detail, rule[1]))
+        reports.append(Report(tuple(results), unchecked))
+    return reports
+
+
+def check_round(prompt: str, human: str, ai: str) -> Optional[Tuple[Report, Report]]:
+    """(human, ai) reports for a Constraint round, or None if nothing in it can be checked."""
+    constraints = prompt_constraints(prompt or "")
+    if not constraints or all(compile_constraint(c) is None for c in constraints):
+        return None
+    human_report, ai_report = check(constraints, [human, ai])
+    return human_report, ai_report
+
+
+def repair_instruction(report: Report) -> str:
+    # Targeted follow-up for an answer that broke strictly checked constraints (heuristics can misfire).
+    broke = "\n".join(f"- it {r.constraint} (yours: {r.detail})" for r in report.failed(strict=True))
+    return (f"Your answer broke these rules:\n{broke}\n"
+            "Rewrite it so it follows every constraint exactly. Output only the rewritten answer.")
+
+
+class CheckStats:
+    """Process-wide counters for AI answers checked and repaired; updated from executor threads."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = {"checked": 0, "failed": 0, "repaired": 0, "repair_failed": 0}
+
+    def count(self, key: str):
+        with self._lock:
+            self._counts[key] += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
@@ -0,0 +1,136 @@
+"""Local stand-in for the OpenAI chat completions endpoint.
+
+Used to exercise pregen.py and the benchmarks without a network or an API key:
+
+    python fake_openai.py --port 8765 --latency 0.4
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 python pregen.py ...
+
+Supports blocking and streaming (SSE) responses, ``n`` > 1, configurable latency
+and an optional failure rate to exercise retry paths.
+"""
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+IDEAS = [
+    "A pizza-powered lighthouse guides lost astronauts home, glowing brighter with every extra topping.",
+    "Octopus chefs run an underwater café where every dish is served by eight arms at once.",
+    "A haunted library lends out ghosts instead of books, and late fees are paid in stories.",
+    "Robot pirates sail the cloud sea, stealing only umbrellas to keep their circuits dry.",
+    "A dragon opens a coffee shop; the espresso is legendary, the latte art slightly singed.",
+]
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    latency = 0.0        # seconds before the (first byte of the) response
+    token_delay = 0.0    # seconds between streamed tokens
+    fail_rate = 0.0      # fraction of requests answered with HTTP 500
+    requests = 0
+    _lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def _text(self, body: dict) -> str:
+        rng = random.Random(json.dumps(body.get("messages"), sort_keys=True) + str(time.time_ns()))
+        user = (body.get("messages") or [{}])[-1].get("content", "")
+        # Judge requests get answers in the shape judge.py expects.
+        if (body.get("response_format") or {}).get("type") == "json_object" and "ROUNDS:" in user:
+            rounds = json.loads(user.split("ROUNDS:", 1)[1])
+            return json.dumps({"verdicts": [
+                {"id": r["id"], "winner": rng.choice(["Human", "AI"]), "reason": "More surprising and vivid."}
+                for r in rounds]})
+        if "Winner: <Human|AI>" in user:
+            return f"Winner: {rng.choice(['Human', 'AI'])}. Reason: More surprising and vivid."
+        return rng.choice(IDEAS)
+
+    def _send_json(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        with self._lock:
+            type(self).requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if random.random() < self.fail_rate:
+            self._send_json(500, {"error": {"message": "fake server error", "type": "server_error"}})
+            return
+        n = int(body.get("n") or 1)
+        texts = [self._text(body) for _ in range(n)]
+        prompt_tokens = sum(len(m.get("content", "").split()) for m in body.get("messages", []))
+        completion_tokens = sum(len(t.split()) for t in texts)
+        if body.get("stream"):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            try:
+                for i, text in enumerate(texts):
+                    for word in text.split(" "):
+                        chunk = {"id": "fake", "object": "chat.completion.chunk", "created": int(time.time()),
+                                 "model": body.get("model", "fake"),
+                                 "choices": [{"index": i, "delta": {"content": word + " "}, "finish_reason": None}]}
+                        self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if self.token_delay:
+                            time.sleep(self.token_delay)
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # the client stopped reading early (e.g. an early-stopped stream)
+            return
+        self._send_json(200, {
+            "id": "fake", "object": "chat.completion", "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{"index": i, "message": {"role": "assistant", "content": t}, "finish_reason": "stop"}
+                        for i, t in enumerate(texts)],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        })
+
+
+def start_server(port: int = 0, latency: float = 0.0, token_delay: float = 0.0,
+                 fail_rate: float = 0.0, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Start the fake server in a daemon thread. ``server.server_address`` has the bound port."""
+    handler = type("Handler", (FakeOpenAIHandler,), {
+        "latency": latency, "token_delay": token_delay, "fail_rate": fail_rate, "requests": 0,
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server: ThreadingHTTPServer) -> str:
+    host, port = server.server_address[:2]
+    return f"http://{host}:{port}/v1"
+
+
+def main(argv: Optional[list] = None):
+    ap = argparse.ArgumentParser(description="Run a fake OpenAI chat completions server.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--latency", type=float, default=0.0, help="seconds before each response")
+    ap.add_argument("--token-delay", type=float, default=0.0, help="seconds between streamed tokens")
+    ap.add_argument("--fail-rate", type=float, default=0.0, help="fraction of requests answered with 500")
+    args = ap.parse_args(argv)
+    server = start_server(args.port, args.latency, args.token_delay, args.fail_rate, args.host)
+    print(f"Fake OpenAI listening on {base_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""Game content shared by the Streamlit app and the offline tools.
+
+Holds the built-in Core Pack, the per-mode prompt builders and the rules used to
+turn a prompt into an AI request. Nothing here imports Streamlit.
+"""
+import re
+from typing import Dict, List, Sequence, Tuple
+
+# --------------------------
+# Core Pack (built-in fallback content)
+# --------------------------
+CORE_PROMPTS = [
+    # Inventions & Products
+    "Invent a new holiday that combines {A} and {B}.",
+    "Design a product for {A} that also solves a problem with {B}.",
+    "Create a gadget that makes life easier for people who love {A} but struggle with {B}.",
+    "Imagine a toy that fuses {A} with {B}.",
+    "Design a futuristic vehicle powered by {A} and inspired by {B}.",
+    "Create a food or drink that combines {A} and {B}.",
+    # Ads & Marketing
+    "Write a slogan for {A}.",
+    "Create a social media campaign for {A} using {B}.",
+    "Come up with a catchy jingle that includes both {A} and {B}.",
+    "Write a movie trailer voiceover that sells a story about {A} and {B}.",
+    # Stories & Characters
+    "Describe what happens if {A} meets {B} in the future.",
+    "Write a short story beginning with: '{A}'.",
+    "Tell a fairy tale that includes both {A} and {B}.",
+    "Imagine {A} as a superhero and {B} as their sidekick.",
+    "What happens in a world where {A} secretly controls {B}?",
+    # Worlds & What-ifs
+    "Imagine a world where {A} and {B} are everyday realities. What changes?",
+    "Describe a school subject that combines {A} and {B}.",
+    "What would a city look like if it were built around {A} and {B}?",
+    "Imagine a festival where {A} and {B} are celebrated together.",
+    "Describe how the world would change if everyone suddenly valued {A} more than {B}.",
+    # Weird Twists
+    "Pitch a reality TV show starring {A} and {B}.",
+    "Imagine a magical spell powered by {A} but cursed by {B}.",
+    "If {A} could talk, what would it say to {B}?",
+    "Write a newspaper headline about {A} colliding with {B}.",
+    "Create a conspiracy theory linking {A} and {B}.",
+    # Role-play
+    "Pretend you are {A}, trying to convince people to love {B}.",
+    "Write a diary entry from {A} about their adventure with {B}.",
+    "Imagine a debate between {A} and {B} on live TV.",
+]
+CORE_CONCEPTS = [
+    # Everyday
+    "bananas","umbrellas","coffee","backpacks","mirrors","shoes","toothbrushes",
+    "keys","lamps","sunglasses","stairs","beds","refrigerators","bicycles",
+    # Food & Drink
+    "pizza","ice cream","sushi","tacos","chocolate","spaghetti","smoothies",
+    "tea","burgers","cheese","doughnuts","sandwiches","oranges",
+    # Animals & Myth
+    "cats","dogs","parrots","octopuses","penguins","whales","bees","cows",
+    "dragons","unicorns","dinosaurs","werewolves","phoenixes","mermaids",
+    # People / Characters
+    "pirates","astronauts","wizards","robots","ninjas","vampires","superheroes",
+    "clowns","detectives","chefs","pop stars","zombies",
+    # Places
+    "space stations","volcanoes","haunted houses","castles","deserts","jungles",
+    "theme parks","beaches","libraries","underwater cities","floating islands",
+    # Tech & Science
+    "time travel","AI","holograms","quantum computers","self-driving cars",
+    "virtual reality","jetpacks","lasers","drones","3D printers","black holes",
+    # Arts & Media
+    "TikTok","YouTube","comic books","video games","paintings","poetry",
+    "musicals","movies","podcasts","memes","dance","fashion shows",
+]
+CORE_CONSTRAINTS = [
+    # Word / length limits
+    "must use only 10 words",
+    "must be exactly 3 sentences long",
+    "must include at least one question",
+    "must rhyme",
+    "must be written backwards",
+    "must only use words of 5 letters or less",
+    # Style / genre
+    "must be written as a haiku",
+    "must be written as a rap verse",
+    "must be in Shakespearean style",
+    "must sound like a news headline",
+    "must be written like a fairy tale",
+    "must be an instruction manual",
+    "must be in the style of a recipe",
+    "must be a tweet (under 280 characters)",
+    "must be written like a motivational poster",
+    "must be a breaking news alert",
+    "must sound like a love letter",
+    # Characters / tone
+    "must mention cats",
+    "must include a banana",
+    "must feature pirates",
+    "must have a plot twist at the end",
+    "must include dialogue between two characters",
+    "must be funny",
+    "must be scary",
+    "must be inspirational",
+    # Surreal twists
+    "must be set in space",
+    "must include a time machine",
+    "must describe a dream",
+    "must use only emojis",
+    "must swap the roles of {A} and {B}",
+]
+
+CORE_PACK = {"prompts": CORE_PROMPTS, "concepts": CORE_CONCEPTS, "constraints": CORE_CONSTRAINTS}
+
+AI_MODEL = "gpt-4o-mini"
+DIFFICULTIES = ["Easy", "Medium", "Hard"]
+COMPETITIVE_MODES = ["Classic", "Constraint", "Mash-up"]
+
+# --------------------------
+# Prompt builders (one per mode)
+# --------------------------
+# {A} / {B} slots plus str.format-style "{{" / "}}" escapes; any other brace is literal.
+TEMPLATE_TOKEN = re.compile(r"\{\{|\}\}|\{([AB])\}")
+
+def fmt_dynamic(text: str, A: str, B: str) -> str:
+    return text.replace("{A}", A).replace("{B}", B)
+
+def classic_prompt(template: str, A: str, B: str) -> str:
+    # Same output as template.format(A=A, B=B), but stray braces in user packs can't break it.
+    values = {"A": A, "B": B}
+    return TEMPLATE_TOKEN.sub(lambda m: values[m.group(1)] if m.group(1) else m.group(0)[0], template)
+
+def constraint_prompt(A: str, B: str, constraints: Sequence[str]) -> str:
+    constraint_text = " AND ".join(fmt_dynamic(c, A, B) for c in constraints)
+    return f"Create something involving **{A}** and **{B}** — but it {constraint_text}."
+
+_CONSTRAINT_TAIL = re.compile(r" — but it (.+)\.$", re.DOTALL)
+
+def prompt_constraints(prompt: str) -> List[str]:
+    # Inverse of constraint_prompt: the constraints a Constraint-mode prompt asks for.
+    m = _CONSTRAINT_TAIL.search(prompt)
+    return m.group(1).split(" AND ") if m else []
+
+def mashup_prompt(A: str, B: str) -> str:
+    return f"Blend **{A}** and **{B}** into a new invention, story, or ad."
+
+def story_spark(A: str, B: str) -> str:
+    # Optional opening suggestion for Yes, And…
+    return f"Start a story where **{A}** meets **{B}**."
+
+# --------------------------
+# AI helpers: build messages + token caps
+# --------------------------
+def ai_length_rule(difficulty: str):
+    if difficulty == "Easy":
+        return "Write 1–2 sentences. Keep it under ~60 words."
+    if difficulty == "Hard":
+        return "Write 5–6 sentences. Keep it under ~180 words."
+    return "Write 3–4 sentences. Keep it under ~120 words."
+
+def ai_common_rules():
+    return (
+        "Do not include titles, headings, disclaimers, or bullet points. "
+        "Do not explain your reasoning. Output only the final idea as plain text."
+    )
+
+def ai_tokens_for_mode(mode: str, difficulty: str):
+    base = {"Easy": 90, "Medium": 160, "Hard": 240}[difficulty]
+    if mode == "Yes, And…":
+        return 70  # keep improv snappy
+    return base
+
+def ai_messages_for_prompt(user_prompt: str, difficulty: str, extra_rule: str = ""):
+    system = f"You are a concise, imaginative writer. {ai_common_rules()} {ai_length_rule(difficulty)} {extra_rule}".strip()
+    return [{"role": "system", "content": system}, {"role": "user", "content": user_prompt}]
+
+def ai_request(mode: str, prompt: str, difficulty: str) -> Tuple[List[Dict[str, str]], int, float]:
+    # (messages, max_tokens, temperature) for a competitive round
+    if mode == "Constraint":
+        messages = ai_messages_for_prompt(
+            f"Please satisfy the constraint exactly. {prompt}",
+            difficulty,
+            extra_rule="Strictly follow all constraints; if a word/length limit is included, obey it."
+        )
+    else:
+        messages = ai_messages_for_prompt(prompt, difficulty)
+    return messages, ai_tokens_for_mode(mode, difficulty), 0.9
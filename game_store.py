@@ -0,0 +1,192 @@
+"""Persistent round history and leaderboards.
+
+Rounds are appended to a SQLite database in WAL mode by a background writer
+thread, so the vote buttons only enqueue a record and never wait on disk.
+Aggregate tables (per player, per mode, global) are updated in the same
+transaction as the round insert, so leaderboards are read straight from small
+indexed tables instead of by scanning history.
+"""
+import time
+import queue
+import logging
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS rounds (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    session_id TEXT, player TEXT, mode TEXT, difficulty TEXT, pack TEXT,
+    prompt TEXT, human TEXT, ai TEXT,
+    vote TEXT,                       -- "Human" | "AI"
+    judge_winner TEXT, judge_reason TEXT,
+    write_s REAL, ai_s REAL
+);
+CREATE INDEX IF NOT EXISTS rounds_player_ts ON rounds(player, ts);
+CREATE TABLE IF NOT EXISTS player_totals (
+    player TEXT PRIMARY KEY,
+    human_wins INTEGER NOT NULL DEFAULT 0,
+    ai_wins INTEGER NOT NULL DEFAULT 0,
+    rounds INTEGER NOT NULL DEFAULT 0,
+    updated REAL
+);
+CREATE INDEX IF NOT EXISTS player_totals_wins ON player_totals(human_wins DESC);
+CREATE TABLE IF NOT EXISTS mode_totals (
+    mode TEXT PRIMARY KEY,
+    human_wins INTEGER NOT NULL DEFAULT 0,
+    ai_wins INTEGER NOT NULL DEFAULT 0,
+    rounds INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+ROUND_FIELDS = ("ts", "session_id", "player", "mode", "difficulty", "pack", "prompt", "human", "ai",
+                "vote", "judge_winner", "judge_reason", "write_s", "ai_s")
+
+log = logging.getLogger(__name__)
+
+
+class GameStore:
+    def __init__(self, path: str, batch_size: int = 100, flush_interval: float = 0.5):
+        self.path = path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue()
+        self._read_lock = threading.Lock()
+        conn = self._connect()
+        conn.executescript(SCHEMA)
+        conn.commit()
+        conn.close()
+        self._reader = self._connect()
+        self.stats = {"queued": 0, "written": 0, "batches": 0, "retries": 0, "errors": 0}
+        self._writer = threading.Thread(target=self._run, name="game-store-writer", daemon=True)
+        self._writer.start()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    # --------------------------
+    # Writes (non-blocking)
+    # --------------------------
+    def record_round(self, **fields):
+        rec = {k: fields.get(k) for k in ROUND_FIELDS}
+        rec["ts"] = rec["ts"] or time.time()
+        self._queue.put(rec)
+        self.stats["queued"] += 1
+
+    def _run(self):
+        conn = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = None in batch
+            batch = [r for r in batch if r is not None]
+            if batch:
+                conn = self._flush_batch(conn, batch)
+            for _ in range(len(batch) + stop):
+                self._queue.task_done()
+            if stop:
+                conn.close()
+                return
+
+    def _flush_batch(self, conn: sqlite3.Connection, batch: List[dict]) -> sqlite3.Connection:
+        # A failed batch was rolled back as a whole, so it is retried once on a
+        # fresh connection (e.g. after "database is locked") before it is given up.
+        for attempt in (1, 2):
+            try:
+                self._write(conn, batch)
+                self.stats["written"] += len(batch)
+                self.stats["batches"] += 1
+                return conn
+            except Exception:
+                if attempt == 2:
+                    self.stats["errors"] += 1
+                    log.exception("dropped %d rounds after a failed retry", len(batch))
+                    return conn
+                self.stats["retries"] += 1
+                log.warning("writing %d rounds failed; retrying", len(batch), exc_info=True)
+                time.sleep(self.flush_interval)
+                try:
+                    fresh = self._connect()
+                except Exception:
+                    continue  # retry on the old connection
+                conn.close()
+                conn = fresh
+        return conn
+
+    def _write(self, conn: sqlite3.Connection, batch: List[dict]):
+        with conn:  # one transaction per batch
+            conn.executemany(
+                f"INSERT INTO rounds ({', '.join(ROUND_FIELDS)}) VALUES ({', '.join('?' * len(ROUND_FIELDS))})",
+                [tuple(r[k] for k in ROUND_FIELDS) for r in batch],
+            )
+            for r in batch:
+                h, a = int(r["vote"] == "Human"), int(r["vote"] == "AI")
+                if r["player"]:
+                    conn.execute(
+                        "INSERT INTO player_totals (player, human_wins, ai_wins, rounds, updated)"
+                        " VALUES (?, ?, ?, 1, ?) ON CONFLICT(player) DO UPDATE SET"
+                        " human_wins = human_wins + excluded.human_wins, ai_wins = ai_wins + excluded.ai_wins,"
+                        " rounds = rounds + 1, updated = excluded.updated",
+                        (r["player"], h, a, r["ts"]),
+                    )
+                for mode in (r["mode"] or "-", "*"):  # "*" is the global total
+                    conn.execute(
+                        "INSERT INTO mode_totals (mode, human_wins, ai_wins, rounds) VALUES (?, ?, ?, 1)"
+                        " ON CONFLICT(mode) DO UPDATE SET human_wins = human_wins + excluded.human_wins,"
+                        " ai_wins = ai_wins + excluded.ai_wins, rounds = rounds + 1",
+                        (mode, h, a),
+                    )
+
+    def flush(self, timeout: float = 5.0):
+        # Wait until everything queued so far is on disk (used by tools/tests).
+        end = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < end:
+            time.sleep(0.01)
+
+    def close(self):
+        self._queue.put(None)
+        self._writer.join(timeout=5)
+
+    # --------------------------
+    # Reads (aggregate tables, plus id-ordered history scans)
+    # --------------------------
+    def _query(self, sql: str, args=()) -> List[tuple]:
+        with self._read_lock:
+            return self._reader.execute(sql, args).fetchall()
+
+    def leaderboard(self, limit: int = 10) -> List[Dict[str, object]]:
+        rows = self._query(
+            "SELECT player, human_wins, ai_wins, rounds FROM player_totals"
+            " ORDER BY human_wins DESC LIMIT ?", (limit,))
+        return [{"player": p, "human_wins": h, "ai_wins": a, "rounds": n} for p, h, a, n in rows]
+
+    def player_totals(self, player: str) -> Dict[str, int]:
+        rows = self._query("SELECT human_wins, ai_wins, rounds FROM player_totals WHERE player = ?", (player,))
+        h, a, n = rows[0] if rows else (0, 0, 0)
+        return {"Human": h, "AI": a, "rounds": n}
+
+    def totals(self) -> Dict[str, Dict[str, int]]:
+        rows = self._query("SELECT mode, human_wins, ai_wins, rounds FROM mode_totals")
+        return {m: {"Human": h, "AI": a, "rounds": n} for m, h, a, n in rows}
+
+    def recent_rounds(self, player: Optional[str] = None, limit: int = 20) -> List[Dict[str, object]]:
+        if player:
+            rows = self._query(f"SELECT {', '.join(ROUND_FIELDS)} FROM rounds WHERE player = ?"
+                               " ORDER BY ts DESC LIMIT ?", (player, limit))
+        else:
+            rows = self._query(f"SELECT {', '.join(ROUND_FIELDS)} FROM rounds ORDER BY id DESC LIMIT ?", (limit,))
+        return [dict(zip(ROUND_FIELDS, r)) for r in rows]
+
+    def answers(self, after_id: int = 0, limit: int = 5000) -> List[tuple]:
+        # (id, prompt, human, ai) in id order, for indexes that rebuild from history in chunks.
+        return self._query("SELECT id, prompt, human, ai FROM rounds WHERE id > ? ORDER BY id LIMIT ?",
+                           (after_id, limit))
@@ -0,0 +1,248 @@
+"""AI Judge: structured, memoized verdicts with a batch mode.
+
+Single verdicts are cached per (prompt, human, ai) hash, so asking twice costs
+nothing. Batch mode judges many rounds in one JSON-output request, which is how
+tournaments, classroom sessions and archived rounds are scored:
+
+    python judge.py rounds.jsonl --out verdicts.jsonl --batch-size 25
+
+Each input line is a JSON object with "prompt", "human" and "ai" (plus any extra
+fields, which are copied to the output).
+
+Constraint rounds are checked locally first (constraint_check). When exactly one
+side breaks a strict rule (a word, sentence or character count, ...) that side
+loses without a model call; otherwise the check results go into the judge prompt.
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from constraint_check import Report, check_round
+from game_content import AI_MODEL
+from llm_gateway import Backend, LLMGateway
+
+RUBRIC = (
+    "Judge for creativity, clarity, and adherence to constraints/guidance. "
+    "Output strictly: Winner: <Human|AI>. Reason: <one short sentence>."
+)
+SYSTEM = "Be concise and decisive. No preambles."
+_WINNER = re.compile(r"winner\s*[:\-]\s*\**\s*(human|ai)\b", re.IGNORECASE)
+_REASON = re.compile(r"reason\s*[:\-]\s*(.+)", re.IGNORECASE | re.DOTALL)
+
+
+class Verdict(NamedTuple):
+    winner: Optional[str]   # "Human", "AI" or None if the judge's answer could not be parsed
+    reason: str
+    raw: str = ""
+
+    def text(self) -> str:
+        if self.winner is None:
+            return self.raw
+        return f"Winner: {self.winner}. Reason: {self.reason}"
+
+
+def round_id(prompt: str, human: str, ai: str) -> str:
+    raw = json.dumps([prompt, human, ai], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:16]
+
+
+def parse_verdict(raw: str) -> Verdict:
+    raw = (raw or "").strip()
+    m = _WINNER.search(raw)
+    winner = None if m is None else ("AI" if m.group(1).lower() == "ai" else "Human")
+    r = _REASON.search(raw)
+    reason = r.group(1).strip().strip("*").strip() if r else ""
+    return Verdict(winner, reason, raw)
+
+
+def checks_text(reports: Optional[Tuple[Report, Report]]) -> str:
+    if reports is None:
+        return ""
+    return f"CONSTRAINT CHECK (automatic): Human: {reports[0].summary()}. AI: {reports[1].summary()}."
+
+
+def local_verdict(reports: Optional[Tuple[Report, Report]]) -> Optional[Verdict]:
+    # Decided without the model only when exactly one side broke a strict rule.
+    if reports is None or reports[0].strict_ok == reports[1].strict_ok:
+        return None
+    winner, loser = ("Human", reports[1]) if reports[0].strict_ok else ("AI", reports[0])
+    broke = next(r for r in loser.failed() if r.strict)
+    other = "AI" if winner == "Human" else "Human"
+    return Verdict(winner, f"{other}'s answer breaks “{broke.constraint}” ({broke.detail}).", "local constraint check")
+
+
+def judge_messages(prompt: str, human: str, ai: str, checks: str = "") -> List[Dict[str, str]]:
+    checks = f"{checks}\n\n" if checks else ""
+    judge_prompt = f"""
+PROMPT: {prompt}
+
+HUMAN: {human}
+
+AI: {ai}
+
+{checks}{RUBRIC}
+"""
+    return [{"role": "system", "content": SYSTEM}, {"role": "user", "content": judge_prompt}]
+
+
+def batch_messages(rounds: List[dict]) -> List[Dict[str, str]]:
+    items = [{"id": r["id"], "prompt": r["prompt"], "human": r["human"], "ai": r["ai"]} for r in rounds]
+    for item, r in zip(items, rounds):
+        if r.get("checks"):
+            item["checks"] = r["checks"]
+    return [
+        {"role": "system", "content": SYSTEM + " Reply with JSON only."},
+        {"role": "user", "content": (
+            "Judge each round below for creativity, clarity, and adherence to constraints/guidance.\n"
+            'Return {"verdicts": [{"id": <id>, "winner": "Human" | "AI", "reason": <one short sentence>}]} '
+            "with exactly one verdict per round.\n\n"
+            f"ROUNDS:\n{json.dumps(items, ensure_ascii=False)}"
+        )},
+    ]
+
+
+class JudgeEngine:
+    def __init__(self, gateway: Backend, model: str = AI_MODEL, cache_size: int = 10000):
+        self.gateway = gateway
+        self.model = model
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Verdict]" = OrderedDict()
+        self.stats = {"hits": 0, "single_calls": 0, "batch_calls": 0, "batched_rounds": 0, "local": 0}
+
+    # --------------------------
+    # Cache
+    # --------------------------
+    def cached(self, prompt: str, human: str, ai: str) -> Optional[Verdict]:
+        key = round_id(prompt, human, ai)
+        with self._lock:
+            v = self._cache.get(key)
+            if v is not None:
+                self._cache.move_to_end(key)
+                self.stats["hits"] += 1
+            return v
+
+    def _store(self, key: str, verdict: Verdict):
+        if verdict.winner is None:
+            return  # don't memoize unparseable answers
+        with self._lock:
+            self._cache[key] = verdict
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    # --------------------------
+    # Judging
+    # --------------------------
+    def judge(self, prompt: str, human: str, ai: str, tags: Optional[dict] = None) -> Verdict:
+        hit = self.cached(prompt, human, ai)
+        if hit is not None:
+            return hit
+        reports = check_round(prompt, human, ai)
+        verdict = local_verdict(reports)
+        with self._lock:
+            self.stats["local" if verdict else "single_calls"] += 1
+        if verdict is None:
+            raw = self.gateway.complete(judge_messages(prompt, human, ai, checks_text(reports)), max_tokens=80,
+                                        temperature=0.3, model=self.model, tags=tags).text
+            verdict = parse_verdict(raw)
+        self._store(round_id(prompt, human, ai), verdict)
+        return verdict
+
+    def judge_batch(self, rounds: List[dict], batch_size: int = 20, concurrency: int = 1,
+                    tags: Optional[dict] = None) -> List[Verdict]:
+        """Judge rounds ({"prompt", "human", "ai"}) with one request per batch_size rounds.
+        Cached rounds are skipped; rounds a batch answer leaves out are judged singly."""
+        keyed = [dict(r, id=round_id(r["prompt"], r["human"], r["ai"])) for r in rounds]
+        results: Dict[str, Verdict] = {}
+        todo, seen = [], set()
+        for r in keyed:
+            hit = self.cached(r["prompt"], r["human"], r["ai"])
+            if hit is not None:
+                results[r["id"]] = hit
+            elif r["id"] not in seen:
+                seen.add(r["id"])
+                reports = check_round(r["prompt"], r["human"], r["ai"])
+                verdict = local_verdict(reports)
+                if verdict is not None:
+                    results[r["id"]] = verdict
+                    self._store(r["id"], verdict)
+                    with self._lock:
+                        self.stats["local"] += 1
+                else:
+                    todo.append(dict(r, checks=checks_text(reports)))
+        batches = [todo[i:i + batch_size] for i in range(0, len(todo), max(1, batch_size))]
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            for verdicts in pool.map(lambda b: self._judge_one_batch(b, tags), batches):
+                results.update(verdicts)
+        for r in todo:
+            if r["id"] not in results:
+                results[r["id"]] = self.judge(r["prompt"], r["human"], r["ai"], tags)
+        return [results[r["id"]] for r in keyed]
+
+    def _judge_one_batch(self, batch: List[dict], tags: Optional[dict]) -> Dict[str, Verdict]:
+        with self._lock:
+            self.stats["batch_calls"] += 1
+            self.stats["batched_rounds"] += len(batch)
+        try:
+            raw = self.gateway.complete(
+                batch_messages(batch), max_tokens=60 * len(batch) + 50, temperature=0.3, model=self.model,
+                response_format={"type": "json_object"}, tags=tags,
+            ).text
+            data = json.loads(raw)
+        except Exception:
+            return {}
+        ids = {r["id"] for r in batch}
+        out = {}
+        for item in data.get("verdicts", []) if isinstance(data, dict) else []:
+            winner = str(item.get("winner", "")).strip()
+            if item.get("id") in ids and winner.lower() in ("human", "ai"):
+                v = Verdict("AI" if winner.lower() == "ai" else "Human", str(item.get("reason", "")).strip(),
+                            json.dumps(item, ensure_ascii=False))
+                out[item["id"]] = v
+                self._store(item["id"], v)
+        return out
+
+
+# --------------------------
+# CLI: judge archived rounds offline
+# --------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Judge archived rounds in batches.")
+    ap.add_argument("rounds", help='JSON lines with "prompt", "human" and "ai"')
+    ap.add_argument("--out", default="-", help="output JSON lines (default: stdout)")
+    ap.add_argument("--batch-size", type=int, default=20)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--model", default=AI_MODEL)
+    ap.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint (default: OPENAI_BASE_URL)")
+    args = ap.parse_args(argv)
+
+    with open(args.rounds, "r", encoding="utf-8") as f:
+        rounds = [json.loads(line) for line in f if line.strip()]
+    gateway = LLMGateway(
+        api_key=os.environ.get("OPENAI_API_KEY", "sk-local"),
+        base_url=args.base_url or os.environ.get("OPENAI_BASE_URL") or None,
+        model=args.model, max_connections=args.concurrency,
+    )
+    engine = JudgeEngine(gateway, model=args.model)
+    verdicts = engine.judge_batch(rounds, batch_size=args.batch_size, concurrency=args.concurrency)
+    out = sys.stdout if args.out == "-" else open(args.out, "w", encoding="utf-8")
+    try:
+        for r, v in zip(rounds, verdicts):
+            out.write(json.dumps(dict(r, winner=v.winner, reason=v.reason), ensure_ascii=False) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+    print(engine.stats, file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
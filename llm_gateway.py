@@ -0,0 +1,367 @@
+"""Single process-wide gateway to the chat completions API.
+
+Every AI call in the app and the offline tools goes through one LLMGateway. It
+holds one pooled sync client and one pooled async client, and adds:
+
+- per-call deadlines (the overall budget, including retries)
+- jittered exponential backoff on 429 / 5xx / connection errors
+- a token-bucket limiter for requests-per-minute and tokens-per-minute
+- coalescing: identical requests already in flight share one API call
+- optional per-call latency/token metrics (see metrics.py)
+"""
+import time
+import random
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterator, List, NamedTuple, Optional, Protocol, Tuple
+
+from response_cache import cache_key
+
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class Completion(NamedTuple):
+    text: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    attempts: int = 1
+    choices: Tuple[str, ...] = ()   # every choice when the request asked for n > 1
+
+
+class DeadlineExceeded(TimeoutError):
+    pass
+
+
+class Backend(Protocol):
+    """What the app and the judge call: LLMGateway, or local_backend.LocalBackend for offline play."""
+    model: str
+    stats: dict
+
+    def complete(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+                 deadline: Optional[float] = None, coalesce: bool = True, tags: Optional[dict] = None,
+                 **extra) -> Completion: ...
+
+    def stream(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+               deadline: Optional[float] = None, tags: Optional[dict] = None, **extra) -> Iterator[str]: ...
+
+
+# --------------------------
+# Rate limiting
+# --------------------------
+class TokenBucket:
+    """Refills ``per_minute`` units per minute, up to that many. Reservations may go into debt;
+    the caller is told how long to wait before its reservation is covered."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.fill_rate = float(per_minute) / 60.0
+        self.level = float(per_minute)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount: float) -> float:
+        if self.capacity <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            self.level -= min(amount, self.capacity)
+            return 0.0 if self.level >= 0 else -self.level / self.fill_rate
+
+
+def estimate_tokens(messages: List[Dict[str, str]], max_tokens: int) -> int:
+    return sum(len(m.get("content", "")) for m in messages) // 4 + max_tokens
+
+
+def _retry_after(exc: Exception) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+def _is_retryable(exc: Exception) -> bool:
+    import openai
+    if isinstance(exc, (openai.APIConnectionError, openai.APITimeoutError, openai.RateLimitError)):
+        return True
+    return isinstance(exc, openai.APIStatusError) and exc.status_code in RETRYABLE_STATUS
+
+
+# --------------------------
+# Gateway
+# --------------------------
+class LLMGateway:
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 model: str = "gpt-4o-mini", rpm: float = 500, tpm: float = 200000,
+                 timeout: float = 30.0, max_retries: int = 3, backoff: float = 0.5,
+                 max_connections: int = 100, metrics=None):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.model = model
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_connections = max_connections
+        self.metrics = metrics   # optional metrics.MetricsRecorder
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self._client = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._stats_lock = threading.Lock()   # calls finish on many threads (executors, scheduler)
+        self.stats = {"calls": 0, "coalesced": 0, "retries": 0, "errors": 0, "throttled_s": 0.0,
+                      "stopped_early": 0}
+
+    def _count(self, key: str, amount: float = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    # Clients are built on first use so importing the gateway stays cheap.
+    def _http_client(self, is_async: bool):
+        # Size the SDK's connection pool; fall back to its default pool if the
+        # installed SDK no longer ships on httpx.
+        try:
+            import httpx
+            import openai
+            cls = openai.DefaultAsyncHttpxClient if is_async else openai.DefaultHttpxClient
+            limits = httpx.Limits(max_connections=self.max_connections,
+                                  max_keepalive_connections=self.max_connections)
+            return cls(limits=limits, timeout=self.timeout)
+        except (ImportError, AttributeError):
+            return None
+
+    @property
+    def client(self):
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    from openai import OpenAI
+                    self._client = OpenAI(
+                        api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout,
+                        http_client=self._http_client(is_async=False),
+                    )
+        return self._client
+
+    @property
+    def async_client(self):
+        if self._async_client is None:
+            with self._lock:
+                if self._async_client is None:
+                    from openai import AsyncOpenAI
+                    self._async_client = AsyncOpenAI(
+                        api_key=self.api_key, base_url=self.base_url, max_retries=0, timeout=self.timeout,
+                        http_client=self._http_client(is_async=True),
+                    )
+        return self._async_client
+
+    # --------------------------
+    # Helpers
+    # --------------------------
+    def _kwargs(self, messages, max_tokens, temperature, model, extra) -> dict:
+        kw = {"model": model or self.model, "messages": messages,
+              "max_tokens": max_tokens, "temperature": temperature}
+        kw.update(extra)
+        return kw
+
+    def _throttle_delay(self, messages, max_tokens: int) -> float:
+        wait = max(self.requests.reserve(1), self.tokens.reserve(estimate_tokens(messages, max_tokens)))
+        self._count("throttled_s", wait)
+        return wait
+
+    def _backoff_delay(self, attempt: int, exc: Exception) -> float:
+        hinted = _retry_after(exc)
+        if hinted is not None:
+            return hinted
+        # "full jitter" exponential backoff
+        return random.uniform(0, self.backoff * (2 ** attempt))
+
+    @staticmethod
+    def _to_completion(resp, attempts: int) -> Completion:
+        usage = getattr(resp, "usage", None)
+        choices = tuple(c.message.content or "" for c in resp.choices)
+        return Completion(
+            text=choices[0],
+            prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+            attempts=attempts,
+            choices=choices if len(choices) > 1 else (),
+        )
+
+    def _check_deadline(self, deadline: float, wait: float = 0.0):
+        if time.monotonic() + wait > deadline:
+            raise DeadlineExceeded("AI request deadline exceeded")
+
+    # --------------------------
+    # Instrumentation
+    # --------------------------
+    def _record(self, tags: Optional[dict], model: Optional[str], started: float, ok: bool,
+                queue_s: float = 0.0, ttft_s: Optional[float] = None,
+                prompt_tokens: int = 0, completion_tokens: int = 0, source: str = "api"):
+        if self.metrics is None:
+            return
+        tags = dict(tags or {})
+        queued_at = tags.pop("queued_at", None)  # set by callers that hand work to a pool
+        if queued_at is not None:
+            queue_s += max(0.0, started - queued_at)
+        self.metrics.record(
+            source=source, model=model or self.model, ok=ok, queue_s=round(queue_s, 4),
+            ttft_s=None if ttft_s is None else round(ttft_s, 4),
+            total_s=round(time.monotonic() - (queued_at or started), 4),
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, **tags,
+        )
+
+    # --------------------------
+    # Sync API
+    # --------------------------
+    def complete(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+                 deadline: Optional[float] = None, coalesce: bool = True, tags: Optional[dict] = None,
+                 **extra) -> Completion:
+        """Blocking completion. ``deadline`` is the total budget in seconds, retries included.
+        ``tags`` (mode, difficulty, pack, ...) are attached to the recorded metrics."""
+        started = time.monotonic()
+        key = None
+        if coalesce:
+            key = cache_key(messages, max_tokens, model or self.model, temperature) + repr(sorted(extra.items()))
+            with self._lock:
+                fut = self._inflight.get(key)
+                owner = fut is None
+                if owner:
+                    fut = self._inflight[key] = Future()
+                else:
+                    self._count("coalesced")
+            if not owner:
+                result = fut.result(timeout=deadline or self.timeout * (self.max_retries + 1))
+                self._record(tags, model, started, True, ttft_s=time.monotonic() - started, source="coalesced")
+                return result
+        try:
+            result = self._complete(messages, max_tokens, temperature, model, deadline, extra, tags, started)
+        except BaseException as e:
+            if key is not None:
+                with self._lock:
+                    self._inflight.pop(key, None)
+                fut.set_exception(e)
+            raise
+        if key is not None:
+            with self._lock:
+                self._inflight.pop(key, None)
+            fut.set_result(result)
+        return result
+
+    def _complete(self, messages, max_tokens, temperature, model, deadline, extra, tags, started) -> Completion:
+        end = time.monotonic() + (deadline or self.timeout * (self.max_retries + 1))
+        kw = self._kwargs(messages, max_tokens, temperature, model, extra)
+        queued = 0.0
+        for attempt in range(self.max_retries + 1):
+            wait = self._throttle_delay(messages, max_tokens)
+            self._check_deadline(end, wait)
+            if wait:
+                time.sleep(wait)
+                queued += wait
+            self._count("calls")
+            try:
+                resp = self.client.chat.completions.create(
+                    timeout=max(0.1, min(self.timeout, end - time.monotonic())), **kw)
+                result = self._to_completion(resp, attempt + 1)
+                self._record(tags, model, started, True, queue_s=queued, ttft_s=time.monotonic() - started,
+                             prompt_tokens=result.prompt_tokens, completion_tokens=result.completion_tokens)
+                return result
+            except Exception as e:
+                delay = self._backoff_delay(attempt, e)
+                if attempt == self.max_retries or not _is_retryable(e) or time.monotonic() + delay > end:
+                    self._count("errors")
+                    self._record(tags, model, started, False, queue_s=queued)
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+        raise DeadlineExceeded("AI request deadline exceeded")
+
+    def stream(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+               deadline: Optional[float] = None, tags: Optional[dict] = None, **extra) -> Iterator[str]:
+        """Yield text deltas. Retries only happen before the first token arrives."""
+        started = time.monotonic()
+        end = started + (deadline or self.timeout * (self.max_retries + 1))
+        kw = self._kwargs(messages, max_tokens, temperature, model, extra)
+        kw.setdefault("stream_options", {"include_usage": True})
+        queued = 0.0
+        for attempt in range(self.max_retries + 1):
+            wait = self._throttle_delay(messages, max_tokens)
+            self._check_deadline(end, wait)
+            if wait:
+                time.sleep(wait)
+                queued += wait
+            self._count("calls")
+            ttft = None
+            usage = None
+            deltas = 0
+            try:
+                stream = self.client.chat.completions.create(
+                    stream=True, timeout=max(0.1, min(self.timeout, end - time.monotonic())), **kw)
+                for chunk in stream:
+                    if getattr(chunk, "usage", None):
+                        usage = chunk.usage
+                    if not chunk.choices:
+                        continue
+                    delta = chunk.choices[0].delta.content or ""
+                    if delta:
+                        if ttft is None:
+                            ttft = time.monotonic() - started
+                        deltas += 1
+                        yield delta
+                self._record(tags, model, started, True, queue_s=queued, ttft_s=ttft,
+                             prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+                             completion_tokens=getattr(usage, "completion_tokens", 0) or 0)
+                return
+            except GeneratorExit:
+                # The caller has enough (e.g. the length rule is met): drop the connection
+                # so the server stops generating. Each delta is about one token.
+                stream.close()
+                self._count("stopped_early")
+                self._record(tags, model, started, True, queue_s=queued, ttft_s=ttft, completion_tokens=deltas)
+                raise
+            except Exception as e:
+                delay = self._backoff_delay(attempt, e)
+                if (ttft is not None or attempt == self.max_retries or not _is_retryable(e)
+                        or time.monotonic() + delay > end):
+                    self._count("errors")
+                    self._record(tags, model, started, False, queue_s=queued, ttft_s=ttft)
+                    raise
+                self._count("retries")
+                time.sleep(delay)
+
+    # --------------------------
+    # Async API
+    # --------------------------
+    async def acomplete(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+                        deadline: Optional[float] = None, tags: Optional[dict] = None, **extra) -> Completion:
+        started = time.monotonic()
+        end = started + (deadline or self.timeout * (self.max_retries + 1))
+        kw = self._kwargs(messages, max_tokens, temperature, model, extra)
+        import asyncio  # only the batch tools use the async path
+        queued = 0.0
+        for attempt in range(self.max_retries + 1):
+            wait = self._throttle_delay(messages, max_tokens)
+            self._check_deadline(end, wait)
+            if wait:
+                await asyncio.sleep(wait)
+                queued += wait
+            self._count("calls")
+            try:
+                resp = await self.async_client.chat.completions.create(
+                    timeout=max(0.1, min(self.timeout, end - time.monotonic())), **kw)
+                result = self._to_completion(resp, attempt + 1)
+                self._record(tags, model, started, True, queue_s=queued, ttft_s=time.monotonic() - started,
+                             prompt_tokens=result.prompt_tokens, completion_tokens=result.completion_tokens)
+                return result
+            except Exception as e:
+                delay = self._backoff_delay(attempt, e)
+                if attempt == self.max_retries or not _is_retryable(e) or time.monotonic() + delay > end:
+                    self._count("errors")
+                    self._record(tags, model, started, False, queue_s=queued)
+                    raise
+                self._count("retries")
+                await asyncio.sleep(delay)
+        raise DeadlineExceeded("AI request deadline exceeded")
@@ -0,0 +1,356 @@
+"""In-process AI backend: no network, no API key, predictable latency.
+
+LocalBackend answers the same calls as LLMGateway (``complete``, ``stream``,
+``stats``), so the mode renderers, story summaries, rooms and the judge run on
+it unchanged. Select it with ``AI_BACKEND = "local"`` in Streamlit Secrets.
+
+The default generator is a word-level Markov chain over a seed corpus of ideas
+with {A}/{B} slots, filled with concepts taken from the prompt (bold **A** /
+**B**, or any concept from the loaded packs). Judge requests are scored on
+concept coverage, detail and word variety and answered in the format judge.py
+parses; summary requests get a short extractive summary.
+
+Requests from every session go through one queue. A worker thread takes up to
+``max_batch`` of them at a time and hands them to ``generator.generate_batch``,
+which is where a real local model (llama.cpp, ONNX) would run a single batched
+forward pass. Any object with ``name`` and ``generate_batch(requests)`` plugs in.
+"""
+import re
+import json
+import math
+import time
+import queue
+import random
+import hashlib
+import threading
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from game_content import CORE_PACK, fmt_dynamic
+from judge import RUBRIC
+from llm_gateway import Completion, DeadlineExceeded, estimate_tokens
+
+LOCAL_MODEL = "local-markov"
+
+SEED_IDEAS = [
+    "Picture {A} teaming up with {B} to open a tiny shop that only sells surprises.",
+    "Every morning {A} wakes up the whole town, and {B} hands out breakfast to anyone who laughs.",
+    "A secret club of {A} meets under the bridge to plan the greatest parade of {B} ever seen.",
+    "The city votes to replace its traffic lights with {A}, and {B} become the new crossing guards.",
+    "Scientists discover that {A} can talk, but only when {B} are nearby and the moon is full.",
+    "Once upon a time {A} lost a bet to {B} and had to sing at every birthday for a year.",
+    "The new app matches lonely {A} with {B} who need a friend, and the reviews are glowing.",
+    "A museum of {A} opens its doors at midnight, and the guided tour is run by {B}.",
+    "Nobody expected {A} to win the talent show until {B} joined in on the chorus.",
+    "In the future every home has {A} in the kitchen and {B} on the roof to catch the rain.",
+    "The festival starts when {A} float over the square and {B} race to catch them.",
+    "Breaking news: {A} have taken over the library, and {B} are negotiating for the comics section.",
+    "Her grandmother kept {A} in a jar, and every spring they turned into {B}.",
+    "The only way to cross the desert is to ride {A} while {B} read you the map.",
+    "A reality show follows {A} as they try to live one week like {B}, and it goes wonderfully wrong.",
+    "The recipe is simple: mix {A} with a pinch of {B} and let it rest until it starts to hum.",
+    "Buy one of {A} today and get a lifetime supply of {B}, no questions asked.",
+    "On the space station the crew trains {A} to fix the engines while {B} keep everyone calm.",
+    "The detective found {A} at every crime scene, and the trail led straight to {B}.",
+    "A school for {A} teaches one subject only: how to get along with {B}.",
+    "Legend says {A} were born from a storm of {B}, which is why they glow in the dark.",
+    "When the power went out, {A} lit up the street and {B} told stories until dawn.",
+    "The mayor hid {A} in the town clock, so every hour {B} pop out and dance.",
+    "Tourists line up for hours to ride {A} through a tunnel painted by {B}.",
+    "At the end of the day {A} and {B} turn out to be the same thing wearing different hats.",
+    "Nobody remembers who invented {A}, but {B} still argue about it every Tuesday.",
+    "The twist is that {B} were running the whole thing, and {A} knew it all along.",
+    "By sunset the whole town was dancing, and {A} were the stars of the show.",
+]
+
+_BOLD = re.compile(r"\*\*(.+?)\*\*")
+_WORDS = re.compile(r"[\w'-]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PIECES = re.compile(r"\S+\s*")
+_SENTENCE_RANGE = re.compile(r"(\d+)\s*[–-]\s*(\d+)\s+sentences", re.IGNORECASE)
+_EXACT_SENTENCES = re.compile(r"exactly\s+(\d+)\s+sentences", re.IGNORECASE)
+_WORD_CAP = re.compile(r"(?:only|under ~?|at most)\s*(\d+)\s+words", re.IGNORECASE)
+_JUDGE = re.compile(r"PROMPT:(.*?)\n\nHUMAN:(.*?)\n\nAI:(.*?)\n\n(?:CONSTRAINT CHECK.*?\n\n)?" + re.escape(RUBRIC),
+                    re.DOTALL)
+_SUMMARY = re.compile(r"Summary so far:(.*?)\n\nNew lines:\n(.*?)\n\n", re.DOTALL)
+_SLOT = ("{A}", "{B}")
+REASONS = ("Works more of the prompt's ideas in.", "More developed and specific.",
+           "Fresher, less repetitive wording.")
+
+
+class LocalRequest(NamedTuple):
+    messages: List[Dict[str, str]]
+    max_tokens: int
+    temperature: float
+    extra: dict
+
+
+# --------------------------
+# Markov generator
+# --------------------------
+class MarkovModel:
+    name = LOCAL_MODEL
+
+    def __init__(self, packs: Iterable[Dict[str, Sequence[str]]] = (CORE_PACK,),
+                 corpus: Sequence[str] = SEED_IDEAS, max_concepts: int = 5000):
+        self.max_concepts = max_concepts
+        self._chain: Dict[Tuple[str, str], List[str]] = {}
+        self._vocab: Dict[str, str] = {}   # lower-cased concept -> as written in the pack
+        self._concepts: List[str] = []
+        self._lock = threading.Lock()
+        for text in corpus:
+            self._learn_sentence(text)
+        for pack in packs:
+            self.learn(pack)
+
+    def _learn_sentence(self, text: str):
+        state = ("", "")
+        for token in text.split() + [""]:
+            self._chain.setdefault(state, []).append(token)
+            state = (state[1], token)
+
+    def learn(self, pack: Dict[str, Sequence[str]]):
+        """Add a pack's concepts to the vocabulary (the first ``max_concepts`` of them)."""
+        concepts = pack.get("concepts") or ()
+        with self._lock:
+            for i in range(min(len(concepts), self.max_concepts)):
+                c = str(concepts[i]).strip()
+                if c and c.lower() not in self._vocab:
+                    self._vocab[c.lower()] = c
+                    self._concepts.append(c)
+
+    # --------------------------
+    # Reading requests
+    # --------------------------
+    def concepts_in(self, text: str, recent: bool = False) -> List[str]:
+        found = [m.strip() for m in _BOLD.findall(text) if m.strip()]
+        if len(found) < 2:
+            words = _WORDS.findall(text.lower())
+            i = 0
+            while i < len(words):
+                for n in (3, 2, 1):
+                    gram = " ".join(words[i:i + n])
+                    c = self._vocab.get(gram) or self._vocab.get(gram + "s")  # "dragon" -> "dragons"
+                    if c is not None:
+                        found.append(c)
+                        i += n - 1
+                        break
+                i += 1
+        return list(dict.fromkeys(reversed(found) if recent else found))
+
+    @staticmethod
+    def _sentence_count(messages, rng: random.Random) -> int:
+        text = " ".join(m.get("content", "") for m in messages)
+        exact = _EXACT_SENTENCES.search(text)
+        if exact:
+            return max(1, int(exact.group(1)))
+        span = _SENTENCE_RANGE.search(text)
+        return rng.randint(int(span.group(1)), int(span.group(2))) if span else 2
+
+    @staticmethod
+    def _word_cap(messages, max_tokens: int) -> int:
+        caps = [int(m) for msg in messages for m in _WORD_CAP.findall(msg.get("content", ""))]
+        return max(5, min(caps + [max_tokens * 3 // 4]))
+
+    # --------------------------
+    # Generation
+    # --------------------------
+    def _walk(self, rng: random.Random, greedy: bool) -> str:
+        state, out = ("", ""), []
+        for _ in range(60):
+            options = self._chain.get(state) or [""]
+            if greedy:
+                token = max(sorted(set(options)), key=options.count)
+            else:
+                token = rng.choice(options)
+            if not token:
+                break
+            out.append(token)
+            state = (state[1], token)
+        return " ".join(out)
+
+    def _sentences(self, count: int, rng: random.Random, greedy: bool) -> List[str]:
+        # The opening sentence names both concepts; later ones just have to be new.
+        out: List[str] = []
+        for n in range(count):
+            for attempt in range(12):
+                s = self._walk(rng, greedy and attempt == 0)
+                if s in out:
+                    continue
+                if n == 0 and not all(slot in s for slot in _SLOT) and attempt < 11:
+                    continue
+                out.append(s)
+                break
+        return out
+
+    def idea(self, request: LocalRequest, rng: random.Random, recent: bool = False) -> str:
+        user = request.messages[-1].get("content", "") if request.messages else ""
+        concepts = self.concepts_in(user, recent=recent)
+        while len(concepts) < 2:
+            pick = rng.choice(self._concepts) if self._concepts else "something"
+            if pick not in concepts or not self._concepts:
+                concepts.append(pick)
+        A, B = concepts[0], concepts[1]
+        words: List[str] = []
+        cap = self._word_cap(request.messages, request.max_tokens)
+        for s in self._sentences(self._sentence_count(request.messages, rng), rng, request.temperature < 0.5):
+            s = fmt_dynamic(s, A, B)
+            words += (s[:1].upper() + s[1:]).split()
+        if len(words) > cap:
+            words = words[:cap]
+            words[-1] = words[-1].rstrip(",;:") + ("" if words[-1][-1:] in ".!?" else ".")
+        return " ".join(words)
+
+    def _score(self, prompt: str, text: str) -> Tuple[float, float, float]:
+        words = _WORDS.findall(text.lower())
+        if not words:
+            return 0.0, 0.0, 0.0
+        concepts = self.concepts_in(prompt)
+        lowered = text.lower()
+        coverage = sum(c.lower() in lowered for c in concepts) / max(1, len(concepts))
+        return coverage, min(len(words), 60) / 60, len(set(words)) / len(words)
+
+    def verdict(self, prompt: str, human: str, ai: str) -> Tuple[str, str]:
+        h, a = self._score(prompt, human), self._score(prompt, ai)
+        winner = "AI" if sum(a) > sum(h) else "Human"
+        ahead, behind = (a, h) if winner == "AI" else (h, a)
+        margins = [x - y for x, y in zip(ahead, behind)]
+        return winner, REASONS[margins.index(max(margins))]
+
+    def summary(self, user: str) -> str:
+        m = _SUMMARY.search(user)
+        if m is None:
+            return ""
+        previous = "" if m.group(1).strip() == "(none)" else m.group(1).strip()
+        lines = [ln.lstrip("👤🤖 ").strip() for ln in m.group(2).splitlines() if ln.strip()]
+        sentences = [s for s in _SENTENCE_END.split(" ".join([previous] + lines).strip()) if s]
+        return " ".join(sentences[-3:])
+
+    def generate(self, request: LocalRequest) -> str:
+        seed = hashlib.sha1(json.dumps([request.messages, request.temperature, request.extra.get("choice", 0)],
+                                       ensure_ascii=False, sort_keys=True).encode("utf-8")).digest()
+        rng = random.Random(seed)
+        user = request.messages[-1].get("content", "") if request.messages else ""
+        if (request.extra.get("response_format") or {}).get("type") == "json_object" and "ROUNDS:" in user:
+            rounds = json.loads(user.split("ROUNDS:", 1)[1])
+            verdicts = []
+            for r in rounds:
+                winner, reason = self.verdict(r.get("prompt", ""), r.get("human", ""), r.get("ai", ""))
+                verdicts.append({"id": r.get("id"), "winner": winner, "reason": reason})
+            return json.dumps({"verdicts": verdicts}, ensure_ascii=False)
+        judged = _JUDGE.search(user)
+        if judged:
+            winner, reason = self.verdict(*(g.strip() for g in judged.groups()))
+            return f"Winner: {winner}. Reason: {reason}"
+        if "running summary" in request.messages[0].get("content", ""):
+            return self.summary(user)
+        return self.idea(request, rng, recent=user.startswith("Continue this story"))
+
+    def generate_batch(self, requests: List[LocalRequest]) -> List[str]:
+        return [self.generate(r) for r in requests]
+
+
+# --------------------------
+# Backend
+# --------------------------
+class LocalBackend:
+    def __init__(self, generator=None, packs: Iterable[Dict[str, Sequence[str]]] = (CORE_PACK,),
+                 max_batch: int = 16, batch_window: float = 0.005, timeout: float = 10.0, metrics=None):
+        self.generator = generator or MarkovModel(packs)
+        self.model = getattr(self.generator, "name", LOCAL_MODEL)
+        self.max_batch = max(1, max_batch)
+        self.batch_window = batch_window   # how long the worker waits for more requests to batch
+        self.timeout = timeout
+        self.metrics = metrics             # optional metrics.MetricsRecorder
+        self._queue: "queue.Queue[Tuple[LocalRequest, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name="local-ai", daemon=True)
+        self._worker.start()
+        self.stats = {"calls": 0, "batches": 0, "largest_batch": 0, "errors": 0}
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            end = time.monotonic() + self.batch_window
+            while len(batch) < self.max_batch:
+                try:
+                    batch.append(self._queue.get(timeout=max(0.0, end - time.monotonic())))
+                except queue.Empty:
+                    break
+            batch = [(r, fut) for r, fut in batch if fut.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            began = time.monotonic()
+            with self._lock:
+                self.stats["batches"] += 1
+                self.stats["largest_batch"] = max(self.stats["largest_batch"], len(batch))
+            try:
+                texts = self.generator.generate_batch([r for r, _ in batch])
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            for (_, fut), text in zip(batch, texts):
+                fut.set_result((text, began))
+
+    def submit(self, messages, max_tokens: int, temperature: float, **extra) -> Future:
+        fut: Future = Future()
+        self._queue.put((LocalRequest(messages, max_tokens, temperature, extra), fut))
+        return fut
+
+    def _record(self, tags: Optional[dict], model: Optional[str], started: float, ok: bool,
+                queue_s: float = 0.0, prompt_tokens: int = 0, completion_tokens: int = 0):
+        if self.metrics is None:
+            return
+        tags = dict(tags or {})
+        queued_at = tags.pop("queued_at", None)  # set by callers that hand work to a pool
+        if queued_at is not None:
+            queue_s += max(0.0, started - queued_at)
+        total = time.monotonic() - (queued_at or started)
+        self.metrics.record(
+            source="local", model=model or self.model, ok=ok, queue_s=round(queue_s, 4),
+            ttft_s=round(total, 4) if ok else None, total_s=round(total, 4),
+            prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, **tags,
+        )
+
+    # --------------------------
+    # Gateway API
+    # --------------------------
+    def complete(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+                 deadline: Optional[float] = None, coalesce: bool = True, tags: Optional[dict] = None,
+                 **extra) -> Completion:
+        """Blocking completion from the local generator. ``model`` and ``coalesce`` are accepted
+        for LLMGateway compatibility; answers are deterministic per request anyway."""
+        started = time.monotonic()
+        with self._lock:
+            self.stats["calls"] += 1
+        # n > 1: one request per choice, each with its own seed; they land in the same batch.
+        n = max(1, int(extra.pop("n", 1) or 1))
+        futures = [self.submit(messages, max_tokens, temperature, **(dict(extra, choice=i) if i else extra))
+                   for i in range(n)]
+        try:
+            results = [fut.result(timeout=max(0.0, started + (deadline or self.timeout) - time.monotonic()))
+                       for fut in futures]
+        except BaseException as e:
+            for fut in futures:
+                fut.cancel()
+            with self._lock:
+                self.stats["errors"] += 1
+            self._record(tags, model, started, False)
+            if isinstance(e, FutureTimeout):
+                raise DeadlineExceeded("local AI request deadline exceeded") from None
+            raise
+        texts = tuple(text for text, _ in results)
+        prompt_tokens = estimate_tokens(messages, 0)
+        completion_tokens = sum(math.ceil(len(t) / 4) for t in texts)
+        self._record(tags, model, started, True, queue_s=results[0][1] - started,
+                     prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        return Completion(texts[0], prompt_tokens, completion_tokens, choices=texts if n > 1 else ())
+
+    def stream(self, messages, max_tokens: int, temperature: float, model: Optional[str] = None,
+               deadline: Optional[float] = None, tags: Optional[dict] = None, **extra) -> Iterator[str]:
+        # Generation is fast enough that the whole answer is ready at once; yield it word by word.
+        text = self.complete(messages, max_tokens, temperature, model=model, deadline=deadline,
+                             tags=tags, **extra).text
+        for piece in _PIECES.findall(text):
+            yield piece
@@ -0,0 +1,142 @@
+"""Latency and token metrics for AI calls.
+
+Every completion (game modes and AI Judge) is recorded with its queue time,
+time-to-first-token, total latency, token usage, mode, difficulty and pack.
+Records live in an in-memory ring buffer and can optionally be appended to a
+SQLite file for later analysis.
+
+    python metrics.py metrics.sqlite3     # Prometheus text for a saved DB
+"""
+import sys
+import time
+import sqlite3
+import threading
+from collections import deque
+from typing import Dict, Iterable, List, Optional
+
+FIELDS = ("ts", "source", "mode", "difficulty", "pack", "model", "ok",
+          "queue_s", "ttft_s", "total_s", "prompt_tokens", "completion_tokens")
+QUANTILES = (0.5, 0.95, 0.99)
+GENERATED = ("api", "local")   # sources that actually produced an answer (vs. cache, store, coalesced)
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, max(0, int(round(q * len(sorted_values) + 0.5)) - 1))
+    return sorted_values[idx]
+
+
+def summarize(records: Iterable[dict]) -> List[dict]:
+    # Per-mode latency quantiles and token totals.
+    by_mode: Dict[str, List[dict]] = {}
+    for r in records:
+        by_mode.setdefault(r.get("mode") or "-", []).append(r)
+    rows = []
+    for mode, recs in sorted(by_mode.items()):
+        api = [r for r in recs if r.get("source") in GENERATED]
+        total = sorted(r["total_s"] for r in api if r.get("ok"))
+        ttft = sorted(r["ttft_s"] for r in api if r.get("ok") and r.get("ttft_s") is not None)
+        row = {"mode": mode, "requests": len(recs), "api_calls": len(api),
+               "errors": sum(1 for r in api if not r.get("ok")),
+               "served_without_api": len(recs) - len(api)}
+        for q in QUANTILES:
+            row[f"p{int(q * 100)}_s"] = round(percentile(total, q), 3)
+        for q in QUANTILES:
+            row[f"ttft_p{int(q * 100)}_s"] = round(percentile(ttft, q), 3)
+        row["prompt_tokens"] = sum(r.get("prompt_tokens") or 0 for r in api)
+        row["completion_tokens"] = sum(r.get("completion_tokens") or 0 for r in api)
+        rows.append(row)
+    return rows
+
+
+def prometheus_text(records: Iterable[dict]) -> str:
+    records = list(records)
+    lines = [
+        "# HELP ai_requests_total AI requests by mode and source (api, local, cache, store, coalesced, batched).",
+        "# TYPE ai_requests_total counter",
+    ]
+    counts: Dict[tuple, int] = {}
+    for r in records:
+        k = (r.get("mode") or "-", r.get("source") or "api", "true" if r.get("ok") else "false")
+        counts[k] = counts.get(k, 0) + 1
+    for (mode, source, ok), n in sorted(counts.items()):
+        lines.append(f'ai_requests_total{{mode="{mode}",source="{source}",ok="{ok}"}} {n}')
+    rows = summarize(records)
+    for metric, prefix, help_text in (("ai_request_latency_seconds", "p", "Total AI request latency."),
+                                      ("ai_time_to_first_token_seconds", "ttft_p", "Time to first token.")):
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} summary"]
+        for row in rows:
+            for q in QUANTILES:
+                lines.append(f'{metric}{{mode="{row["mode"]}",quantile="{q}"}} {row[f"{prefix}{int(q * 100)}_s"]}')
+    lines += ["# HELP ai_tokens_total Tokens reported by the API.", "# TYPE ai_tokens_total counter"]
+    for row in rows:
+        lines.append(f'ai_tokens_total{{mode="{row["mode"]}",kind="prompt"}} {row["prompt_tokens"]}')
+        lines.append(f'ai_tokens_total{{mode="{row["mode"]}",kind="completion"}} {row["completion_tokens"]}')
+    return "\n".join(lines) + "\n"
+
+
+class MetricsRecorder:
+    def __init__(self, capacity: int = 10000, db_path: Optional[str] = None, flush_every: int = 20):
+        self._lock = threading.Lock()
+        self._ring = deque(maxlen=capacity)
+        self._pending: List[tuple] = []
+        self.flush_every = flush_every
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS ai_calls (ts REAL, source TEXT, mode TEXT, difficulty TEXT,"
+                " pack TEXT, model TEXT, ok INTEGER, queue_s REAL, ttft_s REAL, total_s REAL,"
+                " prompt_tokens INTEGER, completion_tokens INTEGER)"
+            )
+            self._conn.commit()
+
+    def record(self, **fields):
+        rec = {k: fields.get(k) for k in FIELDS}
+        rec["ts"] = rec["ts"] or time.time()
+        rec["source"] = rec["source"] or "api"
+        rec["ok"] = bool(fields.get("ok", True))
+        with self._lock:
+            self._ring.append(rec)
+            if self._conn is not None:
+                self._pending.append(tuple(rec[k] for k in FIELDS))
+                if len(self._pending) >= self.flush_every:
+                    self._flush_locked()
+
+    def _flush_locked(self):
+        if self._conn is None or not self._pending:
+            return
+        self._conn.executemany(f"INSERT INTO ai_calls VALUES ({','.join('?' * len(FIELDS))})", self._pending)
+        self._conn.commit()
+        self._pending = []
+
+    def flush(self):
+        with self._lock:
+            self._flush_locked()
+
+    def records(self) -> List[dict]:
+        with self._lock:
+            return list(self._ring)
+
+    def summary(self) -> List[dict]:
+        return summarize(self.records())
+
+    def prometheus(self) -> str:
+        return prometheus_text(self.records())
+
+
+def load_records(db_path: str) -> List[dict]:
+    conn = sqlite3.connect(db_path)
+    try:
+        return [dict(zip(FIELDS, row)) for row in conn.execute(f"SELECT {', '.join(FIELDS)} FROM ai_calls")]
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print("usage: python metrics.py <metrics.sqlite3>", file=sys.stderr)
+        sys.exit(2)
+    sys.stdout.write(prometheus_text(load_records(sys.argv[1])))
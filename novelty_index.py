@@ -0,0 +1,224 @@
+"""Local originality scores and near-duplicate flags, without model calls.
+
+Every stored answer becomes a hashed TF-IDF vector (signed feature hashing of
+words and word pairs into ``dims`` buckets). Vectors are kept per prompt in a
+growable NumPy matrix, so scoring a round is one batched matrix product of the
+round's answers against the earlier answers to the same prompt:
+
+- originality = 1 - cosine similarity to the closest earlier answer, shown as
+  0-100 (None for the first answer to a prompt)
+- near-duplicate = similarity >= ``dup_threshold`` to an earlier answer, or
+  the same normalized text stored under any prompt (copy-paste). Only texts
+  added with ``copy_source=True`` (players' answers) count as copy sources,
+  and ``score(..., flag=...)`` chooses which texts can be flagged, so the AI
+  repeating its own cached idea is not reported
+
+IDF weights come from document frequencies over the whole index and are
+applied at query time, so adding an answer is O(dims). Rows are float16; each
+prompt keeps its newest ``max_per_prompt`` answers and the least recently used
+prompts are dropped past ``max_rows``. Fingerprints are kept per row and leave
+with it, which bounds memory at about ``max_rows * (dims * 2 + 8)`` bytes plus
+a dict entry per distinct fingerprinted answer. NumPy is imported on first use.
+"""
+import re
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+_np = None
+
+def _numpy():
+    global _np
+    if _np is None:
+        import numpy
+        _np = numpy
+    return _np
+
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)?")
+STOPWORDS = frozenset(
+    "a an the and or but of to in on at for with by from as is are was were be been it its this that "
+    "these those i you he she we they me my your our their his her them us so if then than too very".split())
+
+
+class Score(NamedTuple):
+    originality: Optional[int]   # 0-100; None when nothing earlier was answered to this prompt
+    similarity: float            # to the closest earlier answer
+    compared: int                # earlier answers to the same prompt
+    duplicate: bool              # near-duplicate here, or a copy of a stored answer elsewhere
+
+
+def fingerprint(text: str) -> int:
+    # Normalized text (case, punctuation and spacing ignored) -> 32-bit key for copy-paste detection.
+    return zlib.crc32(" ".join(_WORD.findall(text.lower())).encode("utf-8"))
+
+
+def features(text: str) -> List[str]:
+    words = [w for w in _WORD.findall(text.lower()) if w not in STOPWORDS]
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+
+def hashed_tf(texts: Sequence[str], dims: int, featurize: Callable[[str], List[str]] = features):
+    """Signed hashed term counts, sublinear (1 + log tf), one float32 row per text."""
+    np = _numpy()
+    out = np.zeros((len(texts), dims), dtype=np.float32)
+    for i, text in enumerate(texts):
+        hashes = np.fromiter((zlib.crc32(f.encode("utf-8")) for f in featurize(text or "")), dtype=np.uint32)
+        if not hashes.size:
+            continue
+        signs = np.where(hashes & 0x80000000, -1.0, 1.0).astype(np.float32)
+        counts = np.bincount(hashes % dims, weights=signs, minlength=dims)
+        out[i] = np.sign(counts) * np.log1p(np.abs(counts))
+    return out
+
+
+def normalize(m):
+    # Unit rows (all-zero rows stay zero), so a matrix product gives cosine similarities.
+    np = _numpy()
+    return m / np.maximum(np.linalg.norm(m, axis=1, keepdims=True), 1e-9)
+
+
+class _Block:
+    """Answers to one prompt: a float16 matrix grown by doubling, used as a ring once full."""
+    __slots__ = ("rows", "prints", "n", "next")
+
+    def __init__(self, dims: int, capacity: int = 8):
+        self.rows = _numpy().zeros((capacity, dims), dtype=_numpy().float16)
+        self.prints = _numpy().full(capacity, -1, dtype=_numpy().int64)   # fingerprint per row, -1 for none
+        self.n = 0      # filled rows
+        self.next = 0   # oldest row, overwritten next once the block is full
+
+
+class NoveltyIndex:
+    def __init__(self, dims: int = 256, max_per_prompt: int = 5000, max_rows: int = 1_000_000,
+                 dup_threshold: float = 0.9):
+        self.dims = dims
+        self.max_per_prompt = max_per_prompt
+        self.max_rows = max_rows
+        self.dup_threshold = dup_threshold
+        self._blocks: "OrderedDict[int, _Block]" = OrderedDict()   # prompt key -> answers, LRU first
+        self._df = None          # document frequency per bucket
+        self._docs = 0
+        self._rows = 0
+        self._fingerprints: Dict[int, int] = {}   # fingerprint -> rows holding it
+        self._lock = threading.Lock()
+        self.stats = {"added": 0, "queries": 0, "duplicates": 0, "evicted_prompts": 0}
+
+    # --------------------------
+    # Vectors
+    # --------------------------
+    def _tf(self, texts: Sequence[str]):
+        return hashed_tf(texts, self.dims)
+
+    def _idf(self):
+        np = _numpy()
+        return np.log((1.0 + self._docs) / (1.0 + self._df)).astype(np.float32) + 1.0
+
+    @staticmethod
+    def _key(prompt: str) -> int:
+        return fingerprint(prompt or "")
+
+    # --------------------------
+    # Updates
+    # --------------------------
+    def add(self, prompt: str, texts: Iterable[str], copy_source: bool = True):
+        self.add_many([(prompt, t) for t in texts], copy_source)
+
+    def add_many(self, items: Sequence[Tuple[str, str]], copy_source: bool = True):
+        """Index (prompt, answer) pairs; empty answers are skipped.
+
+        With ``copy_source=False`` the answers count for originality but are
+        not copy-paste sources (the AI's answers, which caches repeat).
+        """
+        items = [(p, t) for p, t in items if t and t.strip()]
+        if not items:
+            return
+        np = _numpy()
+        tf = self._tf([t for _, t in items])
+        with self._lock:
+            if self._df is None:
+                self._df = np.zeros(self.dims, dtype=np.float32)
+            self._df += (tf != 0).sum(axis=0)
+            self._docs += len(items)
+            for (prompt, text), row in zip(items, tf):
+                self._append(self._key(prompt), row, fingerprint(text) if copy_source else -1)
+            self.stats["added"] += len(items)
+            while self._rows > self.max_rows and len(self._blocks) > 1:
+                _, block = self._blocks.popitem(last=False)
+                for fp in block.prints[:block.n]:
+                    self._forget(int(fp))
+                self._rows -= block.n
+                self.stats["evicted_prompts"] += 1
+
+    def _forget(self, fp: int):
+        # Caller holds self._lock
+        if fp >= 0:
+            left = self._fingerprints.pop(fp, 1) - 1
+            if left:
+                self._fingerprints[fp] = left
+
+    def _append(self, key: int, row, fp: int):
+        # Caller holds self._lock
+        np = _numpy()
+        block = self._blocks.get(key)
+        if block is None:
+            block = self._blocks[key] = _Block(self.dims, min(8, self.max_per_prompt))
+        self._blocks.move_to_end(key)
+        if block.n == len(block.rows) and len(block.rows) < self.max_per_prompt:
+            capacity = min(2 * len(block.rows), self.max_per_prompt)
+            grown = np.zeros((capacity, self.dims), dtype=np.float16)
+            grown[:block.n] = block.rows
+            prints = np.full(capacity, -1, dtype=np.int64)
+            prints[:block.n] = block.prints
+            block.rows, block.prints = grown, prints
+        if block.n < len(block.rows):
+            slot = block.n
+            block.n += 1
+            self._rows += 1
+        else:  # full: overwrite the oldest answer
+            slot = block.next
+            block.next = (block.next + 1) % len(block.rows)
+            self._forget(int(block.prints[slot]))
+        block.rows[slot] = row
+        block.prints[slot] = fp
+        if fp >= 0:
+            self._fingerprints[fp] = self._fingerprints.get(fp, 0) + 1
+
+    # --------------------------
+    # Queries
+    # --------------------------
+    def score(self, prompt: str, texts: Sequence[str], flag: Optional[Sequence[bool]] = None) -> List[Score]:
+        """Originality of each text against earlier answers to the same prompt (one batched product).
+
+        ``flag`` says which texts may be reported as duplicates (default: all).
+        """
+        np = _numpy()
+        tf = self._tf(texts)
+        with self._lock:
+            self.stats["queries"] += 1
+            block = self._blocks.get(self._key(prompt))
+            stored = block.rows[:block.n].astype(np.float32) if block is not None else None
+            idf = self._idf() if self._df is not None else np.ones(self.dims, dtype=np.float32)
+            copies = [bool(t and t.strip()) and fingerprint(t) in self._fingerprints for t in texts]
+        out = []
+        if stored is None or not len(stored):
+            sims = np.zeros(len(texts), dtype=np.float32)
+        else:
+            sims = (normalize(tf * idf) @ normalize(stored * idf).T).max(axis=1)
+        for text, sim, copy, may_flag in zip(texts, sims, copies, flag or [True] * len(texts)):
+            if not (text or "").strip():
+                out.append(Score(None, 0.0, 0, False))
+                continue
+            compared = 0 if stored is None else len(stored)
+            duplicate = may_flag and (copy or bool(compared and sim >= self.dup_threshold))
+            originality = round(100 * (1.0 - max(0.0, float(sim)))) if compared else None
+            out.append(Score(originality, round(float(sim), 3), compared, duplicate))
+        if any(s.duplicate for s in out):
+            with self._lock:
+                self.stats["duplicates"] += sum(s.duplicate for s in out)
+        return out
+
+    def size(self) -> dict:
+        with self._lock:
+            return {"prompts": len(self._blocks), "answers": self._rows, "fingerprints": len(self._fingerprints),
+                    "matrix_bytes": sum(b.rows.nbytes + b.prints.nbytes for b in self._blocks.values())}
@@ -0,0 +1,122 @@
+"""Compact binary theme packs, memory-mapped and read by index.
+
+A ``.pack`` file holds, for each of prompts / concepts / constraints, a table
+of little-endian uint64 offsets followed by one UTF-8 string blob:
+
+    magic (8 bytes)  then per section: count (u64), table position (u64)
+    table: count + 1 offsets into the section's blob, blob right after it
+
+The registry maps the file once per process and every session shares it;
+``pack["concepts"][i]`` decodes just that string, so sampling never builds the
+full list. Items are de-duplicated when a pack is converted, near-duplicates
+included (see pack_dedupe.py), so the registry never has to scan a table.
+
+    python pack_binary.py packs/My_Pack.json           # -> packs/My_Pack.pack
+    python pack_binary.py packs/*.json
+    python pack_binary.py --keep-duplicates packs/My_Pack.json   # exact duplicates only
+"""
+import os
+import sys
+import json
+import mmap
+import struct
+import argparse
+from typing import Dict, Iterable, List, Optional, Sequence
+
+PACK_KEYS = ("prompts", "concepts", "constraints")
+MAGIC = b"IGPACK\x00\x01"
+_HEADER = struct.Struct("<8s" + "QQ" * len(PACK_KEYS))
+_SPAN = struct.Struct("<2Q")
+
+
+class StringTable(Sequence):
+    """Read-only sequence of strings backed by a memory map."""
+    unique = True  # the converter drops duplicates
+
+    def __init__(self, buf, count: int, table_pos: int):
+        self._buf = buf
+        self._count = count
+        self._table = table_pos
+        self._blob = table_pos + 8 * (count + 1)
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(self._count))]
+        if i < 0:
+            i += self._count
+        if not 0 <= i < self._count:
+            raise IndexError("pack index out of range")
+        start, end = _SPAN.unpack_from(self._buf, self._table + 8 * i)
+        return self._buf[self._blob + start:self._blob + end].decode("utf-8")
+
+
+def read_pack(path: str) -> Dict[str, StringTable]:
+    with open(path, "rb") as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    header = _HEADER.unpack_from(buf, 0)
+    if header[0] != MAGIC:
+        buf.close()
+        raise ValueError(f"{path} is not a binary pack")
+    return {k: StringTable(buf, header[1 + 2 * n], header[2 + 2 * n]) for n, k in enumerate(PACK_KEYS)}
+
+
+def _unique(items: Iterable[str]) -> List[str]:
+    return list(dict.fromkeys(str(i) for i in items if i and str(i).strip()))
+
+
+def write_pack(pack: Dict[str, Sequence[str]], path: str):
+    sections = []
+    pos = _HEADER.size
+    for k in PACK_KEYS:
+        encoded = [s.encode("utf-8") for s in _unique(pack.get(k) or [])]
+        offsets, total = [0], 0
+        for b in encoded:
+            total += len(b)
+            offsets.append(total)
+        sections.append((len(encoded), pos, struct.pack(f"<{len(offsets)}Q", *offsets), b"".join(encoded)))
+        pos += 8 * len(offsets) + total
+    header = [MAGIC]
+    for count, table_pos, _, _ in sections:
+        header += [count, table_pos]
+    tmp = f"{path}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(*header))
+        for _, _, table, blob in sections:
+            f.write(table)
+            f.write(blob)
+    os.replace(tmp, path)  # readers never see a half-written pack
+
+
+def convert(json_path: str, out_path: Optional[str] = None, dedupe: bool = True) -> str:
+    """Convert a packs/<name>.json file (as written by the Pack Creator) to <name>.pack."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if dedupe:
+        from pack_dedupe import canonical_items
+        data = {k: canonical_items(k, _unique(data.get(k) or [])) for k in PACK_KEYS}
+    out_path = out_path or os.path.splitext(json_path)[0] + ".pack"
+    write_pack(data, out_path)
+    return out_path
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Convert JSON theme packs to the binary .pack format.")
+    ap.add_argument("packs", nargs="+", help="packs/<name>.json files")
+    ap.add_argument("--out", default=None, help="output path (only with a single input)")
+    ap.add_argument("--keep-duplicates", action="store_true",
+                    help="only drop exact duplicates, keep near-duplicate items")
+    args = ap.parse_args(argv)
+    if args.out and len(args.packs) > 1:
+        ap.error("--out needs exactly one input pack")
+    for path in args.packs:
+        out = convert(path, args.out, dedupe=not args.keep_duplicates)
+        counts = {k: len(v) for k, v in read_pack(out).items()}
+        print(f"{path} -> {out} {counts} ({os.path.getsize(out)} bytes)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
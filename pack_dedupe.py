@@ -0,0 +1,260 @@
+"""Near-duplicate clustering for theme packs, run once per pack version.
+
+Packs saved by the Pack Creator or dropped into packs/ often repeat themselves
+("robots", "a robot", "Robots!"; two templates a word apart). Each section is
+reduced to its canonical items in two passes:
+
+- exact: items with the same canonical key (lowercase, singular, stopwords and
+  punctuation dropped, {A}/{B} kept apart) collapse to their first occurrence.
+  Constraints keep their stopwords, since "the letter a" and "the letter i"
+  are different rules. O(n), so it runs on any pack size
+- near: leader clustering of the remaining items (up to ``max_items`` per
+  section); an item within ``dup_threshold`` cosine of an earlier kept item,
+  by word set, is dropped, unless their letters and numbers differ ("exactly
+  3 sentences", "exactly 4 sentences"). Sections over ``small`` items are filtered first
+  with hashed TF-IDF vectors, one batched matrix product per chunk (matches
+  are confirmed on the word sets, since hashed buckets collide); smaller ones
+  are compared pairwise, so typical packs never load NumPy
+
+Kept items are also grouped at the looser ``group_threshold`` ("dragons" and
+"a dragon's hoard"); PromptDeck uses the groups to keep consecutive rounds
+apart. Prompts are only built from kept items, so trivially different prompts
+become the same request and share cached and pre-generated answers.
+
+PackRegistry stores the result next to the pack file as ``<name>.dedupe``
+(JSON, keyed by the pack file's mtime/size and these settings), so a pack is
+clustered again only when it changes. Binary packs are de-duplicated when they
+are converted (pack_binary.py), so loading one never reads its strings. A
+section that would drop below ``MIN_ITEMS`` is served as written.
+"""
+import os
+import re
+import json
+from array import array
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from novelty_index import STOPWORDS, hashed_tf, normalize
+
+FORMAT = 2
+DEDUPE_EXT = ".dedupe"
+_SLOT = re.compile(r"\{([AB])\}")
+_WORD = re.compile(r"[^\W_]+(?:['’][^\W_]+)?")
+# Fewest items each section needs for every mode (two concepts make a pair, two
+# constraints a double). Dedupe never takes a section below this.
+MIN_ITEMS = {"prompts": 1, "concepts": 2, "constraints": 2}
+
+
+class Settings(NamedTuple):
+    dup_threshold: float = 0.8     # cosine at which two items are the same item
+    group_threshold: float = 0.4   # cosine at which two kept items share a theme
+    max_items: int = 20000         # larger sections get the exact pass only
+    small: int = 300               # up to this many, items are compared pairwise without NumPy
+    dims: int = 256
+
+
+class SectionDedupe(NamedTuple):
+    drop: List[int]                # indexes removed from the section (usually few, so this is what's stored)
+    groups: Optional[List[int]]    # theme group per kept item; None when the section was too large
+
+
+class Section(Sequence):
+    """The kept items of a pack section, in order, indexed in place."""
+    unique = True  # prompt_engine uses it as-is
+
+    def __init__(self, base: Sequence[str], keep: Optional[array] = None, groups: Optional[array] = None):
+        self.base = base
+        self.keep = keep       # base index per kept item; None keeps every item
+        self.groups = groups   # theme group per kept item; None puts every item in its own group
+
+    def __len__(self) -> int:
+        return len(self.base) if self.keep is None else len(self.keep)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        return self.base[i] if self.keep is None else self.base[self.keep[i]]
+
+
+def singular(word: str) -> str:
+    # dragon's -> dragon, machines -> machine, boxes -> box, stories -> story
+    w = re.sub(r"['’]s?$", "", word)
+    if len(w) > 4 and w.endswith("ies"):
+        return w[:-3] + "y"
+    if len(w) > 3 and w.endswith(("ses", "xes", "zes", "ches", "shes")):
+        return w[:-2]
+    if len(w) > 3 and w.endswith("s") and not w.endswith(("ss", "us", "is")):
+        return w[:-1]
+    return w
+
+def canonical(text: str, keep_stopwords: bool = False) -> str:
+    # "Robots!", "a robot" and "ROBOTS" -> "robot"; {A} and {B} stay distinct words.
+    text = _SLOT.sub(lambda m: f" slot{m.group(1).lower()} ", text.lower())
+    return " ".join(singular(w) for w in _WORD.findall(text) if keep_stopwords or w not in STOPWORDS)
+
+def _features(text: str, keep_stopwords: bool = False) -> List[str]:
+    words = canonical(text, keep_stopwords).split()
+    return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+def _pins(features: frozenset) -> frozenset:
+    # Letters and numbers a rule hinges on; items that differ in these are never the same item.
+    return frozenset(f for f in features if len(f) == 1 or f.isdigit())
+
+
+def leaders(vectors, threshold: float, confirm: Callable[[int, int], bool] = lambda i, j: True,
+            chunk: int = 256):
+    """Leader clustering of unit rows: each row joins the first earlier leader within ``threshold``, or leads.
+
+    Hashed vectors can collide, so every match found by the matrix product is
+    passed to ``confirm(row, leader)`` before it counts.
+    """
+    import numpy as np
+    n = len(vectors)
+    out = np.empty(n, dtype=np.int64)
+    lead_rows = np.empty_like(vectors)
+    lead_ids = np.empty(n, dtype=np.int64)
+    count = 0
+    for start in range(0, n, chunk):
+        block = vectors[start:start + chunk]
+        hits = (block @ lead_rows[:count].T) >= threshold if count else None
+        intra, new = None, []   # leaders started inside this block
+        for i in range(len(block)):
+            row = start + i
+            leader = None
+            if hits is not None:
+                leader = next((lead_ids[j] for j in np.flatnonzero(hits[i]) if confirm(row, lead_ids[j])), None)
+            if leader is None and new:
+                if intra is None:
+                    intra = block @ block.T
+                close = np.flatnonzero(intra[i, new] >= threshold)
+                leader = next((start + new[j] for j in close if confirm(row, start + new[j])), None)
+            if leader is None:
+                new.append(i)
+                leader = row
+            out[row] = leader
+        for i in new:
+            lead_rows[count], lead_ids[count] = block[i], start + i
+            count += 1
+    return out
+
+
+def _cosine(a: frozenset, b: frozenset) -> float:
+    return len(a & b) / ((len(a) * len(b)) ** 0.5) if a and b else 0.0
+
+def _leaders_small(sets: Sequence[frozenset], threshold: float,
+                   confirm: Callable[[int, int], bool] = lambda i, j: True) -> List[int]:
+    # Same clustering on the exact word sets; fast enough for typical packs and keeps NumPy unloaded.
+    out, lead = [], []
+    for i, s in enumerate(sets):
+        leader = next((j for j in lead if _cosine(s, sets[j]) >= threshold and confirm(i, j)), None)
+        if leader is None:
+            lead.append(i)
+            leader = i
+        out.append(leader)
+    return out
+
+
+def _vectors(texts: Sequence[str], dims: int, keep_stopwords: bool = False):
+    import numpy as np
+    tf = hashed_tf(texts, dims, lambda t: _features(t, keep_stopwords))
+    idf = np.log((1.0 + len(texts)) / (1.0 + (tf != 0).sum(axis=0))).astype(np.float32) + 1.0
+    return normalize(tf * idf)
+
+
+def dedupe_section(items: Sequence[str], settings: Settings = Settings(),
+                   keep_stopwords: bool = False) -> SectionDedupe:
+    # Exact pass over everything; keys are hashed so huge sections don't hold every key string.
+    seen, kept, drop = set(), [], []
+    for i in range(len(items)):
+        text = items[i]
+        key = hash(canonical(text, keep_stopwords) or text.strip()) if text else None
+        if key is None or not text.strip() or key in seen:
+            drop.append(i)
+        else:
+            seen.add(key)
+            kept.append(i)
+    del seen
+    if not kept or len(kept) > settings.max_items:
+        return SectionDedupe(drop, None)
+    texts = [items[i] for i in kept]
+    sets = [frozenset(_features(t, keep_stopwords)) for t in texts]
+    pins = [_pins(s) for s in sets]
+    if len(kept) <= settings.small:
+        same = _leaders_small(sets, settings.dup_threshold, lambda i, j: pins[i] == pins[j])
+        survivors = [j for j in range(len(kept)) if same[j] == j]
+        themes = _leaders_small([sets[j] for j in survivors], settings.group_threshold)
+    else:
+        vectors = _vectors(texts, settings.dims, keep_stopwords)
+        same = leaders(vectors, settings.dup_threshold,
+                       lambda i, j: pins[i] == pins[j] and _cosine(sets[i], sets[j]) >= settings.dup_threshold)
+        survivors = [j for j in range(len(kept)) if same[j] == j]
+        themes = leaders(vectors[survivors], settings.group_threshold,
+                         lambda i, j: _cosine(sets[survivors[i]], sets[survivors[j]]) >= settings.group_threshold)
+    near = {kept[j] for j in range(len(kept)) if same[j] != j}
+    return SectionDedupe(sorted(drop + list(near)), [int(g) for g in themes])
+
+
+def dedupe_pack(pack: Dict[str, Sequence[str]], settings: Settings = Settings()) -> Dict[str, SectionDedupe]:
+    # Binary pack tables were de-duplicated by the converter and stay indexed in place.
+    return {k: dedupe_section(items, settings, k == "constraints")
+            for k, items in pack.items() if not getattr(items, "unique", False)}
+
+
+def _distinct(items: Sequence[str]) -> array:
+    # First occurrence of each non-blank item: the section exactly as written.
+    seen, keep = set(), array("I")
+    for i in range(len(items)):
+        if items[i] and items[i].strip() and items[i] not in seen:
+            seen.add(items[i])
+            keep.append(i)
+    return keep
+
+
+def apply(pack: Dict[str, Sequence[str]], result: Dict[str, SectionDedupe]) -> Dict[str, Sequence[str]]:
+    out = {}
+    for k, items in pack.items():
+        r = result.get(k)
+        if r is None:
+            out[k] = items
+            continue
+        drop = set(r.drop)
+        keep = array("I", (i for i in range(len(items)) if i not in drop)) if drop else None
+        if len(items) - len(drop) < MIN_ITEMS.get(k, 1):
+            # e.g. "robot", "robots", "a robot": one concept can't make a pair, so play them as written
+            distinct = _distinct(items)
+            if len(distinct) > len(items) - len(drop):
+                out[k] = Section(items, distinct)
+                continue
+        groups = array("I", r.groups) if r.groups is not None else None
+        out[k] = Section(items, keep, groups)
+    return out
+
+
+def canonical_items(kind: str, items: Sequence[str], settings: Settings = Settings()) -> List[str]:
+    """A section's kept items as a list, for writers such as the binary pack converter."""
+    return list(apply({kind: items}, {kind: dedupe_section(items, settings, kind == "constraints")})[kind])
+
+
+# --------------------------
+# Stored results
+# --------------------------
+def _stamp(source: Tuple, settings: Settings) -> dict:
+    return {"format": FORMAT, "source": list(source), "settings": list(settings)}
+
+def load_result(path: str, source: Tuple, settings: Settings) -> Optional[Dict[str, SectionDedupe]]:
+    """The stored result for this version of the pack, or None if missing or stale."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if data.get("stamp") != _stamp(source, settings):
+        return None
+    return {k: SectionDedupe(v["drop"], v["groups"]) for k, v in data["sections"].items()}
+
+def save_result(path: str, source: Tuple, settings: Settings, result: Dict[str, SectionDedupe]):
+    data = {"stamp": _stamp(source, settings),
+            "sections": {k: {"drop": r.drop, "groups": r.groups} for k, r in result.items()}}
+    tmp = f"{path}.{os.getpid()}.tmp"   # concurrent loaders each write whole files; the last rename wins
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, separators=(",", ":"))
+    os.replace(tmp, path)
@@ -0,0 +1,154 @@
+"""Pack Creator helpers: memoized validation, truncated previews, atomic saves.
+
+Every keystroke in the Pack Creator reruns the page, so each section (prompts,
+concepts, constraints, plus any imported files) is parsed and checked once per
+distinct text, keyed by its hash; unchanged sections are served from the memo.
+The preview shows a bounded slice of the pack, and the full JSON is only built
+once per distinct pack.
+"""
+import io
+import os
+import re
+import csv
+import json
+import hashlib
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from game_content import TEMPLATE_TOKEN
+from pack_binary import PACK_KEYS
+
+MAX_LINE = 300
+_BRACES = re.compile(r"[{}]")
+_memo: "OrderedDict[tuple, object]" = OrderedDict()
+_memo_lock = threading.Lock()
+_MEMO_SIZE = 256
+
+
+class Section(NamedTuple):
+    items: Tuple[str, ...]
+    duplicates: int
+    warnings: Tuple[str, ...]
+    digest: str
+
+
+def _digest(text) -> str:
+    data = text if isinstance(text, bytes) else text.encode("utf-8")
+    return hashlib.sha1(data).hexdigest()
+
+def _memoized(key: tuple, build):
+    with _memo_lock:
+        if key in _memo:
+            _memo.move_to_end(key)
+            return _memo[key]
+    value = build()
+    with _memo_lock:
+        _memo[key] = value
+        while len(_memo) > _MEMO_SIZE:
+            _memo.popitem(last=False)
+    return value
+
+def memo_stats() -> Dict[str, int]:
+    with _memo_lock:
+        return {"entries": len(_memo)}
+
+
+# --------------------------
+# Parsing + validation
+# --------------------------
+def split_lines(text: str) -> List[str]:
+    return [ln.strip() for ln in (text or "").splitlines() if ln.strip()]
+
+def _check(kind: str, lines: Iterable[str], digest: str) -> Section:
+    items, seen, dupes, warnings = [], set(), 0, []
+    for n, line in enumerate(lines, 1):
+        if line in seen:
+            dupes += 1
+            continue
+        seen.add(line)
+        items.append(line)
+        if len(line) > MAX_LINE:
+            warnings.append(f"{kind} line {n} is over {MAX_LINE} characters.")
+        if kind != "concepts":
+            # Braces that are not {A}, {B}, {{ or }} are shown literally in the game.
+            leftover = _BRACES.search(TEMPLATE_TOKEN.sub("", line))
+            if leftover:
+                warnings.append(f"{kind} line {n} has a stray brace; only {{A}} and {{B}} are filled in.")
+    if dupes:
+        warnings.append(f"{dupes} duplicate {kind} will be dropped.")
+    return Section(tuple(items), dupes, tuple(warnings[:20]), digest)
+
+def check_section(kind: str, text: str) -> Section:
+    """Parse and check one section; repeated calls with the same text are free."""
+    digest = _digest(text or "")
+    return _memoized(("section", kind, digest), lambda: _check(kind, split_lines(text), digest))
+
+def merge_sections(kind: str, parts: Sequence[Section]) -> Section:
+    # Typed lines plus imported files, in order, de-duplicated across all of them.
+    if len(parts) == 1:
+        return parts[0]
+    digest = _digest("|".join(p.digest for p in parts))
+    return _memoized(("merged", kind, digest),
+                     lambda: _check(kind, (i for p in parts for i in p.items), digest))
+
+def pack_errors(name: str, sections: Dict[str, Section]) -> List[str]:
+    errors = []
+    if not safe_pack_name(name):
+        errors.append("Please enter a pack name.")
+    if not sections["prompts"].items:
+        errors.append("Add at least one prompt.")
+    if len(sections["concepts"].items) < 2:
+        errors.append("Add at least a few concepts (e.g., 5+).")
+    if not sections["constraints"].items:
+        errors.append("Add at least one constraint.")
+    return errors
+
+
+# --------------------------
+# Import / export
+# --------------------------
+def read_lines_file(data: bytes, filename: str = "") -> str:
+    """Text of an uploaded line-delimited file; for .csv/.tsv only the first column is kept."""
+    text = data.decode("utf-8-sig", errors="replace")
+    ext = os.path.splitext(filename)[1].lower()
+    if ext in (".csv", ".tsv"):
+        rows = csv.reader(io.StringIO(text), delimiter="\t" if ext == ".tsv" else ",")
+        text = "\n".join(row[0] for row in rows if row)
+    return text
+
+def safe_pack_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9 _-]+", "", name or "").strip().replace(" ", "_")
+
+def pack_json(sections: Dict[str, Section]) -> str:
+    key = ("json",) + tuple(sections[k].digest for k in PACK_KEYS)
+    return _memoized(key, lambda: json.dumps({k: list(sections[k].items) for k in PACK_KEYS},
+                                             ensure_ascii=False, indent=2))
+
+def preview(sections: Dict[str, Section], limit: int = 15) -> str:
+    # Bounded preview: the first `limit` items per section and a count of the rest.
+    out = {}
+    for k in PACK_KEYS:
+        items = sections[k].items
+        out[k] = list(items[:limit]) + ([f"… {len(items) - limit} more"] if len(items) > limit else [])
+    return json.dumps(out, ensure_ascii=False, indent=2)
+
+def save_pack(packs_dir: str, name: str, sections: Dict[str, Section]) -> str:
+    """Write packs_dir/<name>.json atomically (temp file in the same directory, then rename)."""
+    os.makedirs(packs_dir, exist_ok=True)
+    path = os.path.join(packs_dir, f"{name}.json")
+    fd, tmp = tempfile.mkstemp(prefix=f".{name}.", suffix=".tmp", dir=packs_dir)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(pack_json(sections))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return path
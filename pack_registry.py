@@ -0,0 +1,178 @@
+"""Process-wide theme pack registry.
+
+Packs are read from disk once and shared by every session. A pack file is only
+re-read when its mtime/size changes or when it is explicitly invalidated (e.g.
+after the Pack Creator saves it).
+
+Packs are either ``<name>.json`` or the binary ``<name>.pack`` (see
+pack_binary.py); when both exist the newer file wins. Binary packs are
+memory-mapped and indexed in place rather than loaded into lists.
+
+Every pack version is reduced to its canonical items once (see pack_dedupe.py):
+near-duplicate templates, concepts and constraints are dropped and the rest
+grouped by theme. The result is stored next to the pack file as
+``<name>.dedupe`` and reused until the pack file changes. Binary packs were
+already reduced by the converter, so their tables are used as they are.
+"""
+import os
+import json
+import time
+import threading
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from pack_binary import PACK_KEYS, read_pack
+from pack_dedupe import DEDUPE_EXT, Settings, apply, dedupe_pack, load_result, save_result
+
+Pack = Dict[str, Sequence[str]]   # tuples for JSON packs, StringTables for binary ones
+PACK_EXTS = (".json", ".pack")
+
+
+def _signature(path: str) -> Optional[Tuple[float, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+class PackRegistry:
+    def __init__(self, packs_dir: str, core_pack: Dict[str, List[str]],
+                 core_name: str = "Core Pack", check_interval: float = 1.0,
+                 dedupe: Optional[Settings] = Settings()):
+        self.packs_dir = packs_dir
+        self.core_name = core_name
+        self.dedupe = dedupe   # None serves packs exactly as written
+        self._core_raw = {k: tuple(core_pack[k]) for k in PACK_KEYS}
+        # Files are stat-ed at most once per interval, so bursts of reruns
+        # across sessions share a single syscall.
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._entries: Dict[str, dict] = {}   # name -> {"sig", "pack", "checked"}
+        self._names: Tuple[str, ...] = (core_name,)
+        self._dir_sig = None
+        self._dir_checked = 0.0
+        self._stats = {"hits": 0, "loads": 0, "reloads": 0, "load_errors": 0,
+                       "stat_checks": 0, "dir_scans": 0, "dedupe_runs": 0, "dedupe_reused": 0,
+                       "duplicates_dropped": 0}
+        self.core = self._canonical(None, None, self._core_raw)
+
+    # --------------------------
+    # Listing
+    # --------------------------
+    def names(self) -> List[str]:
+        now = time.monotonic()
+        with self._lock:
+            if now - self._dir_checked < self.check_interval:
+                return list(self._names)
+            self._dir_checked = now
+            sig = _signature(self.packs_dir)
+            if sig is not None and sig == self._dir_sig:
+                return list(self._names)
+            self._dir_sig = sig
+            self._stats["dir_scans"] += 1
+            names = [self.core_name]
+            if os.path.isdir(self.packs_dir):
+                for f in os.listdir(self.packs_dir):
+                    if f.endswith(PACK_EXTS):
+                        names.append(os.path.splitext(f)[0])
+            self._names = tuple(sorted(set(names)))
+            return list(self._names)
+
+    # --------------------------
+    # Loading
+    # --------------------------
+    def path_for(self, name: str) -> str:
+        return os.path.join(self.packs_dir, f"{name}.json")
+
+    def _source(self, name: str) -> Tuple[str, Optional[Tuple[float, int]]]:
+        # (path, signature) of whichever of <name>.json / <name>.pack is newer
+        candidates = []
+        for ext in PACK_EXTS:
+            path = os.path.join(self.packs_dir, f"{name}{ext}")
+            sig = _signature(path)
+            if sig is not None:
+                candidates.append((sig, path))
+        if not candidates:
+            return self.path_for(name), None
+        sig, path = max(candidates)
+        return path, sig
+
+    def get(self, name: str) -> Pack:
+        if name == self.core_name:
+            with self._lock:
+                self._stats["hits"] += 1
+            return self.core
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(name)
+            if entry is not None and now - entry["checked"] < self.check_interval:
+                self._stats["hits"] += 1
+                return entry["pack"]
+        path, sig = self._source(name)
+        with self._lock:
+            self._stats["stat_checks"] += 1
+            entry = self._entries.get(name)
+            if entry is not None and entry["sig"] == (path, sig):
+                entry["checked"] = now
+                self._stats["hits"] += 1
+                return entry["pack"]
+        pack = self._read(path, sig)
+        with self._lock:
+            self._stats["reloads" if entry is not None else "loads"] += 1
+            self._entries[name] = {"sig": (path, sig), "pack": pack, "checked": now}
+        return pack
+
+    def _read(self, path: str, sig: Optional[Tuple[float, int]] = None) -> Pack:
+        try:
+            if path.endswith(".pack"):
+                tables = read_pack(path)
+                raw = {k: tables[k] if len(tables[k]) else self._core_raw[k] for k in PACK_KEYS}
+            else:
+                with open(path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                raw = {k: tuple(data.get(k, []) or self._core_raw[k]) for k in PACK_KEYS}
+        except Exception:
+            with self._lock:
+                self._stats["load_errors"] += 1
+            return self.core
+        return self._canonical(path, sig, raw)
+
+    def _canonical(self, path: Optional[str], sig: Optional[Tuple[float, int]], raw: Pack) -> Pack:
+        # Once per pack version: reuse <name>.dedupe if it matches the file, else cluster and store it.
+        if self.dedupe is None:
+            return raw
+        sidecar = os.path.splitext(path)[0] + DEDUPE_EXT if path and sig else None
+        source = (os.path.basename(path), *sig) if sidecar else ()
+        result = load_result(sidecar, source, self.dedupe) if sidecar else None
+        reused = result is not None
+        if not reused:
+            result = dedupe_pack(raw, self.dedupe)
+            if sidecar:
+                try:
+                    save_result(sidecar, source, self.dedupe, result)
+                except OSError:
+                    pass  # read-only packs dir: cluster again next process
+        with self._lock:
+            self._stats["dedupe_reused" if reused else "dedupe_runs"] += 1
+            self._stats["duplicates_dropped"] += sum(len(r.drop) for r in result.values())
+        return apply(raw, result)
+
+    def invalidate(self, name: Optional[str] = None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(name, None)
+            self._dir_sig = None
+            self._dir_checked = 0.0
+
+    # --------------------------
+    # Stats
+    # --------------------------
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            s = dict(self._stats)
+            s["cached_packs"] = len(self._entries)
+        lookups = s["hits"] + s["loads"] + s["reloads"]
+        s["hit_rate"] = s["hits"] / lookups if lookups else 0.0
+        return s
@@ -0,0 +1,165 @@
+"""Offline pre-generation of AI answers for event days.
+
+Lists or samples the rounds the game would generate for a pack and fills an
+AnswerStore for each difficulty, so the game can serve answers without calling
+the API. Runs are resumable: the store itself is the checkpoint, and prompts
+that already have enough answers are skipped on the next run. Sampling uses a
+fixed seed (``--seed``, default 0), so a re-run deals the same rounds; pass a
+different seed to add new ones.
+
+    python pregen.py --pack "Core Pack" --sample 200 --store answers.sqlite3
+    python pregen.py --pack Sci_Fi --modes Classic Mash-up --list
+
+Point OPENAI_BASE_URL (or --base-url) at fake_openai.py to try it offline.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Iterator, List, Optional, Tuple
+
+from answer_store import AnswerStore
+from game_content import (
+    AI_MODEL, COMPETITIVE_MODES, CORE_PACK, DIFFICULTIES, ai_request,
+)
+from llm_gateway import LLMGateway
+from pack_registry import Pack, PackRegistry
+from prompt_engine import PromptDeck, compile_pack
+from response_cache import cache_key
+
+Job = Tuple[str, str, str]  # (mode, difficulty, prompt)
+
+
+# --------------------------
+# Round enumeration
+# --------------------------
+def _double(pack: Pack, mode: str, double_constraints: bool) -> bool:
+    return double_constraints and mode == "Constraint" and len(compile_pack(pack).constraints) > 1
+
+def iter_prompts(pack: Pack, mode: str, double_constraints: bool = False) -> Iterator[str]:
+    # Every prompt the game could produce for this mode, in a stable order.
+    compiled, double = compile_pack(pack), _double(pack, mode, double_constraints)
+    for i in range(compiled.size(mode, double)):
+        yield compiled.prompt_at(mode, i, double)
+
+def sample_prompts(pack: Pack, mode: str, n: int, rng: random.Random,
+                   double_constraints: bool = False) -> List[str]:
+    # Deal like the game does (a seeded no-repeat deck).
+    deck = PromptDeck(compile_pack(pack), mode, rng.getrandbits(32), _double(pack, mode, double_constraints))
+    return [deck.draw() for _ in range(min(n, deck.size))]
+
+def build_jobs(pack: Pack, modes: List[str], difficulties: List[str], sample: int,
+               seed: Optional[int], double_constraints: bool) -> List[Job]:
+    rng = random.Random(seed)
+    jobs = []
+    for mode in modes:
+        if sample:
+            prompts = sample_prompts(pack, mode, sample, rng, double_constraints)
+        else:
+            prompts = list(iter_prompts(pack, mode, double_constraints))
+        for prompt in prompts:
+            for difficulty in difficulties:
+                jobs.append((mode, difficulty, prompt))
+    return jobs
+
+
+# --------------------------
+# Generation
+# --------------------------
+def generate_one(gateway: LLMGateway, job: Job, model: str) -> str:
+    mode, difficulty, prompt = job
+    messages, max_tokens, temperature = ai_request(mode, prompt, difficulty)
+    return gateway.complete(messages, max_tokens, temperature, model=model, coalesce=False).text
+
+def run(jobs: List[Job], store: AnswerStore, gateway: LLMGateway, pack_name: str, model: str = AI_MODEL,
+        variants: int = 1, concurrency: int = 8, log=print) -> dict:
+    todo = []
+    for job in jobs:
+        mode, difficulty, prompt = job
+        messages, max_tokens, temperature = ai_request(mode, prompt, difficulty)
+        key = cache_key(messages, max_tokens, model, temperature)
+        missing = variants - store.count(key)
+        todo.extend([(job, key)] * max(0, missing))
+    summary = {"jobs": len(jobs), "requests": len(todo), "done": 0, "failed": 0,
+               "skipped": len(jobs) * variants - len(todo)}
+    log(f"{len(jobs)} rounds × {variants} variant(s): {len(todo)} to generate, {summary['skipped']} already stored")
+    started = time.time()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        futures = {pool.submit(generate_one, gateway, job, model): (job, key)
+                   for job, key in todo}
+        for i, fut in enumerate(as_completed(futures), 1):
+            (mode, difficulty, prompt), key = futures[fut]
+            try:
+                text = fut.result()
+            except Exception as e:
+                summary["failed"] += 1
+                log(f"  failed [{mode}/{difficulty}] {prompt[:60]}: {e}")
+                continue
+            if text:
+                store.add(key, text, pack=pack_name, mode=mode, difficulty=difficulty, prompt=prompt)
+                summary["done"] += 1
+            if i % 50 == 0 or i == len(todo):
+                log(f"  {i}/{len(todo)} ({i / max(1e-9, time.time() - started):.1f} req/s)")
+    summary["seconds"] = round(time.time() - started, 2)
+    return summary
+
+
+# --------------------------
+# CLI
+# --------------------------
+def main(argv: Optional[List[str]] = None) -> int:
+    ap = argparse.ArgumentParser(description="Pre-generate AI answers for a theme pack.")
+    ap.add_argument("--pack", default="Core Pack", help='"Core Pack" or the name of packs/<name>.json (or .pack)')
+    ap.add_argument("--packs-dir", default="packs")
+    ap.add_argument("--modes", nargs="+", default=COMPETITIVE_MODES, choices=COMPETITIVE_MODES)
+    ap.add_argument("--difficulties", nargs="+", default=DIFFICULTIES, choices=DIFFICULTIES)
+    ap.add_argument("--sample", type=int, default=100,
+                    help="rounds to sample per mode (0 = every combination)")
+    ap.add_argument("--double-constraints", action="store_true", help="Constraint rounds use two constraints")
+    ap.add_argument("--seed", type=int, default=0,
+                    help="sampling seed; re-runs with the same seed pick the same rounds, which is what lets an "
+                         "interrupted run resume (stored rounds are skipped)")
+    ap.add_argument("--variants", type=int, default=1, help="answers to store per round")
+    ap.add_argument("--store", default="answers.sqlite3")
+    ap.add_argument("--model", default=AI_MODEL)
+    ap.add_argument("--concurrency", type=int, default=8)
+    ap.add_argument("--retries", type=int, default=3)
+    ap.add_argument("--backoff", type=float, default=1.0, help="base seconds for exponential backoff")
+    ap.add_argument("--rpm", type=float, default=500, help="requests per minute limit")
+    ap.add_argument("--tpm", type=float, default=200000, help="tokens per minute limit")
+    ap.add_argument("--base-url", default=None, help="OpenAI-compatible endpoint (default: OPENAI_BASE_URL)")
+    ap.add_argument("--list", action="store_true", help="only print the rounds that would be generated")
+    args = ap.parse_args(argv)
+
+    registry = PackRegistry(args.packs_dir, CORE_PACK)
+    if args.pack not in registry.names():
+        print(f"Unknown pack: {args.pack}. Available: {', '.join(registry.names())}", file=sys.stderr)
+        return 2
+    pack = registry.get(args.pack)
+    jobs = build_jobs(pack, args.modes, args.difficulties, args.sample, args.seed, args.double_constraints)
+
+    if args.list:
+        for mode, difficulty, prompt in jobs:
+            print(f"{mode}\t{difficulty}\t{prompt}")
+        return 0
+
+    gateway = LLMGateway(
+        api_key=os.environ.get("OPENAI_API_KEY", "sk-local"),
+        base_url=args.base_url or os.environ.get("OPENAI_BASE_URL") or None,
+        model=args.model, rpm=args.rpm, tpm=args.tpm,
+        max_retries=args.retries, backoff=args.backoff, max_connections=args.concurrency,
+    )
+    store = AnswerStore(args.store)
+    try:
+        summary = run(jobs, store, gateway, args.pack, model=args.model, variants=args.variants,
+                      concurrency=args.concurrency)
+    finally:
+        store.close()
+    print(summary)
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+"""Compiled prompt generation with no-repeat, reproducible sampling.
+
+Each pack is compiled once: templates are parsed into literal text and {A}/{B}
+slots (stray braces in user packs stay literal instead of breaking
+``str.format``), duplicate items are dropped, and every mode's prompt space is
+numbered 0..size-1. A PromptDeck walks that space in a keyed pseudo-random
+order (a Feistel permutation with cycle walking): each draw is O(1), nothing
+repeats until the whole space has been dealt, and the same seed replays the
+same rounds.
+
+Draws are also spread out: the deck holds the next ``lookahead`` prompts of
+its order and deals the one sharing the fewest concepts, templates and
+constraints (by theme group, see pack_dedupe.py) with the last few rounds.
+"""
+import bisect
+import threading
+from array import array
+from collections import OrderedDict, deque
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple, Union
+
+from game_content import TEMPLATE_TOKEN, constraint_prompt, mashup_prompt, story_spark
+
+SLOTS = ("A", "B")
+_MASK64 = (1 << 64) - 1
+
+
+class Template:
+    """A template parsed once into literal strings and slot indexes (0 = A, 1 = B)."""
+    __slots__ = ("source", "parts", "slots")
+
+    def __init__(self, source: str, escapes: bool = True):
+        # escapes=True matches str.format's "{{" / "}}"; any other brace is literal text.
+        parts: List[Union[str, int]] = []
+        pos = 0
+        for m in TEMPLATE_TOKEN.finditer(source):
+            if m.group(1) is None and not escapes:
+                continue
+            parts.append(source[pos:m.start()])
+            parts.append(SLOTS.index(m.group(1)) if m.group(1) else m.group(0)[0])
+            pos = m.end()
+        parts.append(source[pos:])
+        self.source = source
+        self.parts = tuple(p for p in parts if p != "")
+        self.slots = tuple(sorted({p for p in self.parts if isinstance(p, int)}))
+
+    def render(self, values: Sequence[str]) -> str:
+        return "".join(p if isinstance(p, str) else values[p] for p in self.parts)
+
+
+def _unique(items: Sequence[str]) -> Sequence[str]:
+    # Binary pack tables are de-duplicated on conversion and are indexed in place.
+    if getattr(items, "unique", False):
+        return items
+    return tuple(dict.fromkeys(i for i in items if i and i.strip()))
+
+def _pair(p: int, n: int) -> Tuple[int, int]:
+    # p-th ordered pair of distinct indexes out of n (0 <= p < n * (n - 1))
+    a, b = divmod(p, n - 1)
+    return a, b + (b >= a)
+
+def _group(items: Sequence[str], i: int) -> int:
+    groups = getattr(items, "groups", None)   # set on canonical pack sections
+    return groups[i] if groups is not None else i
+
+
+class CompiledPack:
+    def __init__(self, pack: Dict[str, Sequence[str]], max_templates: int = 4096):
+        self.pack = pack
+        self.prompts = _unique(pack["prompts"])
+        self.concepts = _unique(pack["concepts"])
+        self.constraints = _unique(pack["constraints"])
+        # Templates are parsed on first use, so huge packs only pay for what is dealt.
+        self.max_templates = max_templates
+        self._templates: Dict[Tuple[bool, int], Template] = {}
+        # Classic: a template only multiplies the space by the slots it actually uses.
+        n = len(self.concepts)
+        self._offsets = array("Q", [0])
+        for t in self.prompts:
+            used = {m.group(1) for m in TEMPLATE_TOKEN.finditer(t) if m.group(1)}
+            self._offsets.append(self._offsets[-1] + self._slot_choices(len(used), n))
+
+    def template(self, i: int, constraint: bool = False) -> Template:
+        key = (constraint, i)
+        t = self._templates.get(key)
+        if t is None:
+            if len(self._templates) >= self.max_templates:
+                self._templates.clear()
+            source = self.constraints[i] if constraint else self.prompts[i]
+            t = self._templates[key] = Template(source, escapes=not constraint)
+        return t
+
+    @staticmethod
+    def _slot_choices(used: int, n: int) -> int:
+        return (1, n, n * (n - 1))[used] if n >= used else 0
+
+    def size(self, mode: str, double: bool = False) -> int:
+        n, pairs = len(self.concepts), len(self.concepts) * (len(self.concepts) - 1)
+        if mode == "Classic":
+            return self._offsets[-1]
+        if mode == "Constraint":
+            c = len(self.constraints)
+            return (c * (c - 1) if double else c) * pairs
+        if mode in ("Mash-up", "Yes, And…"):
+            return pairs
+        raise ValueError(f"Unknown mode: {mode}")
+
+    def parts_at(self, mode: str, i: int, double: bool = False) -> Tuple[Optional[int], Tuple[int, ...], Tuple[int, ...]]:
+        """(template, concepts, constraints) indexes prompt i is built from; template is None outside Classic."""
+        n = len(self.concepts)
+        if mode == "Classic":
+            ti = bisect.bisect_right(self._offsets, i) - 1
+            local, used = i - self._offsets[ti], len(self.template(ti).slots)
+            return ti, (_pair(local, n) if used == 2 else (local,) if used else ()), ()
+        combo, p = divmod(i, n * (n - 1))
+        constraints = ()
+        if mode == "Constraint":
+            constraints = _pair(combo, len(self.constraints)) if double else (combo,)
+        return None, _pair(p, n), constraints
+
+    def prompt_at(self, mode: str, i: int, double: bool = False) -> str:
+        ti, concepts, constraints = self.parts_at(mode, i, double)
+        if ti is not None:
+            template = self.template(ti)
+            values = ["", ""]
+            if len(template.slots) == 2:
+                values = [self.concepts[c] for c in concepts]
+            elif template.slots:
+                values[template.slots[0]] = self.concepts[concepts[0]]
+            return template.render(values)
+        A, B = (self.concepts[c] for c in concepts)
+        if mode == "Constraint":
+            chosen = [self.template(k, constraint=True) for k in constraints]
+            return constraint_prompt(A, B, [t.render((A, B)) for t in chosen])
+        if mode == "Mash-up":
+            return mashup_prompt(A, B)
+        return story_spark(A, B)
+
+    def themes_at(self, mode: str, i: int, double: bool = False) -> FrozenSet[Tuple[str, int]]:
+        # What prompt i is about, by theme group, for telling rounds apart.
+        ti, concepts, constraints = self.parts_at(mode, i, double)
+        themes = [("c", _group(self.concepts, c)) for c in concepts]
+        themes += [("k", _group(self.constraints, k)) for k in constraints]
+        if ti is not None:
+            themes.append(("t", _group(self.prompts, ti)))
+        return frozenset(themes)
+
+
+_compiled: "OrderedDict[int, Tuple[dict, CompiledPack]]" = OrderedDict()
+_compiled_lock = threading.Lock()
+
+def compile_pack(pack: Dict[str, Sequence[str]], max_packs: int = 32) -> CompiledPack:
+    """Compile once per pack object (PackRegistry hands out the same object until a reload)."""
+    with _compiled_lock:
+        hit = _compiled.get(id(pack))
+        if hit is not None and hit[0] is pack:
+            _compiled.move_to_end(id(pack))
+            return hit[1]
+    compiled = CompiledPack(pack)
+    with _compiled_lock:
+        _compiled[id(pack)] = (pack, compiled)  # holding the pack keeps its id from being reused
+        while len(_compiled) > max_packs:
+            _compiled.popitem(last=False)
+    return compiled
+
+
+# --------------------------
+# Keyed permutation + deck
+# --------------------------
+def _mix(x: int) -> int:
+    # splitmix64 finalizer
+    x = (x ^ (x >> 30)) * 0xBF58476D1CE4E5B9 & _MASK64
+    x = (x ^ (x >> 27)) * 0x94D049BB133111EB & _MASK64
+    return x ^ (x >> 31)
+
+
+class Permutation:
+    """Bijection on range(size) from a 4-round Feistel network with cycle walking."""
+
+    def __init__(self, size: int, key: int, rounds: int = 4):
+        self.size = size
+        self.half = max(1, (max(1, size - 1).bit_length() + 1) // 2)
+        self.mask = (1 << self.half) - 1
+        self.keys = [_mix((key & _MASK64) + r + 1) for r in range(rounds)]
+
+    def _encrypt(self, x: int) -> int:
+        left, right = x >> self.half, x & self.mask
+        for k in self.keys:
+            left, right = right, left ^ (_mix(right ^ k) & self.mask)
+        return (left << self.half) | right
+
+    def __getitem__(self, i: int) -> int:
+        # The domain is < 4 * size, so the walk takes a few steps on average.
+        x = self._encrypt(i)
+        while x >= self.size:
+            x = self._encrypt(x)
+        return x
+
+
+class PromptDeck:
+    """Deals a mode's prompts without repeats; reshuffles once the space is used up."""
+
+    def __init__(self, compiled: CompiledPack, mode: str, seed: int, double: bool = False,
+                 lookahead: int = 8, memory: int = 4):
+        self.compiled = compiled
+        self.mode = mode
+        self.seed = seed
+        self.double = double
+        self.size = compiled.size(mode, double)
+        if self.size <= 0:
+            raise ValueError(f"Pack has too few items for {mode}")
+        self.epoch = 0
+        self.cursor = 0
+        self._perm = Permutation(self.size, _mix(seed) ^ self.epoch)
+        self.lookahead = max(1, lookahead)   # 1 deals in plain permutation order
+        self._held: List[int] = []           # taken from the order but not dealt yet
+        self._recent = deque(maxlen=memory)  # themes of the last rounds, newest last
+
+    def draw(self) -> str:
+        if self.cursor >= self.size and not self._held:
+            self.epoch += 1
+            self.cursor = 0
+            self._perm = Permutation(self.size, _mix(self.seed) ^ self.epoch)
+        while len(self._held) < self.lookahead and self.cursor < self.size:
+            self._held.append(self._perm[self.cursor])
+            self.cursor += 1
+        i = self._held.pop(self._pick())
+        self._recent.append(self.compiled.themes_at(self.mode, i, self.double))
+        return self.compiled.prompt_at(self.mode, i, self.double)
+
+    def _pick(self) -> int:
+        # Held prompt sharing the least with recent rounds (newer rounds weigh more); ties keep the order.
+        if len(self._held) == 1 or not self._recent:
+            return 0
+        best, best_cost = 0, None
+        for j, i in enumerate(self._held):
+            themes = self.compiled.themes_at(self.mode, i, self.double)
+            cost = sum(w * len(themes & seen) for w, seen in enumerate(self._recent, 1))
+            if cost == 0:
+                return j
+            if best_cost is None or cost < best_cost:
+                best, best_cost = j, cost
+        return best
+
+    def remaining(self) -> int:
+        return self.size - self.cursor + len(self._held)
+
+
+def deck_for(decks: Dict[tuple, PromptDeck], pack: Dict[str, Sequence[str]], pack_name: str, mode: str,
+             seed: int, double: bool = False) -> PromptDeck:
+    # One deck per (pack, mode, double) in the caller's dict; rebuilt if the pack was reloaded.
+    compiled = compile_pack(pack)
+    key = (pack_name, mode, double)
+    deck: Optional[PromptDeck] = decks.get(key)
+    if deck is None or deck.compiled is not compiled or deck.seed != seed:
+        deck = decks[key] = PromptDeck(compiled, mode, seed, double)
+    return deck
@@ -0,0 +1,143 @@
+"""Shared, bounded cache for AI completions.
+
+Entries are keyed on everything that shapes a completion (messages, max_tokens,
+model, temperature). Each key holds up to ``variants`` different answers: until
+that many have been collected, lookups miss so new answers keep coming in; after
+that, one of the stored variants is served at random so rounds still feel fresh.
+"""
+import json
+import time
+import random
+import sqlite3
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+
+def cache_key(messages: List[Dict[str, str]], max_tokens: int, model: str, temperature: float) -> str:
+    raw = json.dumps(
+        {"messages": messages, "max_tokens": max_tokens, "model": model, "temperature": temperature},
+        ensure_ascii=False, sort_keys=True,
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """In-memory LRU cache with TTL, an entry cap and N variants per key."""
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 86400.0, variants: int = 3):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self._lock = threading.Lock()
+        self._data: "OrderedDict[str, dict]" = OrderedDict()  # key -> {"texts", "created"}
+        self._stats = {"hits": 0, "misses": 0, "puts": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and now - entry["created"] > self.ttl:
+                del self._data[key]
+                self._stats["expired"] += 1
+                entry = None
+            if entry is None or len(entry["texts"]) < self.variants:
+                self._stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            self._stats["hits"] += 1
+            return random.choice(entry["texts"])
+
+    def put(self, key: str, text: str):
+        if not text:
+            return
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = {"texts": [], "created": time.time()}
+            if len(entry["texts"]) < self.variants and text not in entry["texts"]:
+                entry["texts"].append(text)
+            self._data.move_to_end(key)
+            self._stats["puts"] += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            s = dict(self._stats)
+            s["entries"] = len(self._data)
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = s["hits"] / lookups if lookups else 0.0
+        return s
+
+
+class SqliteResponseCache(ResponseCache):
+    """Same policy as ResponseCache, persisted in a local SQLite file."""
+
+    def __init__(self, path: str, max_entries: int = 50000, ttl: float = 7 * 86400.0, variants: int = 3):
+        super().__init__(max_entries=max_entries, ttl=ttl, variants=variants)
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT NOT NULL, text TEXT NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL,"
+            " PRIMARY KEY (key, text))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute("DELETE FROM responses WHERE key = ? AND created < ?", (key, now - self.ttl))
+            if cur.rowcount:
+                self._stats["expired"] += cur.rowcount
+            texts = [r[0] for r in self._conn.execute("SELECT text FROM responses WHERE key = ?", (key,))]
+            if len(texts) < self.variants:
+                self._stats["misses"] += 1
+                self._conn.commit()
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+            return random.choice(texts)
+
+    def put(self, key: str, text: str):
+        if not text:
+            return
+        now = time.time()
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM responses WHERE key = ?", (key,)).fetchone()
+            if count < self.variants:
+                self._conn.execute("INSERT OR IGNORE INTO responses VALUES (?, ?, ?, ?)", (key, text, now, now))
+            self._stats["puts"] += 1
+            (keys,) = self._conn.execute("SELECT COUNT(DISTINCT key) FROM responses").fetchone()
+            if keys > self.max_entries:
+                cur = self._conn.execute(
+                    "DELETE FROM responses WHERE key IN ("
+                    " SELECT key FROM responses GROUP BY key ORDER BY MAX(last_used) LIMIT ?)",
+                    (keys - self.max_entries,),
+                )
+                self._stats["evictions"] += cur.rowcount
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(DISTINCT key) FROM responses").fetchone()
+            s = dict(self._stats)
+        s["entries"] = entries
+        lookups = s["hits"] + s["misses"]
+        s["hit_rate"] = s["hits"] / lookups if lookups else 0.0
+        return s
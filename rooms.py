@@ -0,0 +1,209 @@
+"""Multi-player rooms sharing one server-side game state.
+
+A host opens a room and generates the prompt; any number of players join with
+the room code and submit ideas against it. The AI answer is generated once per
+room round, not once per player. Votes are tallied in the shared store.
+
+Every change bumps the room's ``version``, so clients can cheaply check "has
+anything changed?" with ``version(code)`` and only take a new ``snapshot`` when
+it has.
+"""
+import time
+import random
+import string
+import threading
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional
+
+AI_ENTRY = "AI"
+
+
+class Room:
+    def __init__(self, code: str, host: str, mode: str):
+        self.code = code
+        self.host = host
+        self.mode = mode
+        self.difficulty = "Medium"
+        self.prompt: Optional[str] = None
+        self.round = 0
+        self.ai_response: Optional[str] = None
+        self.ai_future: Optional[Future] = None
+        self.revealed = False
+        self.players: Dict[str, str] = {}       # session_id -> display name
+        self.submissions: Dict[str, str] = {}   # session_id -> idea
+        self.votes: Dict[str, str] = {}         # voter session_id -> entry (session_id or AI_ENTRY)
+        self.version = 0
+        self.touched = time.time()
+
+    def tally(self) -> List[Dict[str, object]]:
+        counts: Dict[str, int] = {}
+        for entry in self.votes.values():
+            counts[entry] = counts.get(entry, 0) + 1
+        rows = [{"entry": AI_ENTRY, "name": "🤖 AI", "idea": self.ai_response or "", "votes": counts.get(AI_ENTRY, 0)}]
+        for sid, idea in self.submissions.items():
+            rows.append({"entry": sid, "name": f"👤 {self.players.get(sid, 'Player')}", "idea": idea,
+                         "votes": counts.get(sid, 0)})
+        return sorted(rows, key=lambda r: -r["votes"])
+
+
+class RoomStore:
+    def __init__(self, executor: Executor, generate: Callable[[str, str, str, str], str],
+                 idle_ttl: float = 3 * 3600):
+        # generate(code, mode, prompt, difficulty) -> AI idea; runs on the executor
+        self.executor = executor
+        self.generate = generate
+        self.idle_ttl = idle_ttl
+        self._rooms: Dict[str, Room] = {}
+        self._lock = threading.Lock()
+
+    # --------------------------
+    # Internals
+    # --------------------------
+    def _changed(self, room: Room):
+        # Caller holds self._lock
+        room.version += 1
+        room.touched = time.time()
+
+    def _new_code(self) -> str:
+        while True:
+            code = "".join(random.choices(string.ascii_uppercase.replace("O", "").replace("I", ""), k=5))
+            if code not in self._rooms:
+                return code
+
+    def _evict_idle(self):
+        cutoff = time.time() - self.idle_ttl
+        for code in [c for c, r in self._rooms.items() if r.touched < cutoff]:
+            room = self._rooms.pop(code)
+            if room.ai_future is not None:
+                room.ai_future.cancel()
+
+    # --------------------------
+    # Room lifecycle
+    # --------------------------
+    def create(self, host: str, host_name: str, mode: str) -> Room:
+        with self._lock:
+            self._evict_idle()
+            room = Room(self._new_code(), host, mode)
+            room.players[host] = host_name or "Host"
+            self._rooms[room.code] = room
+            self._changed(room)
+            return room
+
+    def get(self, code: str) -> Optional[Room]:
+        with self._lock:
+            return self._rooms.get((code or "").strip().upper())
+
+    def join(self, code: str, session_id: str, name: str) -> Optional[Room]:
+        with self._lock:
+            room = self._rooms.get((code or "").strip().upper())
+            if room is not None:
+                room.players[session_id] = name or f"Player {len(room.players) + 1}"
+                self._changed(room)
+            return room
+
+    def leave(self, code: str, session_id: str):
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None:
+                return
+            room.players.pop(session_id, None)
+            room.submissions.pop(session_id, None)
+            room.votes.pop(session_id, None)
+            if session_id == room.host or not room.players:
+                if room.ai_future is not None:
+                    room.ai_future.cancel()
+                self._rooms.pop(code, None)
+            self._changed(room)
+
+    # --------------------------
+    # Rounds
+    # --------------------------
+    def start_round(self, code: str, session_id: str, prompt: str, difficulty: str) -> bool:
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None or session_id != room.host:
+                return False
+            if room.ai_future is not None:
+                room.ai_future.cancel()
+            room.prompt, room.difficulty = prompt, difficulty
+            room.round += 1
+            room.ai_response, room.revealed = None, False
+            room.submissions.clear()
+            room.votes.clear()
+            # One AI answer per room round, started right away in the background.
+            fut = self.executor.submit(self.generate, code, room.mode, prompt, difficulty)
+            room.ai_future = fut
+            round_no = room.round
+            self._changed(room)
+        # Outside the lock: a future that is already done runs the callback inline.
+        fut.add_done_callback(lambda f: self._ai_done(code, round_no, f))
+        return True
+
+    def _ai_done(self, code: str, round_no: int, fut: Future):
+        if fut.cancelled():
+            return
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None or room.round != round_no:
+                return  # stale result from an abandoned round
+            try:
+                room.ai_response = fut.result()
+            except Exception as e:
+                room.ai_response = f"(AI unavailable: {e})"
+            self._changed(room)
+
+    def submit(self, code: str, session_id: str, idea: str) -> bool:
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None or room.prompt is None or room.revealed:
+                return False
+            room.submissions[session_id] = idea.strip()
+            self._changed(room)
+            return True
+
+    def reveal(self, code: str, session_id: str) -> bool:
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None or session_id != room.host:
+                return False
+            room.revealed = True
+            self._changed(room)
+            return True
+
+    def vote(self, code: str, session_id: str, entry: str) -> bool:
+        with self._lock:
+            room = self._rooms.get(code)
+            if room is None or not room.revealed or entry == session_id:
+                return False
+            if entry != AI_ENTRY and entry not in room.submissions:
+                return False
+            room.votes[session_id] = entry
+            self._changed(room)
+            return True
+
+    # --------------------------
+    # Change notification
+    # --------------------------
+    def snapshot(self, code: str) -> Optional[dict]:
+        # Consistent copy of the room for rendering outside the lock.
+        with self._lock:
+            room = self._rooms.get((code or "").strip().upper())
+            if room is None:
+                return None
+            return {
+                "code": room.code, "host": room.host, "mode": room.mode, "difficulty": room.difficulty,
+                "prompt": room.prompt, "round": room.round, "ai_response": room.ai_response,
+                "revealed": room.revealed, "players": dict(room.players),
+                "submissions": dict(room.submissions), "votes": dict(room.votes),
+                "tally": room.tally(), "version": room.version,
+            }
+
+    def version(self, code: str) -> int:
+        with self._lock:
+            room = self._rooms.get(code)
+            return -1 if room is None else room.version
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"rooms": len(self._rooms),
+                    "players": sum(len(r.players) for r in self._rooms.values())}
@@ -0,0 +1,214 @@
+"""Per-session game state with a memory cap, shared by the whole process.
+
+st.session_state only keeps small scalars. The strings a session builds up
+(the prompt, both answers, the Yes, And… story and its context) live in one
+compact SessionRecord per session, held here so they can be measured and
+bounded:
+
+- the story keeps its last ``story_tail`` lines in memory; older lines are
+  spilled to SQLite (``db_path``) in batches and only read back when the full
+  story is opened. Without a database they are dropped
+- a record over ``max_bytes`` spills more of its story, trims the story's AI
+  context to its recent window, then clips the AI's answer. The player's answer
+  is never cut; the app caps it at input time (``max_chars``)
+- records idle for ``ttl`` seconds are dropped (their story stays on disk). A
+  returning tab starts a fresh round with its story tail reloaded
+"""
+import sys
+import time
+import sqlite3
+import threading
+from typing import Dict, List, Optional
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS story_lines (
+    session_id TEXT NOT NULL,
+    story INTEGER NOT NULL,
+    seq INTEGER NOT NULL,            -- 0-based line number within the story
+    line TEXT NOT NULL,
+    ts REAL NOT NULL,
+    PRIMARY KEY (session_id, story, seq)
+);
+CREATE INDEX IF NOT EXISTS story_lines_ts ON story_lines(ts);
+"""
+
+
+class SessionRecord:
+    __slots__ = ("session_id", "last_seen", "prompt", "user_response", "ai_response",
+                 "story", "story_id", "story_lines", "spilled", "story_ctx")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.last_seen = time.time()
+        self.prompt: Optional[str] = None
+        self.user_response = ""
+        self.ai_response: Optional[str] = None
+        self.story: List[str] = []   # the last lines of the story; the rest is on disk
+        self.story_id = 0
+        self.story_lines = 0         # lines in the whole story
+        self.spilled = 0             # story[0] is line number `spilled`
+        self.story_ctx = None        # story_context.StoryContext for the AI prompt
+
+    def size(self) -> int:
+        # Approximate bytes held: the record, the story list and every distinct string.
+        seen, total = set(), sys.getsizeof(self) + sys.getsizeof(self.story)
+        texts = [self.prompt, self.user_response, self.ai_response, *self.story]
+        if self.story_ctx is not None:
+            texts += [self.story_ctx.summary, *self.story_ctx.lines]
+            total += sys.getsizeof(self.story_ctx.lines) + sum(sys.getsizeof(t) for t in self.story_ctx.turns)
+        for s in texts:
+            if s and id(s) not in seen:
+                seen.add(id(s))
+                total += sys.getsizeof(s)
+        return total
+
+
+class SessionManager:
+    def __init__(self, db_path: Optional[str] = None, ttl: float = 1800.0, max_bytes: int = 64 * 1024,
+                 story_tail: int = 40, spill_batch: int = 20, retention: float = 7 * 86400.0,
+                 sweep_every: float = 60.0):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.story_tail = story_tail
+        self.spill_batch = spill_batch   # lines written per spill, so the disk is touched rarely
+        self.retention = retention       # spilled stories are kept this long on disk
+        self.sweep_every = sweep_every
+        self._records: Dict[str, SessionRecord] = {}
+        self._lock = threading.Lock()
+        self._last_sweep = time.time()
+        self._conn = None
+        if db_path:
+            self._conn = sqlite3.connect(db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+        self._stats = {"created": 0, "restored": 0, "evicted": 0, "spilled_lines": 0, "dropped_lines": 0,
+                       "clipped": 0, "over_budget": 0}
+
+    # --------------------------
+    # Records
+    # --------------------------
+    def get(self, session_id: str) -> SessionRecord:
+        """The session's record, created (or restored from disk) if it was never seen or was evicted."""
+        now = time.time()
+        with self._lock:
+            if now - self._last_sweep >= self.sweep_every:
+                self._sweep(now)
+            rec = self._records.get(session_id)
+            if rec is None:
+                rec = self._records[session_id] = SessionRecord(session_id)
+                self._stats["created"] += 1
+                self._restore(rec)
+            rec.last_seen = now
+            self._fit(rec)
+            return rec
+
+    def _sweep(self, now: float):
+        # Caller holds self._lock
+        self._last_sweep = now
+        cutoff = now - self.ttl
+        for sid in [s for s, r in self._records.items() if r.last_seen < cutoff]:
+            rec = self._records.pop(sid)
+            self._spill(rec, len(rec.story))
+            if rec.story_ctx is not None:
+                rec.story_ctx.cancel()
+            self._stats["evicted"] += 1
+        if self._conn is not None:
+            self._conn.execute("DELETE FROM story_lines WHERE ts < ?", (now - self.retention,))
+            self._conn.commit()
+
+    def _restore(self, rec: SessionRecord):
+        # Caller holds self._lock. Bring back the tail of the session's latest story.
+        if self._conn is None:
+            return
+        row = self._conn.execute("SELECT story, MAX(seq) FROM story_lines WHERE session_id = ?"
+                                 " GROUP BY story ORDER BY story DESC LIMIT 1", (rec.session_id,)).fetchone()
+        if row is None:
+            return
+        rec.story_id, last = row
+        lines = self._conn.execute(
+            "SELECT line FROM story_lines WHERE session_id = ? AND story = ? AND seq > ? ORDER BY seq",
+            (rec.session_id, rec.story_id, last - self.story_tail)).fetchall()
+        rec.story = [ln for (ln,) in lines]
+        rec.story_lines = last + 1
+        rec.spilled = rec.story_lines - len(rec.story)
+        self._stats["restored"] += 1
+
+    # --------------------------
+    # Story
+    # --------------------------
+    def add_line(self, rec: SessionRecord, line: str):
+        with self._lock:
+            rec.story.append(line)
+            rec.story_lines += 1
+            if len(rec.story) >= self.story_tail + self.spill_batch:
+                self._spill(rec, len(rec.story) - self.story_tail)
+            self._fit(rec)
+
+    def new_story(self, rec: SessionRecord):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM story_lines WHERE session_id = ? AND story = ?",
+                                   (rec.session_id, rec.story_id))
+                self._conn.commit()
+            if rec.story_ctx is not None:
+                rec.story_ctx.cancel()
+            rec.story, rec.story_lines, rec.spilled, rec.story_ctx = [], 0, 0, None
+            rec.story_id += 1
+
+    def full_story(self, rec: SessionRecord) -> List[str]:
+        """Every line of the story, reading the spilled part back from disk."""
+        with self._lock:
+            older: List[str] = []
+            if self._conn is not None and rec.spilled:
+                older = [ln for (ln,) in self._conn.execute(
+                    "SELECT line FROM story_lines WHERE session_id = ? AND story = ? AND seq < ? ORDER BY seq",
+                    (rec.session_id, rec.story_id, rec.spilled))]
+            if len(older) < rec.spilled:
+                older.append(f"… {rec.spilled - len(older)} earlier lines were not kept")
+            return older + rec.story
+
+    def _spill(self, rec: SessionRecord, count: int):
+        # Caller holds self._lock. Move the oldest `count` in-memory lines to disk.
+        if count <= 0:
+            return
+        lines, rec.story = rec.story[:count], rec.story[count:]
+        if self._conn is not None:
+            now = time.time()
+            self._conn.executemany("INSERT OR REPLACE INTO story_lines VALUES (?, ?, ?, ?, ?)",
+                                   [(rec.session_id, rec.story_id, rec.spilled + i, ln, now)
+                                    for i, ln in enumerate(lines)])
+            self._conn.commit()
+            self._stats["spilled_lines"] += count
+        else:
+            self._stats["dropped_lines"] += count
+        rec.spilled += count
+
+    def _fit(self, rec: SessionRecord):
+        # Caller holds self._lock. Spill story lines, trim the story context, then clip the AI's answer.
+        while rec.size() > self.max_bytes and len(rec.story) > 1:
+            self._spill(rec, max(1, len(rec.story) // 2))
+        if rec.size() > self.max_bytes and rec.story_ctx is not None:
+            rec.story_ctx.trim(0)
+        over = rec.size() - self.max_bytes
+        if over > 0 and rec.ai_response:
+            # every character is at least one byte, so cutting `over` characters is enough
+            rec.ai_response = rec.ai_response[:max(0, len(rec.ai_response) - over)]
+            self._stats["clipped"] += 1
+        if rec.size() > self.max_bytes:
+            self._stats["over_budget"] += 1
+
+    def fit(self, rec: SessionRecord):
+        """Enforce the byte budget after the record's answers were changed."""
+        with self._lock:
+            self._fit(rec)
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            sizes = [r.size() for r in self._records.values()]
+            out = dict(self._stats)
+        out["sessions"] = len(sizes)
+        out["total_bytes"] = sum(sizes)
+        out["largest_bytes"] = max(sizes, default=0)
+        return out
@@ -0,0 +1,120 @@
+"""Bounded story context for Yes, And… mode.
+
+Keeps the most recent lines verbatim and folds older lines into a running
+summary, so the prompt sent each turn stays roughly the same size however long
+the story gets. Summary updates run in the background; until one lands, the
+lines it covers are simply kept in the recent window. Lines are dropped once
+the summary covers them, so memory stays bounded too.
+"""
+import math
+from collections import deque
+from concurrent.futures import Executor, Future
+from typing import Callable, Dict, List, Optional
+
+_ENCODING = False  # not looked up yet
+
+
+def _encoding():
+    # tiktoken is slow to import and may download its BPE file, so only load it
+    # once a Yes, And… turn actually needs a count.
+    global _ENCODING
+    if _ENCODING is False:
+        try:
+            import tiktoken
+            _ENCODING = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _ENCODING = None
+    return _ENCODING
+
+
+def count_tokens(text: str) -> int:
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    # ~4 characters per token for English text
+    return math.ceil(len(text) / 4)
+
+
+def summary_messages(summary: str, lines: List[str]) -> List[Dict[str, str]]:
+    new_lines = "\n".join(lines)
+    return [
+        {"role": "system", "content": "You keep a running summary of a collaborative story. "
+                                      "Keep characters, places and open plot threads. Plain text only."},
+        {"role": "user", "content": f"Summary so far: {summary or '(none)'}\n\nNew lines:\n{new_lines}\n\n"
+                                    "Rewrite the summary to include the new lines in at most 3 sentences."},
+    ]
+
+
+class StoryContext:
+    def __init__(self, window: int = 8, fold_every: int = 4, max_turns: int = 50):
+        self.window = window            # lines always sent verbatim
+        self.fold_every = fold_every    # overflow lines batched into one summary update
+        self.lines: List[str] = []      # lines not yet covered by the summary
+        self.summary = ""
+        self.summarized = 0             # line numbers below this are covered by summary
+        self.story_tokens = 0           # tokens in the whole story, as if it were sent verbatim
+        self._pending: Optional[Future] = None
+        self._pending_upto = 0
+        self.turns: "deque[Dict[str, int]]" = deque(maxlen=max_turns)  # per-request token counts
+
+    @property
+    def line_count(self) -> int:
+        return self.summarized + len(self.lines)
+
+    def add(self, line: str):
+        self.lines.append(line)
+        self.story_tokens += count_tokens(f"{line}\n")
+
+    def _collect(self):
+        if self._pending is not None and self._pending.done():
+            try:
+                text = (self._pending.result() or "").strip()
+                if text:
+                    self.summary = text
+                    del self.lines[:self._pending_upto - self.summarized]
+                    self.summarized = self._pending_upto
+            except Exception:
+                pass  # keep the old summary; the lines stay in the recent window
+            self._pending = None
+
+    def update_summary(self, executor: Executor, summarize: Callable[[List[Dict[str, str]]], str]):
+        # Fold overflow lines into the summary in the background.
+        self._collect()
+        if self._pending is not None:
+            return
+        upto = self.line_count - self.window
+        if upto - self.summarized < self.fold_every:
+            return
+        messages = summary_messages(self.summary, self.lines[:upto - self.summarized])
+        self._pending = executor.submit(summarize, messages)
+        self._pending_upto = upto
+
+    def prompt(self) -> str:
+        self._collect()
+        recent = "".join(f"{ln}\n" for ln in self.lines)
+        if not self.summary:
+            text = f"Continue this story in 1–2 sentences: {recent}"
+        else:
+            text = (f"Continue this story in 1–2 sentences.\nStory so far (summary): {self.summary}\n"
+                    f"Most recent lines:\n{recent}")
+        self.turns.append({
+            "turn": self.turns[-1]["turn"] + 1 if self.turns else 1,
+            "prompt_tokens": count_tokens(text),
+            "full_story_tokens": self.story_tokens,
+            "summary_tokens": count_tokens(self.summary),
+            "recent_lines": len(self.lines),
+        })
+        return text
+
+    def trim(self, keep: int):
+        # Forget all but the last `keep` unsummarized lines (a memory cap; the summary stays).
+        drop = len(self.lines) - max(keep, self.window)
+        if drop > 0:
+            self.cancel()
+            del self.lines[:drop]
+            self.summarized += drop
+
+    def cancel(self):
+        if self._pending is not None:
+            self._pending.cancel()
+            self._pending = None
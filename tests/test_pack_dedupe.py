@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from game_content import CORE_PACK  # noqa: E402
+from pack_binary import StringTable, convert, read_pack  # noqa: E402
+from pack_dedupe import apply, canonical_items, dedupe_pack, dedupe_section  # noqa: E402
+from pack_registry import PackRegistry  # noqa: E402
+from prompt_engine import PromptDeck, compile_pack  # noqa: E402
+
+
+def test_variants_collapse():
+    assert dedupe_section(["robots", "Robots!", "a robot", "dragons"]).drop == [1, 2]
+
+
+def test_distinct_constraints_survive():
+    # One letter or number apart is a different rule, however similar the wording.
+    rules = ["Must not use the letter a.", "Must not use the letter i.", "Must not use the letter o.",
+             "Your answer must not use the letter e", "Your answer must not use the letter u",
+             "Use exactly 3 sentences.", "Use exactly 4 sentences.", "Must not use the letter a!"]
+    assert dedupe_pack({"constraints": tuple(rules)})["constraints"].drop == [7]
+    assert canonical_items("constraints", rules) == rules[:7]
+
+
+def test_dedupe_keeps_pack_playable():
+    # Every concept is a variant of "robot": dedupe would leave one, which can't make a pair.
+    pack = {"prompts": ("Invent {A} meets {B}.",), "concepts": ("robot", "robots", "a robot", "Robots!"),
+            "constraints": ("must rhyme", "must rhyme!")}
+    canonical = apply(pack, dedupe_pack(pack))
+    assert list(canonical["concepts"]) == ["robot", "robots", "a robot", "Robots!"]
+    assert list(canonical["constraints"]) == ["must rhyme", "must rhyme!"]
+    for mode in ("Classic", "Mash-up", "Constraint"):
+        assert PromptDeck(compile_pack(canonical), mode, 1).draw()
+
+
+def test_registry_serves_playable_pack(tmp_path):
+    with open(tmp_path / "Robots.json", "w", encoding="utf-8") as f:
+        json.dump({"prompts": ["Invent {A} meets {B}."], "concepts": ["robot", "robots", "a robot"]}, f)
+    pack = PackRegistry(str(tmp_path), CORE_PACK).get("Robots")
+    assert len(pack["concepts"]) == 3
+    assert PromptDeck(compile_pack(pack), "Mash-up", 1).draw()
+
+
+def test_binary_pack_deduped_on_convert(tmp_path):
+    src = tmp_path / "Mixed.json"
+    with open(src, "w", encoding="utf-8") as f:
+        json.dump({"prompts": ["Invent {A} meets {B}."], "concepts": ["robots", "a robot", "dragons", "coffee"],
+                   "constraints": ["must rhyme"]}, f)
+    assert list(read_pack(convert(str(src)))["concepts"]) == ["robots", "dragons", "coffee"]
+    pack = PackRegistry(str(tmp_path), CORE_PACK).get("Mixed")
+    assert isinstance(pack["concepts"], StringTable)   # indexed in place, never scanned on load
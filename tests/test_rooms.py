@@ -0,0 +1,42 @@
+import os
+import sys
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from rooms import RoomStore  # noqa: E402
+
+
+class _Inline(Executor):
+    # Runs the call before returning, like a cache hit that finishes before the callback is attached.
+    def submit(self, fn, *args, **kwargs):
+        fut = Future()
+        fut.set_result(fn(*args, **kwargs))
+        return fut
+
+
+def _start(store: RoomStore):
+    room = store.create("host", "Hana", "Classic")
+    done = threading.Event()
+    threading.Thread(target=lambda: (store.start_round(room.code, "host", "Invent a hat.", "Easy"), done.set()),
+                     daemon=True).start()
+    assert done.wait(5), "start_round deadlocked"
+    return room.code
+
+
+def test_finished_future_does_not_deadlock():
+    store = RoomStore(_Inline(), lambda code, mode, prompt, difficulty: "a hat that hums")
+    code = _start(store)
+    assert store.snapshot(code)["ai_response"] == "a hat that hums"
+
+
+def test_instant_generate_on_pool():
+    with ThreadPoolExecutor(2) as pool:
+        store = RoomStore(pool, lambda code, mode, prompt, difficulty: "a hat that hums")
+        code = _start(store)
+        pool.submit(lambda: None).result()
+        before = store.version(code)
+        store.submit(code, "host", "my idea")
+        assert store.version(code) == before + 1
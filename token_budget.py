@@ -0,0 +1,168 @@
+"""Adaptive max_tokens and early stop from each mode's length rules.
+
+The fixed caps in ``ai_tokens_for_mode`` (90 / 160 / 240, 70 for Yes, And…)
+are a guess at how many tokens the length rule in ``ai_length_rule`` needs.
+TokenBudget learns, for every mode and difficulty, the real completion tokens
+per word (from the ``usage`` the API reports) and how long finished answers
+actually are, then plans each request:
+
+- ``max_tokens`` is the typical answer length plus headroom (never more than
+  the rule's word allowance) times the learned ratio, so the cap neither cuts
+  answers off nor reserves idle tokens against the TPM limiter. Until enough
+  answers have been seen the fixed cap is kept
+- ``sentences`` / ``words`` is the stop rule: the difficulty's upper sentence
+  count, or a constraint's ("exactly 3 sentences", "only 10 words"). Streams
+  are cut where it is met, once whitespace follows the last word or sentence
+  (so "unbel" or the "3." of "3.5" never ends one), and blocking answers are
+  trimmed to it
+
+Savings are counted per round: cap tokens not reserved against the fixed cap,
+plus tokens a stream was stopped short of its cap (an upper-bound estimate).
+"""
+import re
+import math
+import threading
+from itertools import islice
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Upper sentence count and word allowance of each difficulty's length rule.
+LENGTH_RULES = {"Easy": (2, 60), "Medium": (4, 120), "Hard": (6, 180)}
+YES_AND_RULE = (2, 50)   # "Continue this story in 1–2 sentences"
+DEFAULT_RATIO = 1.4      # completion tokens per English word before anything is learned
+
+_EXACT_SENTENCES = re.compile(r"exactly\s+(\d+)\s+sentences?", re.IGNORECASE)
+_WORD_LIMIT = re.compile(r"only\s+(\d+)\s+words", re.IGNORECASE)
+_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s|$)")
+_STREAM_SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*(?=\s)")   # more text may follow at the end
+_ENDS_SENTENCE = re.compile(r"[.!?…][\"'”’)\]]*$")
+_WORDS = re.compile(r"\S+")
+
+
+class Budget(NamedTuple):
+    max_tokens: int       # sent to the API
+    sentences: int        # stop after this many complete sentences (0 = no limit)
+    words: int            # ... or this many words (0 = no limit)
+    default_tokens: int   # the fixed cap this replaces (also what cached answers are keyed on)
+    key: Tuple[str, str]  # (mode, difficulty) the ratio is learned for
+
+
+def count_sentences(text: str) -> int:
+    return len(_SENTENCE_END.findall(text))
+
+
+def _nth(pattern, text: str, n: int):
+    return next(islice(pattern.finditer(text), n - 1, None), None)
+
+
+def rule_end(budget: Budget, text: str) -> Optional[int]:
+    """Where streamed ``text`` meets the rule (cut it there), or None while it doesn't yet.
+
+    A word or sentence only counts once whitespace follows it, since the next
+    delta may still extend it.
+    """
+    ends = []
+    if budget.words:
+        word = _nth(_WORDS, text, budget.words)
+        if word is not None and word.end() < len(text):
+            ends.append(word.end())
+    if budget.sentences:
+        sentence = _nth(_STREAM_SENTENCE_END, text, budget.sentences)
+        if sentence is not None:
+            ends.append(sentence.end())
+    return min(ends) if ends else None
+
+
+def trim(budget: Budget, text: str) -> str:
+    # Cut to the rule, and drop a trailing half-sentence left by a too-small cap.
+    if budget.words:
+        words = _WORDS.findall(text)
+        if len(words) > budget.words:
+            text = " ".join(words[:budget.words])
+    ends = [m.end() for m in _SENTENCE_END.finditer(text)]
+    if budget.sentences and len(ends) > budget.sentences:
+        text = text[:ends[budget.sentences - 1]]
+    elif ends and ends[-1] < len(text.rstrip()) and not budget.words:
+        text = text[:ends[-1]]
+    return text.strip()
+
+
+class TokenBudget:
+    def __init__(self, headroom: float = 1.3, pad: int = 8, alpha: float = 0.2, min_samples: int = 5):
+        self.headroom = headroom
+        self.pad = pad
+        self.alpha = alpha              # EWMA weight of each new observation
+        self.min_samples = min_samples  # finished answers seen before the learned numbers are used
+        # key -> [tokens per word, words per finished answer, finished answers seen]
+        self._learned: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+        self._stats = {"rounds": 0, "cap_tokens_saved": 0, "early_stops": 0, "stream_tokens_cut": 0,
+                       "trimmed": 0, "observations": 0}
+
+    def _ewma(self, old: float, new: float) -> float:
+        return old + self.alpha * (new - old)
+
+    def observe(self, mode: str, difficulty: str, texts, completion_tokens: int):
+        """Learn from one call's reported usage; ``texts`` are all of its choices."""
+        counts = [len(_WORDS.findall(t)) for t in texts]
+        if sum(counts) < 3 or completion_tokens <= 0:
+            return
+        ratio = completion_tokens / sum(counts)
+        # Only answers that ended on a full stop say how long answers really are; a
+        # cut-off one would teach the budget to cut the next one shorter still.
+        finished = [n for t, n in zip(texts, counts) if _ENDS_SENTENCE.search(t.rstrip())]
+        with self._lock:
+            learned = self._learned.get((mode, difficulty))
+            if learned is None:
+                learned = self._learned[(mode, difficulty)] = [ratio, 0.0, 0]
+            learned[0] = self._ewma(learned[0], ratio)
+            for n in finished:
+                learned[1] = self._ewma(learned[1], n) if learned[2] else float(n)
+                learned[2] += 1
+            self._stats["observations"] += 1
+
+    def plan(self, mode: str, difficulty: str, prompt: str, default_tokens: int) -> Budget:
+        sentences, words = YES_AND_RULE if mode == "Yes, And…" else LENGTH_RULES.get(difficulty, (0, 0))
+        word_limit = 0
+        exact = _EXACT_SENTENCES.search(prompt or "")
+        if exact:
+            sentences = int(exact.group(1))
+        limit = _WORD_LIMIT.search(prompt or "")
+        if limit:
+            word_limit = words = int(limit.group(1))
+        key = (mode, difficulty)
+        with self._lock:
+            ratio, typical, seen = self._learned.get(key, (DEFAULT_RATIO, 0.0, 0))
+        if seen >= self.min_samples:
+            tokens = math.ceil(min(words, typical * self.headroom) * ratio) + self.pad
+        elif word_limit:
+            tokens = math.ceil(word_limit * max(ratio, DEFAULT_RATIO) * self.headroom) + self.pad
+        else:
+            tokens = default_tokens
+        tokens = max(16, min(tokens, int(default_tokens * 1.5)))
+        return Budget(tokens, sentences, word_limit, default_tokens, key)
+
+    def finish(self, budget: Budget, text: str, streamed: bool, stopped_early: bool = False) -> str:
+        """Account for one finished round; blocking answers come back trimmed to the rule."""
+        with self._lock:
+            self._stats["rounds"] += 1
+            self._stats["cap_tokens_saved"] += max(0, budget.default_tokens - budget.max_tokens)
+            if stopped_early:
+                used = math.ceil(len(_WORDS.findall(text)) * self._learned.get(budget.key, (DEFAULT_RATIO,))[0])
+                self._stats["early_stops"] += 1
+                self._stats["stream_tokens_cut"] += max(0, budget.max_tokens - used)
+        if streamed:
+            return text
+        trimmed = trim(budget, text)
+        if trimmed != text.strip():
+            with self._lock:
+                self._stats["trimmed"] += 1
+        return trimmed or text
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            out = dict(self._stats)
+            rounds = out["rounds"] or 1
+            out["tokens_saved_per_round"] = round((out["cap_tokens_saved"] + out["stream_tokens_cut"]) / rounds, 1)
+            out["learned"] = {f"{m} · {d}": {"tokens_per_word": round(r, 3), "words": round(w, 1), "answers": n}
+                              for (m, d), (r, w, n) in self._learned.items()}
+            return out